@@ -0,0 +1,13 @@
+"""
+Latency, throughput and relevance benchmarks for the Halfsy API.
+
+Run from the backend directory, e.g.:
+
+    python -m benchmarks.run --backend memory --products 100000
+    python -m benchmarks.run --backend mongod --uri mongodb://localhost:27017 --products 1000000 --load
+    python -m benchmarks.compare <baseline-commit> <candidate-commit>
+    python -m benchmarks.bench_bitmap --backend mongod --products 1000000 --load
+    python -m benchmarks.bench_memory --products 1000000
+    python -m benchmarks.bench_login --logins 200 --concurrency 50
+    python -m benchmarks.bench_personalize --backend memory --products 50000
+"""
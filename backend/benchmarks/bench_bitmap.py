@@ -0,0 +1,95 @@
+"""
+Filter latency: the Mongo regex query in ProductRepository.get_filtered_products and
+its $facet counts versus the snapshot's bitmap index, on the synthetic catalog.
+
+    python -m benchmarks.bench_bitmap --backend mongod --products 1000000 --load
+    python -m benchmarks.bench_bitmap --backend memory --products 50000
+
+Each filter combination is checked for matching totals before it is timed.
+"""
+import argparse
+import time
+from typing import Callable, Dict, List
+
+from .load import configure, load_catalog
+from .run import summarize
+
+# category x brand x occasion x gender x price combinations, narrow to broad
+FILTERS: List[Dict] = [
+    {"brand": ["gucci"]},
+    {"category": ["bags"], "brand": ["gucci", "prada"]},
+    {"category": ["shoes"], "gender": "women", "price_min": 500, "price_max": 1000},
+    {"brand": ["dolce---gabbana"], "occasion": ["evening", "formal"]},
+    {"category": ["clothing", "accessories"], "occasion": ["casual"], "gender": "men", "price_max": 500},
+    {"price_min": 1000, "price_max": 5000},
+    {"category": ["jewelry---watches"], "brand": ["hermes", "chanel", "louis-vuitton"], "price_min": 5000},
+]
+
+
+def time_calls(fn: Callable, repeats: int) -> Dict:
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeats):
+        call_started = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="mongod")
+    parser.add_argument("--uri", help="MongoDB URI for --backend mongod (default mongodb://localhost:27017)")
+    parser.add_argument("--database", default="halfsy_bench")
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--load", action="store_true", help="(Re)generate and load the catalog first")
+    parser.add_argument("--repeats", type=int, default=20, help="Timed calls per filter and path")
+    parser.add_argument("--limit", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    patcher = configure(args.backend, args.uri, args.database)
+    if args.load or args.backend == "memory":
+        load_catalog(args.products, seed=args.seed)
+
+    from core.config import settings
+    from products.repository import ProductRepository
+    from products.service import ProductService
+    from products.snapshot import catalog_snapshot
+
+    # Keep the service on its Mongo path so the facet-count check compares both implementations
+    settings.CATALOG_SNAPSHOT_ENABLED = False
+    started = time.perf_counter()
+    catalog_snapshot.build()
+    print(f"snapshot + bitmap index built in {time.perf_counter() - started:.2f}s")
+
+    header = f"{'filter':<58}{'path':<10}{'p50 ms':>10}{'p95 ms':>10}{'total':>10}"
+    print(header)
+    print("-" * len(header))
+    for filters in FILTERS:
+        label = " ".join(f"{k}={v}" for k, v in filters.items())[:56]
+        mongo_total, _ = ProductRepository.get_filtered_products(args.limit, 0, **filters)
+        bitmap_total, _ = catalog_snapshot.filtered(args.limit, 0, **filters)
+        if mongo_total != bitmap_total:
+            print(f"{label:<58}MISMATCH mongo={mongo_total} bitmap={bitmap_total}")
+            continue
+        if ProductService._load_facet_counts(**filters) != catalog_snapshot.facet_counts(**filters):
+            print(f"{label:<58}MISMATCH in facet counts")
+            continue
+        paths = {
+            "mongo": lambda: ProductRepository.get_filtered_products(args.limit, 0, **filters),
+            "bitmap": lambda: catalog_snapshot.filtered(args.limit, 0, **filters),
+            "counts-db": lambda: ProductRepository.get_facet_counts(**filters),
+            "counts-bm": lambda: catalog_snapshot.facet_counts(**filters),
+        }
+        for name, fn in paths.items():
+            stats = time_calls(fn, args.repeats)
+            print(f"{label:<58}{name:<10}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{mongo_total:>10}")
+            label = ""
+
+    if patcher is not None:
+        patcher.stop()
+
+
+if __name__ == "__main__":
+    main()
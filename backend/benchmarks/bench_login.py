@@ -0,0 +1,92 @@
+"""
+Login throughput and event-loop stalls: bcrypt on the loop versus the hashing pool.
+
+    python -m benchmarks.bench_login --logins 200 --concurrency 50 --rounds 12
+
+Only password verification is exercised (it is what makes /users/login slow), so no
+database is needed. While the logins run, a probe coroutine ticks every millisecond;
+its worst delay is how long any other request on the worker would have waited.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from typing import Dict, List
+
+import bcrypt
+
+
+async def _probe(stop: asyncio.Event, delays: List[float]):
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        started = loop.time()
+        await asyncio.sleep(0.001)
+        delays.append(loop.time() - started - 0.001)
+
+
+async def run(verify, password: str, password_hash: str, logins: int, concurrency: int) -> Dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+
+    async def login():
+        async with semaphore:
+            started = time.perf_counter()
+            assert await verify(password, password_hash)
+            latencies.append(time.perf_counter() - started)
+
+    stop = asyncio.Event()
+    delays: List[float] = []
+    probe = asyncio.create_task(_probe(stop, delays))
+    started = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    latencies.sort()
+    return {
+        "logins_per_s": round(logins / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "max_loop_stall_ms": round(max(delays, default=0.0) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=12, help="bcrypt cost (BCRYPT_ROUNDS)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2, help="hashing pool size (PASSWORD_HASH_WORKERS)")
+    args = parser.parse_args()
+
+    # Settings are read at import time
+    os.environ["BCRYPT_ROUNDS"] = str(args.rounds)
+    os.environ["PASSWORD_HASH_WORKERS"] = str(args.workers)
+    from users.passwords import verify_password
+
+    async def inline_verify(password: str, password_hash: str) -> bool:
+        # What the login handler used to do: bcrypt directly on the event loop
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+
+    password = "correct horse battery staple"
+    password_hash = bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(args.rounds)).decode("utf-8")
+
+    results = {
+        "event loop": asyncio.run(run(inline_verify, password, password_hash, args.logins, args.concurrency)),
+        f"pool ({args.workers})": asyncio.run(run(verify_password, password, password_hash, args.logins, args.concurrency)),
+    }
+
+    header = f"{'verification':<16}{'logins/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max stall ms':>14}"
+    print(header)
+    print("-" * len(header))
+    for name, result in results.items():
+        print(
+            f"{name:<16}{result['logins_per_s']:>10}{result['p50_ms']:>10}"
+            f"{result['p99_ms']:>10}{result['max_loop_stall_ms']:>14}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Memory held by N transformed products: transform_product dicts versus ProductRecord.
+
+    python -m benchmarks.bench_memory --products 1000000
+
+Rows come from the synthetic catalog, so nothing needs a database. Sizes are the
+net allocations tracemalloc sees while the transformed list is alive, i.e. what a
+cache or in-process catalog of that many products costs.
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+from .catalog import generate_catalog
+
+
+def measure(rows: List[Dict], transform: Callable) -> Dict:
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    transformed = [item for item in map(transform, rows) if item is not None]
+    elapsed = time.perf_counter() - started
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    count = len(transformed)
+    del transformed
+    gc.collect()
+    return {
+        "items": count,
+        "mib": round(current / 2 ** 20, 1),
+        "bytes_per_item": round(current / count) if count else 0,
+        "seconds": round(elapsed, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    from products.record import ProductRecord
+    from products.transformers import transform_product
+
+    print(f"generating {args.products:,} products ...", flush=True)
+    rows = []
+    for index, row in enumerate(generate_catalog(args.products, seed=args.seed)):
+        row["id"] = f"{index:024x}"
+        rows.append(row)
+
+    results = {
+        "dict": measure(rows, transform_product),
+        "record": measure(rows, ProductRecord.from_product),
+    }
+
+    header = f"{'representation':<16}{'items':>12}{'MiB':>10}{'bytes/item':>12}{'build s':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        print(
+            f"{name:<16}{stats['items']:>12,}{stats['mib']:>10.1f}"
+            f"{stats['bytes_per_item']:>12,}{stats['seconds']:>10.2f}"
+        )
+    saved = 1 - results["record"]["mib"] / results["dict"]["mib"] if results["dict"]["mib"] else 0
+    print(f"\nrecords use {saved:.0%} less memory")
+
+
+if __name__ == "__main__":
+    main()
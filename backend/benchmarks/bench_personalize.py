@@ -0,0 +1,127 @@
+"""
+Latency added by ?user_id= personalization on /products/latest and /products/.
+
+    python -m benchmarks.bench_personalize --backend memory --products 50000
+    python -m benchmarks.bench_personalize --backend mongod --products 1000000 --load
+
+A user is created with random bag and favourites products, then each listing is
+timed over random pages three ways: without user_id, with user_id and a cached
+affinity (the common case), and with the affinity dropped before every call (the
+first request after a bag/favourites change). Before timing, rerank is applied to
+loaded base pages and every product is checked to stay within its
+PERSONALIZE_BLOCK-aligned block. (Fetching the base and personalized pages separately
+would not work for /products/, whose base order is reshuffled on every request.)
+"""
+import argparse
+import random
+import time
+from typing import Callable, Dict, List
+
+from .load import configure, load_catalog
+from .run import summarize
+
+
+def block_violation(records: List, reranked: List, start: int, block: int):
+    """Id of the first product rerank moved out of its block, or None."""
+    before = {record.id: start + offset for offset, record in enumerate(records)}
+    for offset, record in enumerate(reranked):
+        position = before.get(record.id)
+        if position is None or position // block != (start + offset) // block:
+            return record.id
+    return None
+
+
+def time_pages(fn: Callable, pages: List[int], before: Callable = None) -> Dict:
+    latencies = []
+    started = time.perf_counter()
+    for skip in pages:
+        if before is not None:
+            before()
+        call_started = time.perf_counter()
+        fn(skip)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, 0, time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="mongod")
+    parser.add_argument("--uri", help="MongoDB URI for --backend mongod (default mongodb://localhost:27017)")
+    parser.add_argument("--database", default="halfsy_bench")
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--load", action="store_true", help="(Re)generate and load the catalog first")
+    parser.add_argument("--requests", type=int, default=300, help="Timed calls per listing and mode")
+    parser.add_argument("--limit", type=int, default=24)
+    parser.add_argument("--pages", type=int, default=50, help="Pages sampled from the top of each listing")
+    parser.add_argument("--signals", type=int, default=30, help="Products in the user's bag and favourites")
+    parser.add_argument("--seed", type=int, default=16)
+    args = parser.parse_args()
+
+    patcher = configure(args.backend, args.uri, args.database)
+    if args.load or args.backend == "memory":
+        load_catalog(args.products, seed=args.seed)
+
+    from core.config import settings
+    from core.database import products_collection, users_collection
+    from products.personalize import rerank
+    from products.service import ProductService, affinities
+    from products.snapshot import catalog_snapshot
+
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        # As a worker would have it at startup; /latest is served from it
+        catalog_snapshot.build()
+
+    rng = random.Random(args.seed)
+    product_ids = [str(doc["_id"]) for doc in products_collection.find({}, {"_id": 1}).limit(20000)]
+    saved = rng.sample(product_ids, min(args.signals, len(product_ids)))
+    user_id = str(users_collection.insert_one({
+        "email": "bench-personalize@example.com",
+        "bag": saved[:len(saved) // 3],
+        "favourites": saved[len(saved) // 3:],
+    }).inserted_id)
+
+    print(f"block {settings.PERSONALIZE_BLOCK}, weight {settings.PERSONALIZE_WEIGHT}, budget {settings.PERSONALIZE_BUDGET_MS:g} ms")
+    header = f"{'listing':<10}{'mode':<12}{'p50 ms':>10}{'p95 ms':>10}{'+p95 ms':>10}"
+    print(header)
+    print("-" * len(header))
+    try:
+        affinity = affinities.get(user_id, 10.0)
+        if affinity is None or affinity.empty:
+            raise SystemExit("could not build the benchmark user's affinity")
+        listings = {"latest": ProductService.get_latest_products, "price": ProductService.get_products}
+        for listing, fetch in listings.items():
+            pages = [rng.randrange(args.pages) * args.limit + rng.randrange(args.limit) for _ in range(args.requests)]
+            try:
+                mismatch = None
+                for skip in set(pages[:20]):
+                    records = list(fetch(args.limit, skip)[1])
+                    reranked = rerank(records, skip, affinity)
+                    if len(reranked) != len(records) or block_violation(records, reranked, skip, settings.PERSONALIZE_BLOCK):
+                        mismatch = skip
+                        break
+            except NotImplementedError as e:
+                # mongomock lacks some aggregation operators
+                print(f"{listing:<10}not supported on this backend: {e}")
+                continue
+            if mismatch is not None:
+                print(f"{listing:<10}MISMATCH at skip={mismatch}: reranked page moves products across blocks")
+                continue
+
+            base = time_pages(lambda skip: fetch(args.limit, skip), pages)
+            modes = {
+                "base": base,
+                "warm": time_pages(lambda skip: fetch(args.limit, skip, user_id), pages),
+                "cold": time_pages(lambda skip: fetch(args.limit, skip, user_id), pages, lambda: affinities.invalidate(user_id)),
+            }
+            for mode, stats in modes.items():
+                added = stats["p95_ms"] - base["p95_ms"]
+                print(f"{listing:<10}{mode:<12}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}{added:>10.2f}")
+                listing = ""
+    finally:
+        users_collection.delete_one({"email": "bench-personalize@example.com"})
+        if patcher is not None:
+            patcher.stop()
+
+
+if __name__ == "__main__":
+    main()
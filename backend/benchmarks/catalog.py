@@ -0,0 +1,167 @@
+"""
+Synthetic product catalog matching the shape the scraper writes into `products`
+(see products.models.Product), including its quirks: brand spelling variants,
+prices stored as "$1,234.00" strings, comma-separated sizes with "See all sizes",
+missing or non-http images and products without a real discount.
+"""
+import random
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Tuple
+
+
+# Canonical brand -> spellings seen in scraped data
+BRAND_VARIANTS: Dict[str, List[str]] = {
+    "Brunello Cucinelli": ["Brunello Cucinelli"],
+    "Loro Piana": ["Loro Piana"],
+    "Zegna": ["Zegna", "Ermenegildo Zegna", "ERMENEGILDO ZEGNA"],
+    "Tom Ford": ["Tom Ford", "TOM FORD"],
+    "Kiton": ["Kiton", "KITON"],
+    "Ferragamo": ["Salvatore Ferragamo", "Ferragamo", "FERRAGAMO"],
+    "Bottega Veneta": ["Bottega Veneta", "BOTTEGA VENETA"],
+    "Hermès": ["Hermes", "Hermès", "HERMÈS"],
+    "Chanel": ["Chanel", "CHANEL"],
+    "Zimmermann": ["Zimmerman", "Zimmermann", "ZIMMERMANN"],
+    "Valentino": ["Valentino", "Valentino Garavani", "VALENTINO"],
+    "Dolce & Gabbana": ["Dolce & Gabbana", "Dolce&Gabbana", "DOLCE & GABBANA", "DOLCE&GABBANA"],
+    "Etro": ["Etro", "ETRO"],
+    "Gucci": ["Gucci", "GUCCI"],
+    "Louis Vuitton": ["Louis Vuitton", "LOUIS VUITTON"],
+    "Prada": ["Prada"],
+    "Saint Laurent": ["Saint Laurent"],
+    "Balenciaga": ["Balenciaga"],
+    "Burberry": ["Burberry"],
+    "Off-White": ["Off-White"],
+    "Stone Island": ["Stone Island"],
+    "Theory": ["Theory"],
+    "Jacquemus": ["JACQUEMUS", "Jacquemus"],
+    "Tod's": ["TOD's", "Tod's"],
+}
+
+# Category -> sub-categories
+CATEGORIES: Dict[str, List[str]] = {
+    "Bags": ["tote bags", "shoulder bags", "clutches", "backpacks"],
+    "Shoes": ["sneakers", "loafers", "boots", "sandals"],
+    "Clothing": ["knitwear", "coats", "dresses", "shirts", "trousers"],
+    "Accessories": ["belts", "scarves", "sunglasses", "wallets"],
+    "Jewelry & Watches": ["bracelets", "necklaces", "watches"],
+}
+
+GENDERS = ["men", "women", "unisex"]
+OCCASIONS = ["casual", "formal", "evening", "resort", "work", None]
+COLORS = ["Black", "White", "Navy", "Beige", "Brown", "Grey", "Red", "Green", "Camel"]
+MATERIALS = ["cashmere", "leather", "silk", "wool", "cotton", "linen", "suede", "canvas"]
+ADJECTIVES = ["classic", "oversized", "slim", "quilted", "tailored", "cropped", "double-breasted", "mini"]
+CLOTHING_SIZES = ["XS", "S", "M", "L", "XL", "XXL"]
+SHOE_SIZES = ["38", "39", "40", "41", "42", "43", "44", "45"]
+
+
+def _format_price(rng: random.Random, value: float):
+    # Roughly one in six scraped prices arrives as a formatted string
+    if rng.random() < 0.15:
+        return f"${value:,.2f}"
+    return round(value, 2)
+
+
+def _sizes(rng: random.Random, category: str):
+    if category not in ("Clothing", "Shoes"):
+        return None if rng.random() < 0.5 else ""
+    pool = SHOE_SIZES if category == "Shoes" else CLOTHING_SIZES
+    sizes = sorted(rng.sample(pool, rng.randint(1, len(pool))), key=pool.index)
+    roll = rng.random()
+    if roll < 0.45:
+        return ", ".join(sizes + (["See all sizes"] if rng.random() < 0.3 else []))
+    if roll < 0.9:
+        return sizes
+    return None
+
+
+def _colors(rng: random.Random):
+    colors = rng.sample(COLORS, rng.randint(1, 3))
+    return ", ".join(colors) if rng.random() < 0.5 else colors
+
+
+def _image(rng: random.Random, index: int):
+    roll = rng.random()
+    if roll < 0.95:
+        return f"https://cdn.example.com/products/{index}.jpg"
+    if roll < 0.98:
+        return ""
+    return None
+
+
+def generate_product(rng: random.Random, index: int, now: datetime) -> Dict:
+    canonical = rng.choice(list(BRAND_VARIANTS))
+    brand = rng.choice(BRAND_VARIANTS[canonical])
+    category = rng.choice(list(CATEGORIES))
+    sub_category = rng.choice(CATEGORIES[category])
+    material = rng.choice(MATERIALS)
+    name = f"{rng.choice(ADJECTIVES)} {material} {sub_category}"
+
+    original = round(rng.lognormvariate(7.0, 0.9) + 50, 2)
+    # A few products are scraped without a markdown and get filtered out downstream
+    discount_pct = 0 if rng.random() < 0.05 else rng.choice([10, 20, 25, 30, 40, 50, 60, 70])
+    sale = round(original * (100 - discount_pct) / 100, 2)
+
+    doc = {
+        "product_link": f"https://shop.example.com/p/{index}",
+        "product_image": _image(rng, index),
+        "brand_name": brand,
+        "product_name": name,
+        "product_description": f"{name.capitalize()} by {canonical} in {material}. Made in Italy.",
+        "product_category": category,
+        "product_sub_category": sub_category,
+        "product_gender": rng.choice(GENDERS),
+        "product_color": _colors(rng),
+        "product_material": material,
+        "product_occasion": rng.choice(OCCASIONS),
+        "currency": "USD",
+        "original_price": _format_price(rng, original),
+        "sale_price": _format_price(rng, sale),
+        "discount": discount_pct,
+        "search_tags": f"{canonical.lower()} {category.lower()} {sub_category} {material}",
+        "available_sizes": _sizes(rng, category),
+        "scraped_at": (now - timedelta(minutes=rng.randint(0, 90 * 24 * 60))).isoformat(),
+    }
+    if doc["product_image"] is None:
+        del doc["product_image"]
+    return doc
+
+
+def generate_catalog(count: int, seed: int = 16, start: int = 0) -> Iterator[Dict]:
+    """Yield `count` products deterministically for a given seed."""
+    rng = random.Random(seed + start)
+    now = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    for index in range(start, start + count):
+        yield generate_product(rng, index, now)
+
+
+def generate_batches(count: int, batch_size: int = 5000, seed: int = 16) -> Iterator[List[Dict]]:
+    for start in range(0, count, batch_size):
+        yield list(generate_catalog(min(batch_size, count - start), seed=seed, start=start))
+
+
+def _brand_is(canonical: str) -> Callable[[Dict], bool]:
+    variants = {v.lower() for v in BRAND_VARIANTS[canonical]}
+    return lambda doc: str(doc.get("brand_name") or "").lower() in variants
+
+
+def _field_is(field: str, value: str) -> Callable[[Dict], bool]:
+    # API responses re-case text fields, so compare case-insensitively
+    return lambda doc: str(doc.get(field) or "").lower() == value.lower()
+
+
+def _and(*predicates: Callable[[Dict], bool]) -> Callable[[Dict], bool]:
+    return lambda doc: all(p(doc) for p in predicates)
+
+
+# Search queries with a ground-truth relevance predicate over generated documents
+RELEVANCE_QUERIES: List[Tuple[str, Callable[[Dict], bool]]] = [
+    ("gucci bag", _and(_brand_is("Gucci"), _field_is("product_category", "Bags"))),
+    ("loro piana", _brand_is("Loro Piana")),
+    ("cashmere knitwear", _and(_field_is("product_material", "cashmere"), _field_is("product_sub_category", "knitwear"))),
+    ("dolce gabbana", _brand_is("Dolce & Gabbana")),
+    ("hermes", _brand_is("Hermès")),
+    ("leather loafers", _and(_field_is("product_material", "leather"), _field_is("product_sub_category", "loafers"))),
+    ("zegna", _brand_is("Zegna")),
+    ("suede boots", _and(_field_is("product_material", "suede"), _field_is("product_sub_category", "boots"))),
+]
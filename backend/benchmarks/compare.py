@@ -0,0 +1,71 @@
+"""
+Compare two benchmark result files, e.g. the results for two commits:
+
+    python -m benchmarks.compare 1a9d606 408a3e2
+    python -m benchmarks.compare benchmarks/results/a.json benchmarks/results/b.json
+
+Arguments may be file paths or commit prefixes of files in benchmarks/results/.
+"""
+import argparse
+import json
+from pathlib import Path
+from typing import Dict
+
+from .run import RESULTS_DIR
+
+
+def resolve(ref: str) -> Path:
+    path = Path(ref)
+    if path.exists():
+        return path
+    matches = sorted(RESULTS_DIR.glob(f"{ref}*.json"))
+    if not matches:
+        raise SystemExit(f"No results found for {ref}")
+    if len(matches) > 1:
+        raise SystemExit(f"{ref} is ambiguous: {', '.join(m.name for m in matches)}")
+    return matches[0]
+
+
+def change(before: float, after: float) -> str:
+    if not before:
+        return "n/a"
+    return f"{(after - before) / before * 100:+.1f}%"
+
+
+def compare(baseline: Dict, candidate: Dict):
+    print(f"baseline:  {baseline.get('commit')} {baseline.get('subject', '')}")
+    print(f"candidate: {candidate.get('commit')} {candidate.get('subject', '')}\n")
+
+    header = f"{'endpoint':<24}{'metric':<16}{'baseline':>12}{'candidate':>12}{'change':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, before in baseline["endpoints"].items():
+        after = candidate["endpoints"].get(name)
+        if not after:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "throughput_rps"):
+            print(
+                f"{name:<24}{metric:<16}{before[metric]:>12.2f}{after[metric]:>12.2f}"
+                f"{change(before[metric], after[metric]):>10}"
+            )
+
+    before_rel = baseline.get("relevance", {})
+    after_rel = candidate.get("relevance", {})
+    for key in before_rel:
+        if key.startswith("mean_precision") and key in after_rel:
+            print(f"\nsearch {key}: {before_rel[key]} -> {after_rel[key]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    args = parser.parse_args()
+    compare(
+        json.loads(resolve(args.baseline).read_text()),
+        json.loads(resolve(args.candidate).read_text()),
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""
+Point the app at a benchmark database and fill it with the synthetic catalog.
+
+`core.database` connects at import time, so `configure()` must run before anything
+under products/, users/ or main is imported.
+"""
+import os
+import time
+from typing import Optional
+
+from .catalog import generate_batches
+
+
+def configure(backend: str, uri: Optional[str] = None, database: str = "halfsy_bench"):
+    """
+    Route the app's database connection to the benchmark target.
+
+    backend="mongod" uses a real server at `uri` (a local mongod by default).
+    backend="memory" patches pymongo with mongomock, an in-memory stand-in; Atlas
+    Search stages are not available there, so /search exercises the regex fallback.
+    Returns the patcher for the memory backend so the caller can keep it alive.
+    """
+    os.environ["DATABASE_NAME"] = database
+    if backend == "mongod":
+        os.environ["MONGODB_URI"] = uri or "mongodb://localhost:27017"
+        return None
+    if backend == "memory":
+        try:
+            import mongomock
+        except ImportError as exc:
+            raise SystemExit("The memory backend needs mongomock: pip install mongomock") from exc
+        os.environ["MONGODB_URI"] = "mongodb://localhost:27017"
+        patcher = mongomock.patch(servers=(("localhost", 27017),))
+        patcher.start()
+        return patcher
+    raise SystemExit(f"Unknown backend: {backend}")
+
+
+def load_catalog(count: int, batch_size: int = 5000, seed: int = 16, drop: bool = True) -> float:
+    """Insert `count` synthetic products into the configured products collection. Returns seconds taken."""
+    from core.database import products_collection
+
+    if drop:
+        products_collection.delete_many({})
+
+    started = time.perf_counter()
+    inserted = 0
+    for batch in generate_batches(count, batch_size=batch_size, seed=seed):
+        products_collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        print(f"\rloaded {inserted:,}/{count:,} products", end="", flush=True)
+    print()
+    return time.perf_counter() - started
@@ -0,0 +1,281 @@
+"""
+Latency/throughput benchmark for every endpoint in products/router.py, plus search
+relevance (precision@k) against the synthetic catalog's ground truth.
+
+    python -m benchmarks.run --backend memory --products 100000 --load
+    python -m benchmarks.run --backend mongod --uri mongodb://localhost:27017 --products 1000000 --load
+    python -m benchmarks.run --base-url http://localhost:8000 --backend mongod --requests 2000
+
+By default requests go to the app in-process through httpx's ASGI transport; pass
+--base-url to benchmark a running uvicorn instead. Results are written to
+benchmarks/results/<commit>.json for benchmarks.compare.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import subprocess
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from .load import configure, load_catalog
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    # Called per request with a Random so scenarios can vary ids, queries, etc.
+    build: Optional[Callable[[random.Random], Dict]] = None
+    params: Dict = field(default_factory=dict)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(pct / 100 * len(sorted_values)) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def summarize(latencies: List[float], errors: int, wall: float) -> Dict:
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+    }
+
+
+def build_scenarios(sample_ids: List[str], sample_links: List[str]) -> List[Scenario]:
+    from .catalog import RELEVANCE_QUERIES
+
+    queries = [q for q, _ in RELEVANCE_QUERIES]
+    return [
+        Scenario("top_deals", "GET", "/api/products/top-deals", params={"limit": 4}),
+        Scenario("latest", "GET", "/api/products/latest", params={"limit": 100}),
+        Scenario("list", "GET", "/api/products/", params={"limit": 100}),
+        Scenario("gender", "GET", "/api/products/gender/women", params={"limit": 100}),
+        Scenario("filter_metadata", "GET", "/api/products/filter/metadata"),
+        Scenario(
+            "filter_facets", "GET", "/api/products/filter/products",
+            params={"category": "bags", "brand": ["gucci", "prada"], "sort_by": "price-asc", "limit": 100}
+        ),
+        Scenario(
+            "filter_price_discount", "GET", "/api/products/filter/products",
+            params={"price_min": 500, "price_max": 1000, "sort_by": "discount-desc", "limit": 100}
+        ),
+        Scenario(
+            "facet_counts", "GET", "/api/products/filter/facet-counts",
+            params={"category": "bags", "gender": "women", "price_min": 500, "price_max": 1000}
+        ),
+        Scenario(
+            "price_histogram", "GET", "/api/products/filter/price-histogram",
+            params={"brand": ["gucci", "prada"], "bins": 20}
+        ),
+        Scenario(
+            "search", "GET", "/api/products/search",
+            build=lambda rng: {"params": {"q": rng.choice(queries), "limit": 20}}
+        ),
+        Scenario(
+            "search_suggestions", "GET", "/api/products/search/suggestions",
+            build=lambda rng: {"params": {"q": rng.choice(queries)[:4]}}
+        ),
+        Scenario(
+            "by_links", "POST", "/api/products/by-links",
+            build=lambda rng: {"json": {"product_links": rng.sample(sample_links, min(20, len(sample_links)))}}
+        ),
+        Scenario(
+            "curated", "POST", "/api/products/curated",
+            build=lambda rng: {"json": {"brand_keyword_pairs": [
+                {"brand_name": "Gucci", "keyword": "bag"},
+                {"brand_name": "Loro Piana", "keyword": "cashmere"},
+            ]}}
+        ),
+        Scenario(
+            "product_detail", "GET", "/api/products/{product_id}",
+            build=lambda rng: {"path": {"product_id": rng.choice(sample_ids)}}
+        ),
+        Scenario(
+            "similar", "GET", "/api/products/{product_id}/similar",
+            build=lambda rng: {"path": {"product_id": rng.choice(sample_ids)}},
+            params={"limit": 12}
+        ),
+    ]
+
+
+async def run_scenario(client, scenario: Scenario, requests: int, concurrency: int, warmup: int, seed: int) -> Dict:
+    rng = random.Random(seed)
+    latencies: List[float] = []
+    errors = 0
+    remaining = warmup + requests
+
+    async def one(record: bool):
+        nonlocal errors
+        extra = scenario.build(rng) if scenario.build else {}
+        path = scenario.path.format(**extra.get("path", {}))
+        params = {**scenario.params, **extra.get("params", {})}
+        started = time.perf_counter()
+        response = await client.request(scenario.method, path, params=params or None, json=extra.get("json"))
+        elapsed = time.perf_counter() - started
+        if record:
+            latencies.append(elapsed)
+            if response.status_code >= 400:
+                errors += 1
+
+    for _ in range(warmup):
+        await one(record=False)
+        remaining -= 1
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await one(record=True)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - started)
+
+
+async def measure_relevance(client, k: int) -> Dict:
+    """precision@k of /search for each ground-truth query."""
+    from .catalog import RELEVANCE_QUERIES
+
+    per_query = {}
+    for query, is_relevant in RELEVANCE_QUERIES:
+        response = await client.get("/api/products/search", params={"q": query, "limit": k})
+        products = response.json().get("products", []) if response.status_code == 200 else []
+        hits = sum(1 for p in products if is_relevant(p))
+        per_query[query] = {
+            "returned": len(products),
+            "total": response.json().get("total", 0) if response.status_code == 200 else 0,
+            f"precision_at_{k}": round(hits / k, 4),
+        }
+    mean = sum(q[f"precision_at_{k}"] for q in per_query.values()) / len(per_query)
+    return {f"mean_precision_at_{k}": round(mean, 4), "queries": per_query}
+
+
+def git_revision() -> Dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], capture_output=True, text=True, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+    return {
+        "commit": git("rev-parse", "--short", "HEAD") or "unknown",
+        "subject": git("log", "-1", "--format=%s"),
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+    }
+
+
+def print_table(endpoints: Dict[str, Dict]):
+    header = f"{'endpoint':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>10}{'errors':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in endpoints.items():
+        print(
+            f"{name:<24}{stats['p50_ms']:>10.2f}{stats['p95_ms']:>10.2f}"
+            f"{stats['p99_ms']:>10.2f}{stats['throughput_rps']:>10.1f}{stats['errors']:>8}"
+        )
+
+
+async def main_async(args) -> Dict:
+    import httpx
+    from core.database import products_collection
+
+    sample = list(products_collection.find({}, {"_id": 1, "product_link": 1}).limit(2000))
+    sample_ids = [str(doc["_id"]) for doc in sample]
+    sample_links = [doc["product_link"] for doc in sample if doc.get("product_link")]
+
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=60)
+    else:
+        from main import app
+        from products.similar import similar_index
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=60)
+        # The ASGI transport runs no startup hooks; build the index /similar is served from
+        similar_index.build()
+
+    scenarios = build_scenarios(sample_ids, sample_links)
+    if args.only:
+        scenarios = [s for s in scenarios if s.name in args.only]
+
+    endpoints = {}
+    async with client:
+        for scenario in scenarios:
+            print(f"running {scenario.name} ...", flush=True)
+            endpoints[scenario.name] = await run_scenario(
+                client, scenario, args.requests, args.concurrency, args.warmup, args.seed
+            )
+        relevance = await measure_relevance(client, args.k)
+
+    return {"endpoints": endpoints, "relevance": relevance}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=["memory", "mongod"], default="memory")
+    parser.add_argument("--uri", help="MongoDB URI for --backend mongod (default mongodb://localhost:27017)")
+    parser.add_argument("--database", default="halfsy_bench")
+    parser.add_argument("--products", type=int, default=100_000, help="Catalog size (100k-5M)")
+    parser.add_argument("--load", action="store_true", help="(Re)generate and load the catalog first")
+    parser.add_argument("--base-url", help="Benchmark a running server instead of the in-process app")
+    parser.add_argument("--requests", type=int, default=500, help="Measured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--k", type=int, default=20, help="Cut-off for search precision@k")
+    parser.add_argument("--seed", type=int, default=16)
+    parser.add_argument("--only", nargs="*", help="Run only these scenarios")
+    parser.add_argument("--output", type=Path, help="Results file (default benchmarks/results/<commit>.json)")
+    args = parser.parse_args()
+
+    # Keep the patcher referenced for the life of the run
+    patcher = configure(args.backend, args.uri, args.database)
+    # Memory backend data lives in this process, so it always needs loading
+    load_seconds = None
+    if args.load or args.backend == "memory":
+        load_seconds = round(load_catalog(args.products, seed=args.seed), 2)
+
+    results = asyncio.run(main_async(args))
+    revision = git_revision()
+    report = {
+        **revision,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            "backend": args.backend,
+            "products": args.products,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "base_url": args.base_url,
+            "load_seconds": load_seconds,
+        },
+        **results,
+    }
+
+    print_table(report["endpoints"])
+    print(f"\nsearch mean precision@{args.k}: {results['relevance'][f'mean_precision_at_{args.k}']}")
+
+    output = args.output or RESULTS_DIR / f"{revision['commit']}{'-dirty' if revision['dirty'] else ''}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    print(f"results written to {output}")
+    if patcher is not None:
+        patcher.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+Write batching and flood control for contact submissions.
+
+Submissions are acknowledged as soon as they are queued in this worker: the id is
+an ObjectId generated here, and a flusher writes the buffer with one insert_many
+once CONTACT_FLUSH_SIZE submissions are waiting or CONTACT_FLUSH_SECONDS have
+passed. The buffer is flushed on shutdown; a worker killed outright loses at most
+one flush interval of submissions.
+
+Before queueing, a submission is checked against fixed-window limits per client
+IP and per email, and identical (email, message) pairs seen within
+CONTACT_DEDUPE_SECONDS return the first submission's id without another write.
+"""
+import asyncio
+import hashlib
+import time
+from typing import Any, Dict, List, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import get_async_db
+from core.log import get_logger
+from core.metrics import registry
+
+
+logger = get_logger("contact.buffer")
+
+contact_submissions = registry.counter(
+    "contact_submissions_total",
+    "Contact form submissions by outcome",
+    ["outcome"]
+)
+contact_flush_size = registry.histogram(
+    "contact_flush_size",
+    "Messages written per contact buffer flush",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500)
+)
+
+# Flushes that fail are retried with the next flush; beyond this many queued
+# messages the oldest failed ones are dropped rather than growing without bound
+MAX_BUFFERED = 10000
+
+
+class RateLimiter:
+    """Fixed-window counter per key, bounded in memory by an LRU/TTL cache."""
+
+    def __init__(self, name: str, limit: int, window: float, maxsize: int = 50000):
+        self.limit = limit
+        self.window = window
+        self._windows = TTLCache(name, maxsize, window)
+
+    def hit(self, key: str) -> Optional[float]:
+        """Count one hit for `key`. Returns None if allowed, else seconds until the window resets."""
+        now = time.monotonic()
+        window_end, count = self._windows.get(key) or (now + self.window, 0)
+        if count >= self.limit:
+            return max(window_end - now, 0.0)
+        self._windows.set(key, (window_end, count + 1), ttl=window_end - now)
+        return None
+
+
+def dedupe_key(email: str, message: str) -> str:
+    normalized = email.strip().lower() + "\0" + " ".join(message.split()).lower()
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+class SubmissionBuffer:
+    """In-process queue of contact documents written in batches."""
+
+    def __init__(self):
+        self._pending: List[Dict[str, Any]] = []
+        self._flush_now: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+        # Called after each successful flush (the mailer's wake-up)
+        self.on_flush = None
+
+    def add(self, doc: Dict[str, Any]) -> ObjectId:
+        doc.setdefault("_id", ObjectId())
+        self._pending.append(doc)
+        if len(self._pending) >= settings.CONTACT_FLUSH_SIZE and self._flush_now is not None:
+            self._flush_now.set()
+        return doc["_id"]
+
+    async def flush(self) -> int:
+        """Write everything queued so far. Returns the number of documents written."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            batch, self._pending = self._pending, []
+            if not batch:
+                return 0
+            try:
+                await get_async_db()["messages"].insert_many(batch, ordered=False)
+            except Exception as e:
+                written = set()
+                if isinstance(e, BulkWriteError):
+                    # Unordered: the rest of the batch was written. Duplicate keys are documents
+                    # an earlier, partly failed flush already wrote
+                    failed = {error["index"] for error in e.details.get("writeErrors", []) if error.get("code") != 11000}
+                    written = {doc["_id"] for index, doc in enumerate(batch) if index not in failed}
+                retry = [doc for doc in batch if doc["_id"] not in written]
+                self._pending = (retry + self._pending)[-MAX_BUFFERED:]
+                logger.error("contact buffer flush failed", extra={"queued": len(self._pending), "error": str(e)})
+                return len(written)
+        contact_flush_size.observe(len(batch))
+        if self.on_flush is not None:
+            self.on_flush()
+        return len(batch)
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_now.wait(), settings.CONTACT_FLUSH_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_now.clear()
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._flush_now = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+submission_buffer = SubmissionBuffer()
+ip_limiter = RateLimiter("contact_ip", settings.CONTACT_IP_LIMIT, settings.CONTACT_RATE_WINDOW)
+email_limiter = RateLimiter("contact_email", settings.CONTACT_EMAIL_LIMIT, settings.CONTACT_RATE_WINDOW)
+recent_submissions = TTLCache("contact_dedupe", 50000, settings.CONTACT_DEDUPE_SECONDS)
@@ -0,0 +1,231 @@
+"""
+Outbound mail queue for contact submissions.
+
+The `messages` collection is the queue: a submission is stored with a `delivery`
+sub-document ({status: pending, attempts, next_attempt_at}) and the Mailer task on
+the event loop claims due messages in batches, sends them over one SMTP connection
+kept open between batches, and records the outcome:
+
+    pending -> sending -> sent
+                       -> pending (retry after MAIL_RETRY_BASE_SECONDS * 2**attempts)
+                       -> failed  (after MAIL_MAX_ATTEMPTS)
+
+Claims are atomic and leased, so several workers can run a Mailer and a message
+held by a worker that died is picked up again once its lease expires.
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Any, Dict, List, Optional
+
+import aiosmtplib
+from pymongo import ASCENDING, ReturnDocument
+
+from core.config import settings
+from core.database import get_async_db
+from core.log import get_logger
+from core.metrics import registry
+
+
+logger = get_logger("contact.mailer")
+
+mail_deliveries = registry.counter(
+    "mail_deliveries_total",
+    "Contact mail send attempts by outcome",
+    ["outcome"]
+)
+mail_send_seconds = registry.histogram(
+    "mail_send_seconds",
+    "Time to send one contact mail, including connecting when needed"
+)
+
+# How long a claimed message is reserved for the worker sending it
+LEASE_SECONDS = 120
+MAX_RETRY_SECONDS = 3600
+
+
+def pending_delivery(now: datetime) -> Dict[str, Any]:
+    """`delivery` sub-document for a newly stored message."""
+    return {"status": "pending", "attempts": 0, "next_attempt_at": now}
+
+
+def build_message(email: str, message: str) -> MIMEMultipart:
+    msg = MIMEMultipart()
+    msg["From"] = settings.OUTLOOK_USER
+    msg["To"] = settings.OUTLOOK_USER
+    msg["Subject"] = "New Contact Form Submission"
+    msg["Reply-To"] = email
+    msg.attach(MIMEText(f"From: {email}\n\n{message}", "plain"))
+    return msg
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at MAX_RETRY_SECONDS."""
+    delay = min(settings.MAIL_RETRY_BASE_SECONDS * (2 ** (attempts - 1)), MAX_RETRY_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def ensure_indexes():
+    await get_async_db()["messages"].create_index(
+        [("delivery.status", ASCENDING), ("delivery.next_attempt_at", ASCENDING)],
+        name="delivery_status_1_delivery_next_attempt_at_1"
+    )
+
+
+class Mailer:
+    """Drains due messages from the queue over a reused SMTP connection."""
+
+    def __init__(self):
+        self._smtp: Optional[aiosmtplib.SMTP] = None
+        self._last_used = 0.0
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def collection(self):
+        return get_async_db()["messages"]
+
+    def wake(self):
+        """Called after enqueueing on this worker so the message goes out without waiting for the poll."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def _connection(self) -> aiosmtplib.SMTP:
+        loop = asyncio.get_running_loop()
+        if self._smtp is not None and self._smtp.is_connected:
+            if loop.time() - self._last_used < settings.SMTP_IDLE_SECONDS:
+                return self._smtp
+            await self._close()
+
+        smtp = aiosmtplib.SMTP(
+            hostname=settings.SMTP_HOST,
+            port=settings.SMTP_PORT,
+            timeout=settings.SMTP_TIMEOUT,
+            start_tls=settings.SMTP_STARTTLS
+        )
+        await smtp.connect()
+        if settings.OUTLOOK_PASSWORD:
+            await smtp.login(settings.OUTLOOK_USER, settings.OUTLOOK_PASSWORD)
+        self._smtp = smtp
+        return smtp
+
+    async def _close(self):
+        smtp, self._smtp = self._smtp, None
+        if smtp is None:
+            return
+        try:
+            await smtp.quit()
+        except Exception:
+            smtp.close()
+
+    async def _claim(self, limit: int) -> List[Dict[str, Any]]:
+        now = datetime.now(timezone.utc)
+        due = {"$or": [
+            {"delivery.status": "pending", "delivery.next_attempt_at": {"$lte": now}},
+            {"delivery.status": "sending", "delivery.lease_expires": {"$lt": now}},
+        ]}
+        claimed = []
+        for _ in range(limit):
+            doc = await self.collection.find_one_and_update(
+                due,
+                {
+                    "$set": {"delivery.status": "sending", "delivery.lease_expires": now + timedelta(seconds=LEASE_SECONDS)},
+                    "$inc": {"delivery.attempts": 1},
+                },
+                projection={"email": 1, "message": 1, "delivery.attempts": 1},
+                sort=[("delivery.next_attempt_at", ASCENDING)],
+                return_document=ReturnDocument.AFTER
+            )
+            if doc is None:
+                break
+            claimed.append(doc)
+        return claimed
+
+    async def _send(self, doc: Dict[str, Any]):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        msg = build_message(doc["email"], doc["message"])
+        try:
+            smtp = await self._connection()
+            await smtp.send_message(msg)
+        except Exception:
+            # The connection may be half-broken; start clean on the next send
+            await self._close()
+            raise
+        finally:
+            mail_send_seconds.observe(loop.time() - started)
+        self._last_used = loop.time()
+
+    async def _record(self, doc: Dict[str, Any], error: Optional[Exception]):
+        now = datetime.now(timezone.utc)
+        attempts = doc["delivery"]["attempts"]
+        if error is None:
+            update = {"$set": {"delivery.status": "sent", "delivery.sent_at": now}}
+            outcome = "sent"
+        elif attempts >= settings.MAIL_MAX_ATTEMPTS:
+            update = {"$set": {"delivery.status": "failed", "delivery.last_error": str(error)}}
+            outcome = "failed"
+            logger.error("giving up on contact mail", extra={"message_id": str(doc["_id"]), "attempts": attempts, "error": str(error)})
+        else:
+            update = {"$set": {
+                "delivery.status": "pending",
+                "delivery.next_attempt_at": now + timedelta(seconds=retry_delay(attempts)),
+                "delivery.last_error": str(error),
+            }}
+            outcome = "retry"
+            logger.warning("contact mail failed, will retry", extra={"message_id": str(doc["_id"]), "attempts": attempts, "error": str(error)})
+        update["$unset"] = {"delivery.lease_expires": ""}
+        await self.collection.update_one({"_id": doc["_id"]}, update)
+        mail_deliveries.inc(outcome=outcome)
+
+    async def drain(self) -> int:
+        """Send every message that is due. Returns the number of messages attempted."""
+        attempted = 0
+        while True:
+            batch = await self._claim(settings.MAIL_BATCH_SIZE)
+            if not batch:
+                return attempted
+            for doc in batch:
+                try:
+                    await self._send(doc)
+                    error = None
+                except Exception as e:
+                    error = e
+                await self._record(doc, error)
+            attempted += len(batch)
+
+    async def run(self):
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("mail queue drain failed")
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.MAIL_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._smtp is not None and asyncio.get_running_loop().time() - self._last_used >= settings.SMTP_IDLE_SECONDS:
+                await self._close()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self._close()
+
+
+mailer = Mailer()
@@ -1,16 +1,51 @@
-from fastapi import APIRouter, BackgroundTasks
+import ipaddress
+from typing import Optional
+
+from fastapi import APIRouter, Request
+from core.config import settings
 from .models import ContactForm
 from .service import ContactService
 
 router = APIRouter(prefix="/api/contact", tags=["Contact"])
 
+_trusted_proxies = [ipaddress.ip_network(proxy, strict=False) for proxy in settings.TRUSTED_PROXIES]
+
+
+def _is_trusted(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in _trusted_proxies)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The submitting client's IP. X-Forwarded-For is read right to left only while the
+    hop that appended it is a trusted proxy, so clients cannot spoof it.
+    """
+    peer: Optional[str] = request.client.host if request.client else None
+    if peer is None:
+        return "unknown"
+    if not _is_trusted(peer):
+        return peer
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _is_trusted(hop):
+            return hop
+    return hops[0] if hops else peer
+
+
 @router.post("/")
-def submit(contact: ContactForm, background: BackgroundTasks):
-    result = ContactService.save_message(contact.email, contact.message)
-    background.add_task(ContactService.send_email, contact.email, contact.message)
+async def submit(contact: ContactForm, request: Request):
+    message_id = ContactService.submit(
+        contact.email,
+        contact.message,
+        client_ip(request)
+    )
 
     return {
         "success": True,
-        "id": str(result.inserted_id),
+        "id": message_id,
         "message": "Thank you for contacting us!"
     }
@@ -1,36 +1,51 @@
-from core.database import messages_collection
-from core.config import settings
+from fastapi import HTTPException
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
-import smtplib
+from .buffer import (
+    contact_submissions,
+    dedupe_key,
+    email_limiter,
+    ip_limiter,
+    recent_submissions,
+    submission_buffer,
+)
+from .mailer import mailer, pending_delivery
 
-class ContactService:
+# New messages reach the mail queue as soon as their batch is written
+submission_buffer.on_flush = mailer.wake
 
-    @staticmethod
-    def save_message(email: str, message: str):
-        doc = {
-            "email": email,
-            "message": message,
-            "timestamp": datetime.now(ZoneInfo("UTC"))
-        }
-        return messages_collection.insert_one(doc)
+class ContactService:
 
     @staticmethod
-    def send_email(email: str, message: str):
-        if not settings.OUTLOOK_USER:
-            return
-
-        msg = MIMEMultipart()
-        msg["From"] = settings.OUTLOOK_USER
-        msg["To"] = settings.OUTLOOK_USER
-        msg["Subject"] = "New Contact Form Submission"
+    def submit(email: str, message: str, client_ip: str) -> str:
+        """
+        Rate-limit, dedupe and queue a submission for the batched write (see contact.buffer).
+        Returns the message id; the stored document doubles as the outbound mail queue entry.
+        """
+        key = dedupe_key(email, message)
+        duplicate_of = recent_submissions.get(key)
+        if duplicate_of is not None:
+            contact_submissions.inc(outcome="duplicate")
+            return duplicate_of
 
-        msg.attach(MIMEText(f"From: {email}\n\n{message}", "plain"))
+        for limiter, value in ((ip_limiter, client_ip), (email_limiter, email.strip().lower())):
+            retry_after = limiter.hit(value)
+            if retry_after is not None:
+                contact_submissions.inc(outcome="rate_limited")
+                raise HTTPException(
+                    status_code=429,
+                    detail="Too many messages, please try again later",
+                    headers={"Retry-After": str(int(retry_after) + 1)}
+                )
 
-        server = smtplib.SMTP("smtp-mail.outlook.com", 587)
-        server.starttls()
-        server.login(settings.OUTLOOK_USER, settings.OUTLOOK_PASSWORD)
-        server.sendmail(settings.OUTLOOK_USER, settings.OUTLOOK_USER, msg.as_string())
-        server.quit()
+        now = datetime.now(ZoneInfo("UTC"))
+        message_id = str(submission_buffer.add({
+            "email": email,
+            "message": message,
+            "timestamp": now,
+            "client_ip": client_ip,
+            "delivery": pending_delivery(now)
+        }))
+        recent_submissions.set(key, message_id)
+        contact_submissions.inc(outcome="accepted")
+        return message_id
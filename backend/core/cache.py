@@ -0,0 +1,108 @@
+"""
+Bounded in-process TTL cache shared by the service layers
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional
+
+from .metrics import registry
+
+
+cache_requests = registry.counter(
+    "cache_requests_total",
+    "Cache lookups by cache name and result (hit/miss)",
+    ["cache", "result"]
+)
+cache_size = registry.gauge(
+    "cache_entries",
+    "Number of live entries per cache",
+    ["cache"]
+)
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache where every entry also expires after `ttl` seconds.
+    Sync route handlers run in Starlette's threadpool, so all access goes through a lock.
+    """
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _lookup(self, key: Hashable, now: float) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= now:
+            del self._data[key]
+            return _MISSING
+        self._data.move_to_end(key)
+        return value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            value = self._lookup(key, time.monotonic())
+        cache_requests.inc(cache=self.name, result="miss" if value is _MISSING else "hit")
+        return default if value is _MISSING else value
+
+    def get_many(self, keys: Iterable[Hashable]) -> Dict[Hashable, Any]:
+        """Return the cached subset of `keys`; missing or expired keys are omitted."""
+        found = {}
+        misses = 0
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                value = self._lookup(key, now)
+                if value is _MISSING:
+                    misses += 1
+                else:
+                    found[key] = value
+        if found:
+            cache_requests.inc(len(found), cache=self.name, result="hit")
+        if misses:
+            cache_requests.inc(misses, cache=self.name, result="miss")
+        return found
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            size = len(self._data)
+        cache_size.set(size, cache=self.name)
+
+    def set_many(self, mapping: Dict[Hashable, Any], ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            for key, value in mapping.items():
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            size = len(self._data)
+        cache_size.set(size, cache=self.name)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.pop(key, None)
+            size = len(self._data)
+        cache_size.set(size, cache=self.name)
+        return default if entry is None else entry[1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+        cache_size.set(0, cache=self.name)
+
+    def __len__(self) -> int:
+        return len(self._data)
@@ -11,4 +11,112 @@ class Settings:
     DATABASE_NAME = os.getenv("DATABASE_NAME")
     OUTLOOK_USER = os.getenv("OUTLOOK_USER")
     OUTLOOK_PASSWORD = os.getenv("OUTLOOK_PASSWORD")
+
+    # Password hashing (users.passwords): bcrypt cost for new hashes and the pool running it.
+    # Changing BCRYPT_ROUNDS re-hashes each user's password at their next login
+    BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 2)))
+
+    # Outbound contact mail (contact.mailer). Point SMTP_HOST/SMTP_PORT at a local
+    # stand-in such as `python -m aiosmtpd -n -l localhost:1025` with SMTP_STARTTLS=false
+    MAIL_ENABLED = os.getenv("MAIL_ENABLED", "true").lower() == "true"
+    SMTP_HOST = os.getenv("SMTP_HOST", "smtp-mail.outlook.com")
+    SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+    SMTP_STARTTLS = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+    SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+    # The connection is kept open between sends and closed after this long unused
+    SMTP_IDLE_SECONDS = float(os.getenv("SMTP_IDLE_SECONDS", "60"))
+    MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+    MAIL_POLL_SECONDS = float(os.getenv("MAIL_POLL_SECONDS", "10"))
+    MAIL_MAX_ATTEMPTS = int(os.getenv("MAIL_MAX_ATTEMPTS", "6"))
+    MAIL_RETRY_BASE_SECONDS = float(os.getenv("MAIL_RETRY_BASE_SECONDS", "30"))
+
+    # Contact submissions (contact.buffer): write batching, per-IP/email limits and dedupe
+    CONTACT_FLUSH_SIZE = int(os.getenv("CONTACT_FLUSH_SIZE", "50"))
+    CONTACT_FLUSH_SECONDS = float(os.getenv("CONTACT_FLUSH_SECONDS", "1"))
+    CONTACT_RATE_WINDOW = float(os.getenv("CONTACT_RATE_WINDOW", "600"))
+    CONTACT_IP_LIMIT = int(os.getenv("CONTACT_IP_LIMIT", "10"))
+    CONTACT_EMAIL_LIMIT = int(os.getenv("CONTACT_EMAIL_LIMIT", "3"))
+    CONTACT_DEDUPE_SECONDS = float(os.getenv("CONTACT_DEDUPE_SECONDS", "3600"))
+    # Peers (IPs or CIDRs) whose X-Forwarded-For is trusted for the client IP the per-IP
+    # limit keys on; behind a reverse proxy, list the proxy here
+    TRUSTED_PROXIES = [p.strip() for p in os.getenv("TRUSTED_PROXIES", "127.0.0.1,::1").split(",") if p.strip()]
+
+    # In-process caches (sizes are entry counts, TTLs in seconds)
+    PRODUCT_CACHE_SIZE = int(os.getenv("PRODUCT_CACHE_SIZE", "20000"))
+    PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "600"))
+    SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+    SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "300"))
+    # Number of ranked ids kept per cached search; deeper pages go straight to Atlas
+    SEARCH_CACHE_WINDOW = int(os.getenv("SEARCH_CACHE_WINDOW", "400"))
+    # User profiles for GET /users/{user_id} (bag/favourites are always read fresh); other
+    # workers' profile writes are visible after the TTL
+    USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", "30"))
+
+    # Logging and query instrumentation
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    # Mongo commands slower than this are logged with their query shape
+    SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "200"))
+
+    # Sampling profiler: profile requests sent with "X-Profile: <PROFILE_TOKEN>",
+    # plus a random PROFILE_SAMPLE_RATE fraction (0 disables random sampling)
+    PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+    PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+    PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+    PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+
+    # Bulk ingest: requests must send "X-Ingest-Token: <INGEST_TOKEN>"; unset disables the endpoint
+    INGEST_TOKEN = os.getenv("INGEST_TOKEN")
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+
+    # Background data migrations started with the app (the CLI works regardless)
+    RUN_MIGRATIONS = os.getenv("RUN_MIGRATIONS", "false").lower() == "true"
+    MIGRATION_BATCH_SIZE = int(os.getenv("MIGRATION_BATCH_SIZE", "1000"))
+
+    # In-process columnar catalog snapshot serving the listing endpoints; requests fall
+    # back to Mongo until it is built or when it has not refreshed within MAX_AGE seconds
+    CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT_ENABLED", "false").lower() == "true"
+    CATALOG_SNAPSHOT_REFRESH_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_REFRESH_SECONDS", "30"))
+    CATALOG_SNAPSHOT_MAX_AGE = float(os.getenv("CATALOG_SNAPSHOT_MAX_AGE", "900"))
+    # Memory-mapped snapshot file loaded at startup and rewritten periodically; empty disables it
+    CATALOG_SNAPSHOT_PATH = os.getenv("CATALOG_SNAPSHOT_PATH", "catalog.snapshot")
+    CATALOG_SNAPSHOT_SAVE_SECONDS = float(os.getenv("CATALOG_SNAPSHOT_SAVE_SECONDS", "600"))
+
+    # Product change watcher feeding cache invalidation (change stream, or polling without a replica set)
+    INVALIDATION_ENABLED = os.getenv("INVALIDATION_ENABLED", "true").lower() == "true"
+    INVALIDATION_POLL_SECONDS = float(os.getenv("INVALIDATION_POLL_SECONDS", "5"))
+
+    # Materialized /top-deals and /latest feeds (products.feeds)
+    FEEDS_ENABLED = os.getenv("FEEDS_ENABLED", "true").lower() == "true"
+    FEED_MAX_ROWS = int(os.getenv("FEED_MAX_ROWS", "5000"))
+    FEED_REFRESH_SECONDS = float(os.getenv("FEED_REFRESH_SECONDS", "300"))
+    FEED_DEBOUNCE_SECONDS = float(os.getenv("FEED_DEBOUNCE_SECONDS", "10"))
+    FEED_MAX_AGE = float(os.getenv("FEED_MAX_AGE", "1800"))
+
+    # Price-drop notifications for bag/favourites products (users.price_watch)
+    PRICE_WATCH_ENABLED = os.getenv("PRICE_WATCH_ENABLED", "true").lower() == "true"
+    PRICE_WATCH_DEBOUNCE_SECONDS = float(os.getenv("PRICE_WATCH_DEBOUNCE_SECONDS", "2"))
+    # Smaller drops only move the watch's baseline price
+    PRICE_DROP_MIN_PERCENT = float(os.getenv("PRICE_DROP_MIN_PERCENT", "1"))
+
+    # In-memory similar-products index (products.similar)
+    SIMILAR_ENABLED = os.getenv("SIMILAR_ENABLED", "true").lower() == "true"
+    # Hashed feature columns; memory is 4 * SIMILAR_DIM bytes per product
+    SIMILAR_DIM = int(os.getenv("SIMILAR_DIM", "128"))
+    SIMILAR_INDEX_PATH = os.getenv("SIMILAR_INDEX_PATH", "similar.index")
+    SIMILAR_REBUILD_SECONDS = float(os.getenv("SIMILAR_REBUILD_SECONDS", "3600"))
+    SIMILAR_PATCH_SECONDS = float(os.getenv("SIMILAR_PATCH_SECONDS", "5"))
+
+    # Listing rerank for ?user_id= (products.personalize)
+    PERSONALIZE_ENABLED = os.getenv("PERSONALIZE_ENABLED", "true").lower() == "true"
+    # Products only move within aligned blocks of this many positions
+    PERSONALIZE_BLOCK = int(os.getenv("PERSONALIZE_BLOCK", "24"))
+    # Affinity score weight relative to the base-order prior (1 at a block's top, ~0 at its bottom)
+    PERSONALIZE_WEIGHT = float(os.getenv("PERSONALIZE_WEIGHT", "1.0"))
+    # Past this, the page is served unpersonalized
+    PERSONALIZE_BUDGET_MS = float(os.getenv("PERSONALIZE_BUDGET_MS", "15"))
+    PERSONALIZE_AFFINITY_TTL = float(os.getenv("PERSONALIZE_AFFINITY_TTL", "300"))
+    PERSONALIZE_CACHE_SIZE = int(os.getenv("PERSONALIZE_CACHE_SIZE", "10000"))
+
 settings = Settings()
@@ -1,16 +1,37 @@
+from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo import MongoClient
 from .config import settings
+from .instrumentation import query_listener
+from .log import get_logger
 
-client = MongoClient(settings.MONGODB_URI)
+logger = get_logger("database")
+
+client = MongoClient(settings.MONGODB_URI, event_listeners=[query_listener])
 db = client[settings.DATABASE_NAME]
 
 products_collection = db["products"]
 messages_collection = db["messages"]
 users_collection = db["users"]
+product_changes_collection = db["product_changes"]
+migrations_collection = db["migrations"]
+feeds_collection = db["feeds"]
+price_watches_collection = db["price_watches"]
+notifications_collection = db["notifications"]
+
+# Async (Motor) handle for code running on the event loop, created on first use
+_async_client = None
+_async_db = None
+
+def get_async_db():
+    global _async_client, _async_db
+    if _async_db is None:
+        _async_client = AsyncIOMotorClient(settings.MONGODB_URI, event_listeners=[query_listener])
+        _async_db = _async_client[settings.DATABASE_NAME]
+    return _async_db
 
 # Test connection
 try:
     client.admin.command("ping")
-    print("✅ Connected to MongoDB")
-except:
-    print("❌ Failed to connect MongoDB")
+    logger.info("connected to MongoDB", extra={"database": settings.DATABASE_NAME})
+except Exception as e:
+    logger.error("failed to connect to MongoDB", extra={"error": str(e)})
@@ -0,0 +1,222 @@
+"""
+Per-request MongoDB instrumentation built on pymongo's command monitoring.
+
+`QueryInstrumentation` is registered as an event listener on every client (sync and
+Motor). It attributes each command to the request that issued it through a context
+variable set by `QueryInstrumentationMiddleware`, which then reports the request's
+round trips and time in Mongo as Prometheus metrics and a `Server-Timing` header.
+Commands slower than SLOW_QUERY_MS are logged with their query shape (field names and
+stage structure, no values).
+"""
+import contextvars
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+import bson
+from pymongo import monitoring
+
+from .config import settings
+from .log import get_logger
+from .metrics import registry
+
+
+logger = get_logger("mongo")
+
+mongo_commands = registry.counter(
+    "mongo_commands_total",
+    "MongoDB commands by command name, collection and outcome",
+    ["command", "collection", "outcome"]
+)
+mongo_command_seconds = registry.histogram(
+    "mongo_command_seconds",
+    "MongoDB command round-trip time",
+    ["command"]
+)
+mongo_docs_returned = registry.counter(
+    "mongo_docs_returned_total",
+    "Documents returned by MongoDB commands",
+    ["command"]
+)
+request_round_trips = registry.histogram(
+    "http_request_mongo_round_trips",
+    "MongoDB round trips per HTTP request",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 50)
+)
+request_mongo_seconds = registry.histogram(
+    "http_request_mongo_seconds",
+    "Time spent waiting on MongoDB per HTTP request",
+    ["route"]
+)
+request_seconds = registry.histogram(
+    "http_request_seconds",
+    "HTTP request wall time",
+    ["route", "method"]
+)
+
+# Commands that carry no query shape worth recording
+_IGNORED_COMMANDS = {"ping", "hello", "ismaster", "isMaster", "endSessions", "saslStart", "saslContinue"}
+
+
+@dataclass
+class RequestStats:
+    round_trips: int = 0
+    mongo_seconds: float = 0.0
+    docs_returned: int = 0
+
+
+_current_stats: contextvars.ContextVar[Optional[RequestStats]] = contextvars.ContextVar(
+    "mongo_request_stats", default=None
+)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current_stats.get()
+
+
+def query_shape(value: Any, depth: int = 0) -> Any:
+    """Replace literal values with "?" so queries can be logged without their data."""
+    if depth > 6:
+        return "..."
+    if isinstance(value, dict):
+        return {key: query_shape(item, depth + 1) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        if not value:
+            return []
+        # Pipelines and $and/$or lists keep their structure; long value lists collapse
+        if all(isinstance(item, dict) for item in value):
+            return [query_shape(item, depth + 1) for item in value]
+        return [query_shape(value[0], depth + 1), f"...{len(value)}"] if len(value) > 1 else [query_shape(value[0], depth + 1)]
+    return "?"
+
+
+def _command_shape(command_name: str, command: Dict) -> Dict:
+    if command_name == "aggregate":
+        return {"pipeline": query_shape(command.get("pipeline", []))}
+    if command_name in ("find", "count", "distinct", "delete", "findAndModify"):
+        shape = {}
+        for key in ("filter", "query", "sort", "projection", "limit", "skip", "update"):
+            if key in command:
+                shape[key] = query_shape(command[key])
+        return shape
+    if command_name == "update":
+        return {"updates": query_shape(command.get("updates", [])[:1])}
+    return {}
+
+
+def _reply_docs(command_name: str, reply: Dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if command_name == "findAndModify":
+        return 1 if reply.get("value") else 0
+    return 0
+
+
+class QueryInstrumentation(monitoring.CommandListener):
+    def __init__(self):
+        # (connection id, request id) -> (stats of the issuing request, collection, shape)
+        self._pending: Dict[Tuple[Any, int], Tuple[Optional[RequestStats], str, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        if event.command_name in _IGNORED_COMMANDS:
+            return
+        collection = event.command.get(event.command_name)
+        collection = collection if isinstance(collection, str) else ""
+        shape = _command_shape(event.command_name, event.command)
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (current_stats(), collection, shape)
+
+    def _finish(self, event, outcome: str, reply: Optional[Dict] = None):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None:
+            return
+        stats, collection, shape = pending
+        seconds = event.duration_micros / 1_000_000
+        command_name = event.command_name
+
+        docs = _reply_docs(command_name, reply) if reply else 0
+
+        mongo_commands.inc(command=command_name, collection=collection, outcome=outcome)
+        mongo_command_seconds.observe(seconds, command=command_name)
+        if docs:
+            mongo_docs_returned.inc(docs, command=command_name)
+
+        if stats is not None:
+            stats.round_trips += 1
+            stats.mongo_seconds += seconds
+            stats.docs_returned += docs
+
+        if seconds * 1000 >= settings.SLOW_QUERY_MS:
+            # Re-encoding the reply is too costly per command; only slow ones pay for it
+            size = len(bson.encode(reply)) if reply else 0
+            logger.warning(
+                "slow mongo command",
+                extra={
+                    "command": command_name,
+                    "collection": collection,
+                    "duration_ms": round(seconds * 1000, 2),
+                    "docs": docs,
+                    "bytes": size,
+                    "shape": shape,
+                    "outcome": outcome,
+                }
+            )
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event, "ok", event.reply)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event, "error")
+
+
+# Shared by every MongoClient / AsyncIOMotorClient in the process
+query_listener = QueryInstrumentation()
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Pure ASGI middleware: gives each HTTP request its own RequestStats, adds a
+    Server-Timing header and records per-request metrics when the response starts.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current_stats.set(stats)
+        started = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                elapsed = time.perf_counter() - started
+                route = scope.get("route")
+                route_name = getattr(route, "path", None) or "unmatched"
+
+                request_round_trips.observe(stats.round_trips, route=route_name)
+                request_mongo_seconds.observe(stats.mongo_seconds, route=route_name)
+                request_seconds.observe(elapsed, route=route_name, method=scope["method"])
+
+                server_timing = (
+                    f'db;dur={stats.mongo_seconds * 1000:.1f};desc="{stats.round_trips} queries, '
+                    f'{stats.docs_returned} docs", '
+                    f"app;dur={elapsed * 1000:.1f}"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_stats.reset(token)
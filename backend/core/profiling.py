@@ -0,0 +1,273 @@
+"""
+Opt-in sampling profiler for hot request paths.
+
+A request is profiled when it carries `X-Profile: <PROFILE_TOKEN>` or is picked by
+PROFILE_SAMPLE_RATE. While it runs, a background thread samples the stacks of the
+threads doing its work every PROFILE_INTERVAL_MS and writes them to PROFILE_DIR in
+collapsed-stack format (one "phase;frame;frame count" line per stack), which
+flamegraph.pl and speedscope read directly.
+
+Wall time is also broken down by phase. Service code marks phases with
+`with phase("repository"): ...`; `ProfiledRoute` marks the endpoint itself as
+"handler", and everything between the endpoint returning and the response starting
+(jsonable_encoder + JSON rendering) is reported as "encode". The breakdown is sent
+back in a Server-Timing header and logged.
+"""
+import asyncio
+import contextvars
+import functools
+import hmac
+import inspect
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from fastapi.routing import APIRoute
+
+from .config import settings
+from .log import get_logger
+
+
+logger = get_logger("profiling")
+
+PROFILE_HEADER = b"x-profile"
+
+
+class RequestProfile:
+    def __init__(self, method: str, path: str):
+        self.id = uuid.uuid4().hex[:12]
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.handler_end: Optional[float] = None
+        self.response_start: Optional[float] = None
+        self.phases: Dict[str, float] = defaultdict(float)
+        # thread id -> stack of phase names currently open on that thread
+        self.threads: Dict[int, List[str]] = {}
+        self.samples: Counter = Counter()
+        self._lock = threading.Lock()
+
+    def enter(self, name: str):
+        with self._lock:
+            self.threads.setdefault(threading.get_ident(), []).append(name)
+
+    def exit(self, name: str, elapsed: float):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self.phases[name] += elapsed
+            stack = self.threads.get(thread_id)
+            if stack:
+                stack.pop()
+                if not stack:
+                    del self.threads[thread_id]
+
+    def sample(self, frames: Dict[int, object]):
+        with self._lock:
+            active = [(thread_id, stack[-1]) for thread_id, stack in self.threads.items() if stack]
+        for thread_id, phase_name in active:
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            names.append(phase_name)
+            self.samples[";".join(reversed(names))] += 1
+
+    def breakdown(self) -> Dict[str, float]:
+        """Phase wall times in milliseconds, including derived encode/other/total."""
+        end = self.response_start or time.perf_counter()
+        result = {name: seconds * 1000 for name, seconds in self.phases.items()}
+        if self.handler_end is not None:
+            result["encode"] = max(0.0, end - self.handler_end) * 1000
+        result["total"] = (end - self.started) * 1000
+        # Handler time not attributed to a nested phase
+        nested = sum(v for k, v in result.items() if k not in ("handler", "encode", "total"))
+        if "handler" in result:
+            result["handler_other"] = max(0.0, result.pop("handler") - nested)
+        return {name: round(ms, 3) for name, ms in result.items()}
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common()) + "\n"
+
+
+_current_profile: contextvars.ContextVar[Optional[RequestProfile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def phase(name: str):
+    """Attribute the wall time (and stack samples) of the block to `name` when profiling."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    profile.enter(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.exit(name, time.perf_counter() - started)
+
+
+class _Sampler:
+    """One daemon thread shared by all profiled requests; idles when none are active."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._profiles = set()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.add(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def remove(self, profile: RequestProfile):
+        with self._lock:
+            self._profiles.discard(profile)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                active = list(self._profiles)
+                if not active:
+                    self._wake.clear()
+            if not active:
+                self._wake.wait()
+                continue
+            frames = sys._current_frames()
+            for profile in active:
+                profile.sample(frames)
+            del frames
+            time.sleep(self.interval)
+
+
+_sampler = _Sampler(settings.PROFILE_INTERVAL_MS / 1000)
+
+
+def _profiled_endpoint(endpoint):
+    """Wrap a route endpoint so its execution is the "handler" phase."""
+
+    def finish():
+        profile = _current_profile.get()
+        if profile is not None:
+            profile.handler_end = time.perf_counter()
+
+    if inspect.iscoroutinefunction(endpoint):
+        @functools.wraps(endpoint)
+        async def wrapper(*args, **kwargs):
+            try:
+                with phase("handler"):
+                    return await endpoint(*args, **kwargs)
+            finally:
+                finish()
+    else:
+        @functools.wraps(endpoint)
+        def wrapper(*args, **kwargs):
+            try:
+                with phase("handler"):
+                    return endpoint(*args, **kwargs)
+            finally:
+                finish()
+    return wrapper
+
+
+class ProfiledRoute(APIRoute):
+    """APIRoute that marks endpoint execution so encode time can be separated out."""
+
+    def __init__(self, path: str, endpoint, **kwargs):
+        super().__init__(path, _profiled_endpoint(endpoint), **kwargs)
+
+
+def _slug(path: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9]+", "-", path).strip("-") or "root"
+
+
+def _write_profile(profile: RequestProfile) -> Optional[str]:
+    if not profile.samples:
+        return None
+    directory = Path(settings.PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    timestamp = time.strftime("%Y%m%dT%H%M%S")
+    target = directory / f"{timestamp}-{profile.method.lower()}-{_slug(profile.path)}-{profile.id}.folded"
+    target.write_text(profile.folded())
+    return str(target)
+
+
+class ProfilingMiddleware:
+    """Pure ASGI middleware that decides which requests to profile and reports the result."""
+
+    def __init__(self, app):
+        self.app = app
+
+    def _should_profile(self, scope) -> bool:
+        if settings.PROFILE_TOKEN:
+            for name, value in scope.get("headers", []):
+                if name == PROFILE_HEADER and hmac.compare_digest(value, settings.PROFILE_TOKEN.encode("latin-1")):
+                    return True
+        return settings.PROFILE_SAMPLE_RATE > 0 and random.random() < settings.PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile(scope["method"], scope["path"])
+        token = _current_profile.set(profile)
+        _sampler.add(profile)
+
+        async def send_with_profile(message):
+            if message["type"] == "http.response.start":
+                profile.response_start = time.perf_counter()
+                timings = ", ".join(
+                    f"{name};dur={ms}" for name, ms in profile.breakdown().items() if name != "total"
+                )
+                headers = list(message.get("headers", []))
+                headers.append((b"x-profile-id", profile.id.encode("latin-1")))
+                if timings:
+                    headers.append((b"server-timing", timings.encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _sampler.remove(profile)
+            _current_profile.reset(token)
+            try:
+                output = await asyncio.get_running_loop().run_in_executor(None, _write_profile, profile)
+            except OSError as e:
+                output = None
+                logger.warning("could not write profile", extra={"profile_id": profile.id, "error": str(e)})
+            logger.info(
+                "request profile",
+                extra={
+                    "profile_id": profile.id,
+                    "method": profile.method,
+                    "path": profile.path,
+                    "phases_ms": profile.breakdown(),
+                    "samples": sum(profile.samples.values()),
+                    "output": output,
+                }
+            )
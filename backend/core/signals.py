@@ -0,0 +1,41 @@
+"""
+In-process signals, so one package can react to another's changes without importing it.
+
+    user_lists_changed.connect(handler)   # handler(user_id)
+    user_lists_changed.send(user_id)
+
+Receivers run synchronously on the sender's thread and must be cheap; one that raises
+is logged and does not stop the others.
+"""
+import threading
+from typing import Any, Callable, List
+
+from .log import get_logger
+
+
+logger = get_logger("signals")
+
+
+class Signal:
+    def __init__(self, name: str):
+        self.name = name
+        self._receivers: List[Callable[..., Any]] = []
+        self._lock = threading.Lock()
+
+    def connect(self, receiver: Callable[..., Any]):
+        with self._lock:
+            if receiver not in self._receivers:
+                self._receivers.append(receiver)
+
+    def send(self, *args: Any):
+        with self._lock:
+            receivers = list(self._receivers)
+        for receiver in receivers:
+            try:
+                receiver(*args)
+            except Exception:
+                logger.exception("signal receiver failed", extra={"signal": self.name})
+
+
+# A user's bag or favourites changed; sent with the user id
+user_lists_changed = Signal("user_lists_changed")
@@ -0,0 +1,76 @@
+"""
+Single-flight deduplication of identical concurrent calls.
+
+When several threads ask for the same key at once, the first one (the leader) runs
+the function and the rest wait for and share its result, so a burst of identical
+requests costs one database call. Results are shared, not copied: callers must treat
+them as read-only.
+"""
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from .metrics import registry
+
+
+singleflight_calls = registry.counter(
+    "singleflight_calls_total",
+    "Calls entering a single-flight group; role=leader ran the function, role=follower shared its result",
+    ["group", "role"]
+)
+singleflight_collapse_ratio = registry.gauge(
+    "singleflight_collapse_ratio",
+    "Calls per executed function in a single-flight group (1.0 means no deduplication)",
+    ["group"]
+)
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = threading.Lock()
+        self._total = 0
+        self._leaders = 0
+
+    def _record(self, leader: bool):
+        with self._lock:
+            self._total += 1
+            self._leaders += leader
+            ratio = self._total / self._leaders if self._leaders else 0.0
+        singleflight_calls.inc(group=self.name, role="leader" if leader else "follower")
+        singleflight_collapse_ratio.set(ratio, group=self.name)
+
+    def do(self, key: Hashable, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+        self._record(leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
@@ -1,12 +1,29 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
 
 from products.router import router as products_router
 from contact.router import router as contact_router
 from users.router import router as users_router
+from core.metrics import registry
+from core.instrumentation import QueryInstrumentationMiddleware
+from core.profiling import ProfilingMiddleware
+from core.log import get_logger
+from products.ingest import ensure_indexes as ensure_product_indexes
+from products.migrations import start_background_migrations
+from products.snapshot import start_background_refresh as start_catalog_snapshot
+from products.invalidation import start_watcher as start_invalidation_watcher
+from products.feeds import start_feed_refresher
+from products.similar import start_background_refresh as start_similar_index
+from contact.mailer import ensure_indexes as ensure_mail_indexes, mailer
+from contact.buffer import submission_buffer
+from users.repository import ensure_indexes as ensure_user_indexes
+from users.price_watch import ensure_indexes as ensure_price_watch_indexes, start_price_watch
+from core.config import settings
 
 app = FastAPI(title="Halfsy API")
+logger = get_logger("main")
 
 app.include_router(products_router)
 app.include_router(contact_router)
@@ -29,6 +46,85 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+app.add_middleware(QueryInstrumentationMiddleware)
+app.add_middleware(ProfilingMiddleware)
+
+@app.on_event("startup")
+def create_indexes():
+    try:
+        ensure_product_indexes()
+    except Exception as e:
+        logger.error("could not create product indexes", extra={"error": str(e)})
+
+@app.on_event("startup")
+async def create_user_indexes():
+    try:
+        await ensure_user_indexes()
+    except Exception as e:
+        # Existing duplicate emails or google_ids must be merged before the unique indexes can build
+        logger.error("could not create user indexes", extra={"error": str(e)})
+
+@app.on_event("startup")
+async def create_price_watch_indexes():
+    try:
+        await ensure_price_watch_indexes()
+    except Exception as e:
+        logger.error("could not create price watch indexes", extra={"error": str(e)})
+
+@app.on_event("startup")
+def run_migrations():
+    if settings.RUN_MIGRATIONS:
+        start_background_migrations()
+
+@app.on_event("startup")
+def build_catalog_snapshot():
+    if settings.CATALOG_SNAPSHOT_ENABLED:
+        start_catalog_snapshot()
+
+@app.on_event("startup")
+def watch_product_changes():
+    if settings.INVALIDATION_ENABLED:
+        start_invalidation_watcher()
+
+@app.on_event("startup")
+def refresh_feeds():
+    if settings.FEEDS_ENABLED:
+        start_feed_refresher()
+
+@app.on_event("startup")
+def build_similar_index():
+    if settings.SIMILAR_ENABLED:
+        start_similar_index()
+
+@app.on_event("startup")
+def watch_prices():
+    if settings.PRICE_WATCH_ENABLED:
+        start_price_watch()
+
+@app.on_event("startup")
+async def start_contact_buffer():
+    submission_buffer.start()
+
+@app.on_event("startup")
+async def start_mailer():
+    if settings.MAIL_ENABLED and settings.OUTLOOK_USER:
+        try:
+            await ensure_mail_indexes()
+        except Exception as e:
+            logger.error("could not create mail queue indexes", extra={"error": str(e)})
+        mailer.start()
+
+@app.on_event("shutdown")
+async def stop_contact_pipeline():
+    # Write the last batch before shutting down; any running mailer sends it from the queue
+    await submission_buffer.stop()
+    await mailer.stop()
+
 @app.get("/")
 def root():
     return {"message": "Halfsy API Running"}
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
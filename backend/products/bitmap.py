@@ -0,0 +1,224 @@
+"""
+Bitmap index over normalized facet values of the catalog snapshot.
+
+Each facet value (normalized with filter_value, i.e. exactly the value the filter UI
+sends) maps to the set of snapshot rows carrying it. A filter request becomes an OR of
+the value bitmaps within each facet and an AND across facets; facet counts for the
+filter panel are popcounts of each value bitmap against the other facets' selection.
+
+Bitmaps use two representations, like roaring containers: a sorted int32 offset array
+while sparse (under 1 row in 32) and a Python int bitset when dense, where `&`, `|`
+and int.bit_count() run in C over 64-bit words.
+"""
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from core.cache import TTLCache
+from core.constants.filter_constants import PRICE_RANGES
+from .normalize import filter_value
+
+
+# An int32 offset costs 32 bits, a bitset row 1 bit
+_DENSE_RATIO = 32
+
+
+def _bits_from_mask(mask: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+def _mask_from_bits(bits: int, size: int) -> np.ndarray:
+    raw = np.frombuffer(bits.to_bytes((size + 7) // 8, "little"), dtype=np.uint8)
+    return np.unpackbits(raw, count=size, bitorder="little").astype(bool)
+
+
+class Bitmap:
+    """Immutable set of row offsets in [0, size)."""
+
+    __slots__ = ("size", "_bits", "_offsets", "_bytes")
+
+    def __init__(self, size: int, bits: Optional[int] = None, offsets: Optional[np.ndarray] = None):
+        self.size = size
+        self._bits = bits
+        self._offsets = offsets
+        self._bytes: Optional[np.ndarray] = None
+
+    @classmethod
+    def from_offsets(cls, size: int, offsets: np.ndarray) -> "Bitmap":
+        """`offsets` must be sorted and unique."""
+        offsets = np.asarray(offsets, dtype=np.int32)
+        if len(offsets) * _DENSE_RATIO > size:
+            mask = np.zeros(size, dtype=bool)
+            mask[offsets] = True
+            return cls(size, bits=_bits_from_mask(mask))
+        return cls(size, offsets=offsets)
+
+    @classmethod
+    def from_mask(cls, mask: np.ndarray) -> "Bitmap":
+        return cls.from_offsets(len(mask), np.flatnonzero(mask))
+
+    @classmethod
+    def empty(cls, size: int) -> "Bitmap":
+        return cls(size, offsets=np.empty(0, dtype=np.int32))
+
+    @property
+    def dense(self) -> bool:
+        return self._bits is not None
+
+    def __len__(self) -> int:
+        return self._bits.bit_count() if self.dense else len(self._offsets)
+
+    def offsets(self) -> np.ndarray:
+        """Members in ascending order."""
+        if self.dense:
+            return np.flatnonzero(_mask_from_bits(self._bits, self.size)).astype(np.int32)
+        return self._offsets
+
+    def _bit_test(self, offsets: np.ndarray) -> np.ndarray:
+        """Membership of `offsets` in this (dense) bitmap."""
+        if self._bytes is None:
+            self._bytes = np.frombuffer(self._bits.to_bytes((self.size + 7) // 8, "little"), dtype=np.uint8)
+        raw = self._bytes
+        return ((raw[offsets >> 3] >> (offsets & 7).astype(np.uint8)) & 1).astype(bool)
+
+    def __and__(self, other: "Bitmap") -> "Bitmap":
+        if self.dense and other.dense:
+            return Bitmap(self.size, bits=self._bits & other._bits)
+        if not self.dense and not other.dense:
+            return Bitmap(self.size, offsets=np.intersect1d(self._offsets, other._offsets, assume_unique=True))
+        sparse, dense = (other, self) if self.dense else (self, other)
+        return Bitmap(self.size, offsets=sparse._offsets[dense._bit_test(sparse._offsets)])
+
+    def __or__(self, other: "Bitmap") -> "Bitmap":
+        return Bitmap.union([self, other], self.size)
+
+    @staticmethod
+    def union(bitmaps: Sequence["Bitmap"], size: int) -> "Bitmap":
+        if not bitmaps:
+            return Bitmap.empty(size)
+        if len(bitmaps) == 1:
+            return bitmaps[0]
+        bits = 0
+        sparse = []
+        for bitmap in bitmaps:
+            if bitmap.dense:
+                bits |= bitmap._bits
+            else:
+                sparse.append(bitmap._offsets)
+        offsets = np.unique(np.concatenate(sparse)) if sparse else np.empty(0, dtype=np.int32)
+        if not bits:
+            return Bitmap.from_offsets(size, offsets)
+        if len(offsets):
+            mask = np.zeros(size, dtype=bool)
+            mask[offsets] = True
+            bits |= _bits_from_mask(mask)
+        return Bitmap(size, bits=bits)
+
+    def intersection_count(self, other: "Bitmap") -> int:
+        """len(self & other) without materializing the intersection."""
+        if self.dense and other.dense:
+            return (self._bits & other._bits).bit_count()
+        if not self.dense and not other.dense:
+            return len(np.intersect1d(self._offsets, other._offsets, assume_unique=True))
+        sparse, dense = (other, self) if self.dense else (self, other)
+        return int(dense._bit_test(sparse._offsets).sum())
+
+
+def intersect(bitmaps: Iterable[Bitmap], universe: Bitmap) -> Bitmap:
+    """AND of `bitmaps` (smallest first, so sparse sets shrink the work early) within `universe`."""
+    result = universe
+    for bitmap in sorted(bitmaps, key=len):
+        result = result & bitmap
+    return result
+
+
+_RESOLVED_CACHE_SIZE = 256
+_RESOLVED_CACHE_TTL = 3600
+
+
+class FacetBitmapIndex:
+    """Per-facet value bitmaps over one snapshot version; rows that are not live are left out."""
+
+    def __init__(self, size: int, live: Bitmap, values: Dict[str, Dict[str, Bitmap]], sale: np.ndarray, live_mask: np.ndarray):
+        self.size = size
+        self.live = live
+        self.values = values
+        self._sale = sale
+        self._live_mask = live_mask
+        self._price_ranges: Dict[Tuple[Optional[float], Optional[float]], Bitmap] = {}
+        # (facet, patterns) -> matching normalized values; patterns come from requests, so bounded
+        self._resolved = TTLCache("bitmap_resolved_patterns", _RESOLVED_CACHE_SIZE, _RESOLVED_CACHE_TTL)
+        for price_range in PRICE_RANGES:
+            self.price(price_range["min"], price_range["max"])
+
+    @classmethod
+    def build(
+        cls,
+        codes: Dict[str, np.ndarray],
+        dictionaries: Dict[str, Sequence[Optional[str]]],
+        live: np.ndarray,
+        sale: np.ndarray
+    ) -> "FacetBitmapIndex":
+        """
+        `codes[facet]` holds a dictionary code per row and `dictionaries[facet][code]`
+        its raw value. Raw values sharing a normalized value share one bitmap.
+        """
+        size = len(live)
+        live_offsets = np.flatnonzero(live)
+        values: Dict[str, Dict[str, Bitmap]] = {}
+        for facet, column in codes.items():
+            normalized: Dict[str, int] = {}
+            code_to_value = np.full(len(dictionaries[facet]), -1, dtype=np.int32)
+            for code, raw in enumerate(dictionaries[facet]):
+                value = filter_value(raw)
+                if value is not None:
+                    code_to_value[code] = normalized.setdefault(value, len(normalized))
+
+            row_values = code_to_value[column[live_offsets]]
+            # Stable sort keeps offsets ascending within each value
+            order = np.argsort(row_values, kind="stable")
+            sorted_values = row_values[order]
+            bounds = np.searchsorted(sorted_values, np.arange(len(normalized) + 1))
+            values[facet] = {
+                value: Bitmap.from_offsets(size, live_offsets[order[bounds[index]:bounds[index + 1]]])
+                for value, index in normalized.items()
+                if bounds[index + 1] > bounds[index]
+            }
+        return cls(size, Bitmap.from_offsets(size, live_offsets), values, sale, live)
+
+    def facet(self, facet: str, patterns: Sequence[str]) -> Bitmap:
+        """Rows whose value matches any of the case-insensitive regex `patterns`."""
+        key = (facet, tuple(patterns))
+        matched = self._resolved.get(key)
+        if matched is None:
+            compiled = [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            matched = [v for v in self.values[facet] if any(r.search(v) for r in compiled)]
+            self._resolved.set(key, matched)
+        return Bitmap.union([self.values[facet][v] for v in matched], self.size)
+
+    def price(self, price_min: Optional[float], price_max: Optional[float]) -> Bitmap:
+        """Rows whose numeric sale_price lies in [price_min, price_max]; PRICE_RANGES are prebuilt."""
+        key = (price_min, price_max)
+        bitmap = self._price_ranges.get(key)
+        if bitmap is not None:
+            return bitmap
+        mask = self._live_mask.copy()
+        with np.errstate(invalid="ignore"):
+            if price_min is not None:
+                mask &= self._sale >= price_min
+            if price_max is not None:
+                mask &= self._sale <= price_max
+        bitmap = Bitmap.from_mask(mask)
+        if any(key == (r["min"], r["max"]) for r in PRICE_RANGES):
+            self._price_ranges[key] = bitmap
+        return bitmap
+
+    def counts(self, facet: str, within: Bitmap) -> Dict[str, int]:
+        """Rows of `within` per normalized value of `facet`, by popcount; zero counts omitted."""
+        counts = {}
+        for value, bitmap in self.values[facet].items():
+            count = bitmap.intersection_count(within)
+            if count:
+                counts[value] = count
+        return dict(sorted(counts.items(), key=lambda item: item[1], reverse=True))
@@ -0,0 +1,65 @@
+"""
+Process-wide caches for product documents and ranked search results
+"""
+from typing import List, Optional, Tuple
+
+from core.cache import TTLCache
+from core.config import settings
+from .invalidation import CatalogReset, bus
+
+
+# product id -> ProductRecord, or EXCLUDED for products the listing rules drop
+product_cache = TTLCache("products", settings.PRODUCT_CACHE_SIZE, settings.PRODUCT_CACHE_TTL)
+
+# Cached in place of a record so excluded products are not fetched again on every hit
+EXCLUDED = object()
+
+# normalized query + filters -> (total, ranked product ids)
+search_cache = TTLCache("search", settings.SEARCH_CACHE_SIZE, settings.SEARCH_CACHE_TTL)
+
+
+def _normalize_values(values: Optional[List[str]]) -> Tuple[str, ...]:
+    if not values:
+        return ()
+    return tuple(sorted({v.strip().lower() for v in values if v and v.strip()}))
+
+
+def search_cache_key(
+    query: str,
+    category: Optional[List[str]] = None,
+    brand: Optional[List[str]] = None,
+    occasion: Optional[List[str]] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    gender: Optional[str] = None
+) -> tuple:
+    """
+    Build a cache key that treats "Gucci  Bag" and "gucci bag" (and filters given in any
+    order or case) as the same search.
+    """
+    return (
+        " ".join(query.lower().split()),
+        _normalize_values(category),
+        _normalize_values(brand),
+        _normalize_values(occasion),
+        price_min,
+        price_max,
+        gender.strip().lower() if gender else None,
+    )
+
+
+def _invalidate_products(events):
+    if any(isinstance(event, CatalogReset) for event in events):
+        product_cache.clear()
+        return
+    for event in events:
+        product_cache.pop(event.product_id)
+
+
+def _invalidate_searches(events):
+    # Any product change can move rankings and totals
+    search_cache.clear()
+
+
+bus.subscribe("product_cache", _invalidate_products)
+bus.subscribe("search_cache", _invalidate_searches)
@@ -0,0 +1,229 @@
+"""
+Materialized homepage feeds.
+
+/top-deals and /latest rank the same brand-filtered set on every call. Here the first
+FEED_MAX_ROWS ranked product ids of each feed are written with $out into a small
+collection keyed by rank (feed_top_deals, feed_latest), along with the feed's total in
+the `feeds` collection. Reading a page is then a range scan on rank plus an _id $in
+for the products. Pages past the materialized depth, and feeds that are missing or
+older than FEED_MAX_AGE, fall back to the live queries.
+
+Feeds are rebuilt every FEED_REFRESH_SECONDS and, debounced, after product changes
+reach the invalidation bus. A per-feed lease in `feeds` keeps workers from rebuilding
+the same feed at once.
+"""
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import db, feeds_collection, products_collection
+from core.log import get_logger
+from core.metrics import registry
+from .invalidation import bus
+from .repository import ProductRepository
+
+
+logger = get_logger("products.feeds")
+
+feed_refresh_seconds = registry.histogram(
+    "feed_refresh_seconds",
+    "Time to rebuild a materialized feed",
+    ["feed"]
+)
+feed_reads = registry.counter(
+    "feed_reads_total",
+    "Feed page requests by outcome (hit: served from the materialized feed, fallback: live query)",
+    ["feed", "result"]
+)
+
+LEASE_SECONDS = 120
+
+# Feed metadata is re-read at most this often per worker
+_meta_cache = TTLCache("feed_meta", 8, 5)
+
+
+def _top_deals_pipeline() -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Same match and order as ProductRepository.get_top_deals."""
+    query = {"brand_name": {"$in": ProductRepository.TOP_DEAL_BRANDS}}
+    query.update(ProductRepository.IMAGE_FILTER)
+    return query, [
+        {"$match": query},
+        {"$addFields": {"discount_amount": {"$subtract": [
+            {"$ifNull": ["$original_price", 0]},
+            {"$ifNull": ["$sale_price", 0]}
+        ]}}},
+        {"$match": {"discount_amount": {"$gt": 0}}},
+        {"$sort": {"discount_amount": -1, "_id": 1}},
+    ]
+
+
+def _latest_pipeline() -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Same match and order as ProductRepository.get_latest_products."""
+    query = {"brand_name": {"$in": ProductRepository.LATEST_BRANDS}}
+    query.update(ProductRepository.IMAGE_FILTER)
+    return query, [
+        {"$match": query},
+        {"$sort": {"scraped_at": -1, "_id": -1}},
+    ]
+
+
+FEEDS: Dict[str, Callable[[], Tuple[Dict[str, Any], List[Dict[str, Any]]]]] = {
+    "top_deals": _top_deals_pipeline,
+    "latest": _latest_pipeline,
+}
+
+
+def _collection_name(name: str) -> str:
+    return f"feed_{name}"
+
+
+def _claim(name: str) -> bool:
+    """Take the feed's rebuild lease; False if another worker holds it."""
+    now = datetime.now(timezone.utc)
+    try:
+        return feeds_collection.find_one_and_update(
+            {"_id": name, "$or": [
+                {"lease_expires": {"$lt": now}},
+                {"lease_expires": {"$exists": False}},
+            ]},
+            {"$set": {"lease_expires": now + timedelta(seconds=LEASE_SECONDS)}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        ) is not None
+    except DuplicateKeyError:
+        # The feed document exists and its lease is held
+        return False
+
+
+def refresh_feed(name: str) -> Optional[Dict[str, Any]]:
+    """Rebuild one feed. Returns its new metadata, or None if another worker is rebuilding it."""
+    if not _claim(name):
+        return None
+    started = time.perf_counter()
+    try:
+        query, pipeline = FEEDS[name]()
+        total = products_collection.count_documents(query)
+        products_collection.aggregate(pipeline + [
+            {"$limit": settings.FEED_MAX_ROWS},
+            # Number the ranked ids: one small document (the feed is capped), unwound with its index
+            {"$group": {"_id": None, "ids": {"$push": "$_id"}}},
+            {"$unwind": {"path": "$ids", "includeArrayIndex": "rank"}},
+            {"$project": {"_id": "$rank", "product_id": "$ids"}},
+            {"$out": _collection_name(name)},
+        ])
+        rows = db[_collection_name(name)].estimated_document_count()
+        meta = {"total": total, "rows": rows, "refreshed_at": datetime.now(timezone.utc)}
+        feeds_collection.update_one({"_id": name}, {"$set": meta, "$unset": {"lease_expires": ""}})
+    except Exception:
+        feeds_collection.update_one({"_id": name}, {"$unset": {"lease_expires": ""}})
+        raise
+    elapsed = time.perf_counter() - started
+    feed_refresh_seconds.observe(elapsed, feed=name)
+    _meta_cache.pop(name)
+    logger.info("feed refreshed", extra={"feed": name, "rows": rows, "total": total, "seconds": round(elapsed, 3)})
+    return meta
+
+
+def _meta(name: str) -> Optional[Dict[str, Any]]:
+    meta = _meta_cache.get(name)
+    if meta is None:
+        meta = feeds_collection.find_one({"_id": name, "refreshed_at": {"$exists": True}}) or {}
+        _meta_cache.set(name, meta)
+    return meta or None
+
+
+def _refreshed_at(meta: Dict[str, Any]) -> datetime:
+    # Mongo returns naive UTC datetimes unless the client is tz_aware
+    refreshed_at = meta["refreshed_at"]
+    return refreshed_at if refreshed_at.tzinfo else refreshed_at.replace(tzinfo=timezone.utc)
+
+
+def _age(meta: Dict[str, Any]) -> float:
+    return (datetime.now(timezone.utc) - _refreshed_at(meta)).total_seconds()
+
+
+def read_feed(name: str, limit: int, skip: int) -> Optional[Tuple[int, List[str]]]:
+    """
+    (total, product ids) for one page of a feed, in feed order, or None when the page
+    must come from the live query (feed missing, stale, or the page is deeper than it).
+    """
+    meta = _meta(name)
+    # A feed shorter than the cap holds every ranked product, so any page can be served
+    complete = meta is not None and meta["rows"] < settings.FEED_MAX_ROWS
+    if (
+        meta is None
+        or _age(meta) > settings.FEED_MAX_AGE
+        or (skip + limit > meta["rows"] and not complete)
+    ):
+        feed_reads.inc(feed=name, result="fallback")
+        return None
+
+    rows = db[_collection_name(name)].find(
+        {"_id": {"$gte": skip, "$lt": skip + limit}}, {"product_id": 1}
+    ).sort("_id", 1)
+    feed_reads.inc(feed=name, result="hit")
+    return meta["total"], [str(row["product_id"]) for row in rows]
+
+
+class FeedRefresher:
+    """Rebuilds feeds periodically and shortly after product changes."""
+
+    def __init__(self):
+        self._wake = threading.Event()
+        self._lock = threading.Lock()
+        self._dirty_since: Optional[datetime] = None
+        # Bumped on every change, so a pass can tell whether changes arrived while it ran
+        self._dirty_count = 0
+
+    def mark_dirty(self, events=None):
+        with self._lock:
+            if self._dirty_since is None:
+                self._dirty_since = datetime.now(timezone.utc)
+            self._dirty_count += 1
+        self._wake.set()
+
+    def _due(self, name: str) -> bool:
+        meta = feeds_collection.find_one({"_id": name}, {"refreshed_at": 1})
+        if not meta or "refreshed_at" not in meta:
+            return True
+        if _age(meta) >= settings.FEED_REFRESH_SECONDS:
+            return True
+        # Dirty only if nobody (possibly another worker) rebuilt the feed since the change
+        return self._dirty_since is not None and _refreshed_at(meta) < self._dirty_since
+
+    def run(self):
+        while True:
+            try:
+                with self._lock:
+                    seen = self._dirty_count
+                for name in FEEDS:
+                    if self._due(name):
+                        refresh_feed(name)
+                with self._lock:
+                    if self._dirty_count == seen:
+                        self._dirty_since = None
+                    else:
+                        # Feeds rebuilt in this pass may predate those changes; rebuild anything
+                        # not refreshed (here or by another worker) after this point
+                        self._dirty_since = datetime.now(timezone.utc)
+            except Exception:
+                logger.exception("feed refresh failed")
+            self._wake.wait(settings.FEED_REFRESH_SECONDS)
+            if self._wake.is_set():
+                self._wake.clear()
+                # Let a burst of changes (an ingest run) settle into one rebuild
+                time.sleep(settings.FEED_DEBOUNCE_SECONDS)
+
+
+refresher = FeedRefresher()
+bus.subscribe("feeds", refresher.mark_dirty)
+
+
+def start_feed_refresher():
+    threading.Thread(target=refresher.run, name="feed-refresher", daemon=True).start()
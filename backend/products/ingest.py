@@ -0,0 +1,412 @@
+"""
+Bulk catalog ingest.
+
+Scraped products arrive as NDJSON (one product per line), are normalized once
+(products.normalize) and upserted with unordered bulk_write keyed on product_link
+(unique; an insert that loses a race for a link is retried as an update).
+Every insert or content change is appended to `product_changes`, whose ObjectId
+order lets caches and search indexes consume it incrementally:
+
+    for change in product_changes_collection.find({"_id": {"$gt": last_seen_id}}).sort("_id", 1): ...
+
+CLI:
+    python -m products.ingest products.ndjson [--batch-size 1000]
+    cat products.ndjson | python -m products.ingest -
+    python -m products.ingest --merge-duplicates
+"""
+import argparse
+import json
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+from pymongo import ASCENDING, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+from core.config import settings
+from core.database import price_watches_collection, products_collection, product_changes_collection, users_collection
+from core.log import get_logger
+from core.metrics import registry
+from .invalidation import ProductUpserted, bus
+from .normalize import normalize_product
+
+
+logger = get_logger("products.ingest")
+
+ingested_products = registry.counter(
+    "ingest_products_total",
+    "Products processed by bulk ingest, by outcome",
+    ["outcome"]
+)
+ingest_batch_seconds = registry.histogram(
+    "ingest_batch_seconds",
+    "Time to normalize and write one ingest batch"
+)
+
+# Fields whose changes are not content changes (they are still written)
+_VOLATILE_FIELDS = {"scraped_at"}
+# Cap on per-line errors returned to the caller
+MAX_REPORTED_ERRORS = 100
+
+
+@dataclass
+class IngestResult:
+    received: int = 0
+    inserted: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    duplicates: int = 0
+    failed: int = 0
+    errors: List[Dict[str, Any]] = field(default_factory=list)
+
+    def merge(self, other: "IngestResult"):
+        self.received += other.received
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.unchanged += other.unchanged
+        self.duplicates += other.duplicates
+        self.failed += other.failed
+        room = MAX_REPORTED_ERRORS - len(self.errors)
+        if room > 0:
+            self.errors.extend(other.errors[:room])
+
+    def add_error(self, line: int, message: str):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line, "error": message})
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "unchanged": self.unchanged,
+            "duplicates": self.duplicates,
+            "failed": self.failed,
+            "errors": self.errors,
+        }
+
+
+def ensure_indexes():
+    """
+    Indexes the ingest path relies on. Safe to call repeatedly. The unique index on
+    product_link cannot build while duplicate links exist; that is logged, and
+    `python -m products.ingest --merge-duplicates` clears them.
+    """
+    products_collection.create_index([("product_link", ASCENDING)], name="product_link_1")
+    product_changes_collection.create_index([("product_id", ASCENDING)], name="product_id_1")
+    # Watermark queries of the polling change watcher and catalog snapshot
+    products_collection.create_index([("scraped_at", ASCENDING)], name="scraped_at_1")
+    try:
+        products_collection.create_index(
+            [("product_link", ASCENDING)],
+            name="product_link_unique",
+            unique=True,
+            partialFilterExpression={"product_link": {"$type": "string"}}
+        )
+    except OperationFailure as e:
+        logger.error(
+            "could not create unique product_link index; run python -m products.ingest --merge-duplicates",
+            extra={"error": str(e)}
+        )
+
+
+def _repoint(survivors: Dict[str, str]):
+    """Point users' bag/favourites and their price watches at the surviving product ids."""
+    losers = list(survivors)
+    for user in users_collection.find(
+        {"$or": [{"bag": {"$in": losers}}, {"favourites": {"$in": losers}}]}, {"bag": 1, "favourites": 1}
+    ):
+        update = {}
+        for field in ("bag", "favourites"):
+            values = user.get(field) or []
+            if any(value in survivors for value in values):
+                update[field] = list(dict.fromkeys(survivors.get(value, value) for value in values))
+        users_collection.update_one({"_id": user["_id"]}, {"$set": update})
+
+    for watch in price_watches_collection.find({"product_id": {"$in": losers}}):
+        survivor = survivors[watch["product_id"]]
+        try:
+            price_watches_collection.update_one({"_id": watch["_id"]}, {"$set": {"product_id": survivor}})
+        except DuplicateKeyError:
+            # The user already watches the survivor; fold the lists into that watch
+            price_watches_collection.update_one(
+                {"product_id": survivor, "user_id": watch["user_id"]},
+                {"$addToSet": {"lists": {"$each": watch.get("lists") or []}}}
+            )
+            price_watches_collection.delete_one({"_id": watch["_id"]})
+
+
+def merge_duplicate_links() -> int:
+    """
+    Keep the most recently scraped product per product_link and delete the rest, so the
+    unique index can build. Users' lists and price watches are repointed to the survivor
+    first, and deletions go to the change log like any other change. Operator step, not
+    run at startup. Returns the number deleted.
+    """
+    survivors: Dict[str, str] = {}
+    duplicates = []
+    for group in products_collection.aggregate([
+        {"$match": {"product_link": {"$type": "string"}}},
+        {"$group": {
+            "_id": "$product_link",
+            "docs": {"$push": {"_id": "$_id", "scraped_at": "$scraped_at"}},
+            "count": {"$sum": 1}
+        }},
+        {"$match": {"count": {"$gt": 1}}},
+    ], allowDiskUse=True):
+        docs = sorted(
+            group["docs"],
+            key=lambda doc: (doc["scraped_at"] if isinstance(doc.get("scraped_at"), str) else "", doc["_id"]),
+            reverse=True
+        )
+        for doc in docs[1:]:
+            survivors[str(doc["_id"])] = str(docs[0]["_id"])
+            duplicates.append((group["_id"], doc["_id"]))
+    if not duplicates:
+        return 0
+
+    _repoint(survivors)
+    products_collection.delete_many({"_id": {"$in": [oid for _, oid in duplicates]}})
+    now = datetime.now(timezone.utc)
+    product_changes_collection.insert_many([
+        {"ts": now, "op": "delete", "product_id": str(oid), "product_link": link}
+        for link, oid in duplicates
+    ], ordered=True)
+    logger.warning("merged duplicate product links", extra={"deleted": len(duplicates)})
+    return len(duplicates)
+
+
+def _changed_fields(existing: Dict[str, Any], product: Dict[str, Any]) -> List[str]:
+    return sorted(
+        key for key, value in product.items()
+        if key not in _VOLATILE_FIELDS and existing.get(key) != value
+    )
+
+
+def ingest_batch(rows: List[Tuple[int, Dict[str, Any]]]) -> IngestResult:
+    """
+    Normalize and upsert one batch of (line number, raw product) rows.
+    Costs one read of the existing documents, one unordered bulk_write and one
+    insert_many into the change log.
+    """
+    started = time.perf_counter()
+    result = IngestResult(received=len(rows))
+
+    normalized: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+    for line, raw in rows:
+        try:
+            product = normalize_product(raw)
+        except (ValueError, TypeError, AttributeError) as e:
+            result.add_error(line, str(e))
+            continue
+        # Last occurrence of a link in a batch wins
+        if product["product_link"] in normalized:
+            result.duplicates += 1
+        normalized[product["product_link"]] = (line, product)
+
+    if not normalized:
+        return result
+
+    existing = {
+        doc["product_link"]: doc
+        for doc in products_collection.find({"product_link": {"$in": list(normalized)}})
+    }
+
+    now = datetime.now(timezone.utc)
+    operations = []
+    # One entry per operation, aligned by index with `operations`
+    pending: List[Dict[str, Any]] = []
+    for link, (line, product) in normalized.items():
+        current = existing.get(link)
+        if current is None:
+            operations.append(UpdateOne(
+                {"product_link": link},
+                {"$set": product, "$setOnInsert": {"created_at": now}},
+                upsert=True
+            ))
+            pending.append({"line": line, "op": "insert", "link": link, "fields": sorted(product)})
+            continue
+
+        fields = _changed_fields(current, product)
+        if not fields:
+            # Content unchanged: refresh freshness only, nothing for consumers to do
+            operations.append(UpdateOne(
+                {"_id": current["_id"]},
+                {"$set": {key: product[key] for key in _VOLATILE_FIELDS if key in product}}
+            ))
+            pending.append({"line": line, "op": None})
+            continue
+
+        operations.append(UpdateOne(
+            {"_id": current["_id"]},
+            {"$set": {**product, "updated_at": now}}
+        ))
+        pending.append({
+            "line": line,
+            "op": "update",
+            "link": link,
+            "product_id": current["_id"],
+            "fields": fields,
+            "previous": {"sale_price": current.get("sale_price"), "original_price": current.get("original_price")},
+        })
+
+    failed_indexes = set()
+    # Inserts that lost a race with another writer for the same link (unique index)
+    raced = []
+    try:
+        write = products_collection.bulk_write(operations, ordered=False)
+        upserted_ids = write.upserted_ids or {}
+    except BulkWriteError as e:
+        details = e.details or {}
+        upserted_ids = {item["index"]: item["_id"] for item in details.get("upserted", [])}
+        for error in details.get("writeErrors", []):
+            index = error["index"]
+            if error.get("code") == 11000 and pending[index]["op"] == "insert":
+                raced.append(index)
+                continue
+            failed_indexes.add(index)
+            result.add_error(pending[index]["line"], error.get("errmsg", "write failed"))
+
+    if raced:
+        # Someone else inserted these links first; apply ours as updates by link
+        retries = [
+            UpdateOne(
+                {"product_link": pending[index]["link"]},
+                {"$set": {**normalized[pending[index]["link"]][1], "updated_at": now}}
+            )
+            for index in raced
+        ]
+        try:
+            products_collection.bulk_write(retries, ordered=False)
+        except BulkWriteError as e:
+            for error in (e.details or {}).get("writeErrors", []):
+                index = raced[error["index"]]
+                failed_indexes.add(index)
+                result.add_error(pending[index]["line"], error.get("errmsg", "write failed"))
+        for index in raced:
+            pending[index]["op"] = "update"
+            pending[index]["product_id"] = None
+
+    changes = []
+    for index, entry in enumerate(pending):
+        if index in failed_indexes:
+            continue
+        if entry["op"] is None:
+            result.unchanged += 1
+            continue
+
+        product = normalized[entry["link"]][1]
+        if entry["op"] == "insert":
+            product_id = upserted_ids.get(index)
+            if product_id is None:
+                # A concurrent writer inserted the same link first; our $set became an update
+                result.updated += 1
+                product_id = (products_collection.find_one({"product_link": entry["link"]}, {"_id": 1}) or {}).get("_id")
+            else:
+                result.inserted += 1
+        else:
+            product_id = entry["product_id"]
+            if product_id is None:
+                product_id = (products_collection.find_one({"product_link": entry["link"]}, {"_id": 1}) or {}).get("_id")
+            result.updated += 1
+
+        changes.append({
+            "ts": now,
+            "op": entry["op"],
+            "product_id": str(product_id) if product_id is not None else None,
+            "product_link": entry["link"],
+            "fields": entry["fields"],
+            "sale_price": product.get("sale_price"),
+            "original_price": product.get("original_price"),
+            "previous": entry.get("previous"),
+        })
+
+    if changes:
+        product_changes_collection.insert_many(changes, ordered=True)
+        # This worker's caches see the batch now; others pick it up from the change watcher
+        bus.publish(
+            [ProductUpserted(change["product_id"]) for change in changes if change["product_id"]],
+            source="ingest"
+        )
+
+    ingested_products.inc(result.inserted, outcome="inserted")
+    ingested_products.inc(result.updated, outcome="updated")
+    ingested_products.inc(result.unchanged, outcome="unchanged")
+    ingested_products.inc(result.failed, outcome="failed")
+    ingest_batch_seconds.observe(time.perf_counter() - started)
+    return result
+
+
+def parse_ndjson(lines: Iterable[str], result: IngestResult, start_line: int = 1) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """Yield (line number, object) for each JSON object line; bad lines are recorded on `result`."""
+    for number, line in enumerate(lines, start=start_line):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            result.received += 1
+            result.add_error(number, f"invalid JSON: {e.msg}")
+            continue
+        if not isinstance(obj, dict):
+            result.received += 1
+            result.add_error(number, "expected a JSON object")
+            continue
+        yield number, obj
+
+
+def batched(rows: Iterable[Tuple[int, Dict[str, Any]]], size: int) -> Iterator[List[Tuple[int, Dict[str, Any]]]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest_lines(lines: Iterable[str], batch_size: int = None) -> IngestResult:
+    total = IngestResult()
+    for batch in batched(parse_ndjson(lines, total), batch_size or settings.INGEST_BATCH_SIZE):
+        total.merge(ingest_batch(batch))
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest NDJSON products into the catalog.")
+    parser.add_argument("path", nargs="?", help="NDJSON file, or - for stdin")
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    parser.add_argument(
+        "--merge-duplicates", action="store_true",
+        help="Merge products sharing a product_link into the newest one, then build the unique index"
+    )
+    args = parser.parse_args()
+
+    if args.merge_duplicates:
+        print(f"Merged {merge_duplicate_links()} duplicate products.")
+        ensure_indexes()
+        if args.path is None:
+            return
+    elif args.path is None:
+        parser.error("path is required unless --merge-duplicates is given")
+
+    ensure_indexes()
+    started = time.perf_counter()
+    if args.path == "-":
+        result = ingest_lines(sys.stdin, args.batch_size)
+    else:
+        with open(args.path, encoding="utf-8") as handle:
+            result = ingest_lines(handle, args.batch_size)
+
+    summary = result.as_dict()
+    summary["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(summary, indent=2, default=str))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+"""
+Invalidation bus for everything that caches product data in-process.
+
+A watcher thread tails a change stream on the products collection and publishes typed
+events to the handlers registered with `bus.subscribe`. Where change streams are not
+available (a standalone mongod, no replica set) it falls back to polling: products
+scraped past a scraped_at watermark and ids named in the ingest change log. Polling
+cannot see deletes that bypass the change log.
+
+Handlers receive events in batches and must be cheap and idempotent; an event may be
+delivered twice after the watcher reconnects.
+"""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+from bson import ObjectId
+from pymongo.errors import OperationFailure, PyMongoError
+
+from core.config import settings
+from core.database import product_changes_collection, products_collection
+from core.log import get_logger
+from core.metrics import registry
+
+
+logger = get_logger("products.invalidation")
+
+invalidation_events = registry.counter(
+    "invalidation_events_total",
+    "Product invalidation events published, by event type and source (stream or poll)",
+    ["event", "source"]
+)
+invalidation_handler_errors = registry.counter(
+    "invalidation_handler_errors_total",
+    "Invalidation handlers that raised while processing a batch",
+    ["handler"]
+)
+
+# Server codes meaning change streams are unavailable here (not a replica set / not supported)
+_UNSUPPORTED_CODES = {40573, 40324, 115}
+# The resume token fell off the oplog or can no longer be resumed from; changes were missed
+_HISTORY_LOST_CODES = {260, 280, 286}
+
+_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class ProductUpserted:
+    """A product was inserted or changed. `document` is the full document when the source had it."""
+    product_id: str
+    document: Optional[Dict[str, Any]] = field(default=None, compare=False)
+
+
+@dataclass(frozen=True)
+class ProductDeleted:
+    product_id: str
+
+
+@dataclass(frozen=True)
+class CatalogReset:
+    """Changes may have been missed (collection dropped, stream history lost); drop everything."""
+    reason: str
+
+
+Event = Union[ProductUpserted, ProductDeleted, CatalogReset]
+Handler = Callable[[List[Event]], None]
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._handlers: Dict[str, Handler] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, name: str, handler: Handler):
+        """Register `handler` under `name`; subscribing the same name again replaces it."""
+        with self._lock:
+            self._handlers[name] = handler
+
+    def publish(self, events: List[Event], source: str = "local"):
+        if not events:
+            return
+        for event in events:
+            invalidation_events.inc(event=type(event).__name__, source=source)
+        with self._lock:
+            handlers = list(self._handlers.items())
+        for name, handler in handlers:
+            try:
+                handler(events)
+            except Exception:
+                invalidation_handler_errors.inc(handler=name)
+                logger.exception("invalidation handler failed", extra={"handler": name})
+
+
+bus = InvalidationBus()
+
+
+def _event_from_change(change: Dict[str, Any]) -> Optional[Event]:
+    operation = change.get("operationType")
+    if operation in ("insert", "update", "replace"):
+        return ProductUpserted(str(change["documentKey"]["_id"]), change.get("fullDocument"))
+    if operation == "delete":
+        return ProductDeleted(str(change["documentKey"]["_id"]))
+    if operation in ("drop", "rename", "dropDatabase", "invalidate"):
+        return CatalogReset(operation)
+    return None
+
+
+class ChangeWatcher:
+    """Feeds `bus` from a change stream, or from polling when streams are unavailable."""
+
+    def __init__(self, bus: InvalidationBus):
+        self.bus = bus
+        self.mode: Optional[str] = None
+        self._resume_token = None
+        self._watermark: Optional[str] = None
+        self._change_cursor: Optional[ObjectId] = None
+
+    def run(self):
+        backoff = 1.0
+        while True:
+            try:
+                if self.mode != "poll":
+                    self._watch()
+                else:
+                    self._poll()
+                    time.sleep(settings.INVALIDATION_POLL_SECONDS)
+                backoff = 1.0
+            except OperationFailure as exc:
+                if exc.code in _UNSUPPORTED_CODES:
+                    logger.info("change streams unavailable, polling for product changes", extra={"code": exc.code})
+                    self.mode = "poll"
+                elif exc.code in _HISTORY_LOST_CODES:
+                    self._resume_token = None
+                    self.bus.publish([CatalogReset("history lost")], source="stream")
+                else:
+                    logger.warning("product change watcher failed", extra={"error": str(exc)})
+                    time.sleep(backoff)
+                    backoff = min(backoff * 2, 60.0)
+            except PyMongoError as exc:
+                logger.warning("product change watcher failed", extra={"error": str(exc)})
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+            except NotImplementedError:
+                # In-memory test doubles (mongomock) have no change streams; polling still works
+                logger.info("change streams not implemented, polling for product changes")
+                self.mode = "poll"
+            except Exception:
+                logger.exception("product change watcher failed unexpectedly")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+
+    def _watch(self):
+        with products_collection.watch(
+            full_document="updateLookup",
+            resume_after=self._resume_token,
+            max_await_time_ms=1000
+        ) as stream:
+            self.mode = "stream"
+            batch: List[Event] = []
+            while stream.alive:
+                change = stream.try_next()
+                if change is not None:
+                    # An invalidate token cannot be resumed after; the next stream starts fresh
+                    # (the reset published below covers anything missed in between)
+                    if change.get("operationType") == "invalidate":
+                        self._resume_token = None
+                    else:
+                        self._resume_token = stream.resume_token
+                    event = _event_from_change(change)
+                    if event is not None:
+                        batch.append(event)
+                # Publish once the stream has nothing more ready, or the batch is full
+                if batch and (change is None or len(batch) >= _BATCH_SIZE):
+                    self.bus.publish(batch, source="stream")
+                    batch = []
+
+    def _poll(self):
+        if self._watermark is None and self._change_cursor is None:
+            # Start from now; earlier changes are already reflected in every cache
+            latest = products_collection.find_one(
+                {"scraped_at": {"$type": "string"}}, {"scraped_at": 1}, sort=[("scraped_at", -1)]
+            )
+            last_change = product_changes_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            self._watermark = latest["scraped_at"] if latest else ""
+            self._change_cursor = last_change["_id"] if last_change else ObjectId(b"\x00" * 12)
+            return
+
+        changed_ids = set()
+        for change in product_changes_collection.find(
+            {"_id": {"$gt": self._change_cursor}}, {"product_id": 1}
+        ).sort("_id", 1):
+            self._change_cursor = change["_id"]
+            if ObjectId.is_valid(change.get("product_id") or ""):
+                changed_ids.add(ObjectId(change["product_id"]))
+
+        documents = list(products_collection.find({"scraped_at": {"$gt": self._watermark}}))
+        missing = changed_ids - {doc["_id"] for doc in documents}
+        if missing:
+            documents.extend(products_collection.find({"_id": {"$in": list(missing)}}))
+        found = {doc["_id"] for doc in documents}
+
+        events: List[Event] = [ProductUpserted(str(doc["_id"]), doc) for doc in documents]
+        events.extend(ProductDeleted(str(oid)) for oid in missing if oid not in found)
+        for doc in documents:
+            scraped_at = doc.get("scraped_at")
+            if isinstance(scraped_at, str) and scraped_at > self._watermark:
+                self._watermark = scraped_at
+        self.bus.publish(events, source="poll")
+
+
+def start_watcher():
+    """Start the change watcher on a daemon thread."""
+    watcher = ChangeWatcher(bus)
+    threading.Thread(target=watcher.run, name="product-invalidation", daemon=True).start()
+    return watcher
@@ -0,0 +1,224 @@
+"""
+Resumable, batched background migration that rewrites available_sizes and
+product_color into canonical arrays (products.normalize), so read paths can stop
+normalizing per row.
+
+Progress is checkpointed in the `migrations` collection after every batch (last
+processed _id and counters), so a stopped run resumes where it left off. A lease on
+the checkpoint document keeps several workers from running the same migration at
+once; whoever holds it does the work and the others return immediately.
+
+CLI:
+    python -m products.migrations [--batch-size 1000] [--reset]
+"""
+import argparse
+import os
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from core.database import migrations_collection, products_collection
+from core.log import get_logger
+from core.metrics import registry
+from .normalize import canonical_colors, canonical_sizes
+
+
+logger = get_logger("products.migrations")
+
+NORMALIZE_SIZES_COLORS = "normalize_sizes_colors_v1"
+
+LEASE_SECONDS = 60
+# How long a "not complete" answer is trusted before re-reading the checkpoint
+_INCOMPLETE_RECHECK_SECONDS = 60
+
+migration_docs = registry.counter(
+    "migration_documents_total",
+    "Documents scanned by data migrations, by outcome (rewritten/unchanged)",
+    ["migration", "outcome"]
+)
+migration_throughput = registry.gauge(
+    "migration_documents_per_second",
+    "Scan throughput of the most recent migration batch",
+    ["migration"]
+)
+migration_progress = registry.gauge(
+    "migration_progress_ratio",
+    "Fraction of the collection a migration has scanned (estimated)",
+    ["migration"]
+)
+
+_owner = f"{socket.gethostname()}:{os.getpid()}"
+_completion_cache: Dict[str, float] = {}
+
+
+def is_complete(name: str) -> bool:
+    """
+    Whether a migration has finished. A True answer is cached for the life of the
+    process; False is re-checked at most once a minute so hot paths stay cheap.
+    """
+    checked_at = _completion_cache.get(name)
+    if checked_at == float("inf"):
+        return True
+    if checked_at is not None and time.monotonic() - checked_at < _INCOMPLETE_RECHECK_SECONDS:
+        return False
+    try:
+        doc = migrations_collection.find_one({"_id": name}, {"done": 1})
+    except Exception as e:
+        logger.warning("could not read migration state", extra={"migration": name, "error": str(e)})
+        doc = None
+    done = bool(doc and doc.get("done"))
+    _completion_cache[name] = float("inf") if done else time.monotonic()
+    return done
+
+
+def _acquire_lease(name: str) -> Optional[Dict[str, Any]]:
+    """Take (or renew) the lease on the checkpoint; None if another worker holds it or it is done."""
+    now = datetime.now(timezone.utc)
+    try:
+        migrations_collection.update_one(
+            {"_id": name},
+            {"$setOnInsert": {"last_id": None, "processed": 0, "rewritten": 0, "done": False, "created_at": now}},
+            upsert=True
+        )
+    except DuplicateKeyError:
+        # Another worker created the checkpoint at the same moment
+        pass
+    return migrations_collection.find_one_and_update(
+        {
+            "_id": name,
+            "done": False,
+            "$or": [
+                {"lease_owner": _owner},
+                {"lease_expires": {"$lt": now}},
+                {"lease_expires": {"$exists": False}},
+            ],
+        },
+        {"$set": {"lease_owner": _owner, "lease_expires": now + timedelta(seconds=LEASE_SECONDS)}},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _canonical_update(doc: Dict[str, Any]) -> Dict[str, Any]:
+    update = {}
+    sizes = canonical_sizes(doc.get("available_sizes"))
+    if doc.get("available_sizes") != sizes:
+        update["available_sizes"] = sizes
+    colors = canonical_colors(doc.get("product_color"))
+    if doc.get("product_color") != colors:
+        update["product_color"] = colors
+    return update
+
+
+def run_normalize_sizes_colors(batch_size: int = None, pause: float = 0.0) -> Optional[Dict[str, Any]]:
+    """
+    Run (or resume) the sizes/colors migration to completion.
+    Returns the final checkpoint, or None if another worker holds the lease.
+    `pause` sleeps between batches to limit load on a live cluster.
+    """
+    name = NORMALIZE_SIZES_COLORS
+    batch_size = batch_size or settings.MIGRATION_BATCH_SIZE
+
+    checkpoint = _acquire_lease(name)
+    if checkpoint is None:
+        logger.info("migration not started: complete or leased elsewhere", extra={"migration": name})
+        return None
+
+    estimated_total = max(products_collection.estimated_document_count(), 1)
+    logger.info(
+        "migration started",
+        extra={"migration": name, "resume_from": str(checkpoint.get("last_id")), "processed": checkpoint["processed"]}
+    )
+
+    while True:
+        started = time.perf_counter()
+        query = {"_id": {"$gt": checkpoint["last_id"]}} if checkpoint.get("last_id") is not None else {}
+        docs = list(
+            products_collection.find(query, {"available_sizes": 1, "product_color": 1})
+            .sort("_id", 1)
+            .limit(batch_size)
+        )
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            update = _canonical_update(doc)
+            if update:
+                operations.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if operations:
+            products_collection.bulk_write(operations, ordered=False)
+
+        elapsed = time.perf_counter() - started
+        migration_docs.inc(len(operations), migration=name, outcome="rewritten")
+        migration_docs.inc(len(docs) - len(operations), migration=name, outcome="unchanged")
+        migration_throughput.set(len(docs) / elapsed if elapsed else 0.0, migration=name)
+
+        now = datetime.now(timezone.utc)
+        checkpoint = migrations_collection.find_one_and_update(
+            {"_id": name, "lease_owner": _owner},
+            {
+                "$set": {
+                    "last_id": docs[-1]["_id"],
+                    "updated_at": now,
+                    "lease_expires": now + timedelta(seconds=LEASE_SECONDS),
+                },
+                "$inc": {"processed": len(docs), "rewritten": len(operations)},
+            },
+            return_document=ReturnDocument.AFTER
+        )
+        if checkpoint is None:
+            logger.warning("migration lease lost; stopping", extra={"migration": name})
+            return None
+        migration_progress.set(min(checkpoint["processed"] / estimated_total, 1.0), migration=name)
+
+        if pause:
+            time.sleep(pause)
+
+    checkpoint = migrations_collection.find_one_and_update(
+        {"_id": name, "lease_owner": _owner},
+        {"$set": {"done": True, "completed_at": datetime.now(timezone.utc)}, "$unset": {"lease_expires": ""}},
+        return_document=ReturnDocument.AFTER
+    )
+    migration_progress.set(1.0, migration=name)
+    logger.info(
+        "migration complete",
+        extra={"migration": name, "processed": checkpoint and checkpoint["processed"], "rewritten": checkpoint and checkpoint["rewritten"]}
+    )
+    return checkpoint
+
+
+def start_background_migrations():
+    """Run pending migrations on a daemon thread so app startup is not delayed."""
+    def run():
+        try:
+            run_normalize_sizes_colors(pause=0.05)
+        except Exception:
+            logger.exception("migration failed", extra={"migration": NORMALIZE_SIZES_COLORS})
+
+    threading.Thread(target=run, name="migrations", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Normalize available_sizes/product_color to canonical arrays.")
+    parser.add_argument("--batch-size", type=int, default=settings.MIGRATION_BATCH_SIZE)
+    parser.add_argument("--pause", type=float, default=0.0, help="Seconds to sleep between batches")
+    parser.add_argument("--reset", action="store_true", help="Discard the checkpoint and start over")
+    args = parser.parse_args()
+
+    if args.reset:
+        migrations_collection.delete_one({"_id": NORMALIZE_SIZES_COLORS})
+    checkpoint = run_normalize_sizes_colors(args.batch_size, args.pause)
+    if checkpoint is None:
+        print("Migration is complete or running in another worker.")
+    else:
+        print(f"Done: scanned {checkpoint['processed']}, rewrote {checkpoint['rewritten']}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Canonical forms for scraped product fields.
+
+The scraper writes sizes and colors as lists or comma-separated strings and prices as
+numbers or "$1,234.00" strings. These helpers turn them into one shape so it can be
+done once on write instead of on every read.
+"""
+import hashlib
+import re
+import unicodedata
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+
+def normalize_sizes(sizes) -> Optional[List[str]]:
+    """
+    Normalize available_sizes from various formats to a list of strings.
+    Handles: None, empty string, list, comma-separated string.
+    """
+    if sizes is None:
+        return None
+    if isinstance(sizes, list):
+        # Already a list, return as is (filter out empty strings)
+        return [str(s).strip() for s in sizes if str(s).strip()]
+    if isinstance(sizes, str):
+        # Comma-separated string, split and clean
+        if not sizes.strip():
+            return None
+        # Filter out "See all sizes" and other non-size values
+        cleaned = [s.strip() for s in sizes.split(',') if s.strip() and s.strip().lower() != 'see all sizes']
+        return cleaned if cleaned else None
+    # For any other type, try to convert
+    try:
+        return [str(sizes).strip()] if str(sizes).strip() else None
+    except:
+        return None
+
+
+def normalize_colors(colors) -> Optional[List[str]]:
+    """
+    Normalize product_color from various formats to a list of strings.
+    Handles: None, empty string, list, comma-separated string.
+    """
+    if colors is None:
+        return None
+    if isinstance(colors, list):
+        # Already a list, return as is (filter out empty strings)
+        return [str(c).strip() for c in colors if str(c).strip()]
+    if isinstance(colors, str):
+        # Comma-separated string, split and clean
+        if not colors.strip():
+            return None
+        return [c.strip() for c in colors.split(',') if c.strip()]
+    # For any other type, try to convert
+    try:
+        return [str(colors).strip()] if str(colors).strip() else None
+    except:
+        return None
+
+
+def canonical_sizes(sizes) -> List[str]:
+    """Stored form of available_sizes: always a list, empty when there are none."""
+    return normalize_sizes(sizes) or []
+
+
+def canonical_colors(colors) -> List[str]:
+    """Stored form of product_color: always a list, empty when there are none."""
+    return normalize_colors(colors) or []
+
+
+def parse_price(value) -> Optional[float]:
+    """Parse numbers and "$1,234.00"-style strings into floats; anything else is None."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('$', '').replace(',', '').strip())
+    except (ValueError, TypeError):
+        return None
+
+
+def slugify(text: str) -> str:
+    """ASCII, lowercase, dash-separated: "Hermès Kelly 28" -> "hermes-kelly-28"."""
+    ascii_text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "-", ascii_text.lower()).strip("-")
+
+
+def filter_value(value: Any) -> Optional[str]:
+    """Facet value as the filter UI sends it: "Dolce & Gabbana" -> "dolce---gabbana"."""
+    if value is None:
+        return None
+    normalized = str(value).lower().strip()
+    return normalized.replace(" ", "-").replace("&", "-") or None
+
+
+def product_slug(product: Dict[str, Any]) -> str:
+    """Readable slug from brand and name, suffixed with a short hash of the link so it is unique."""
+    base = slugify(f"{product.get('brand_name') or ''} {product.get('product_name') or ''}")
+    suffix = hashlib.sha1(str(product.get("product_link", "")).encode("utf-8")).hexdigest()[:8]
+    return f"{base}-{suffix}" if base else suffix
+
+
+def normalize_product(raw: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the canonical stored form of a scraped product.
+    Raises ValueError if the product cannot be stored (it needs a product_link).
+    """
+    link = raw.get("product_link")
+    if not isinstance(link, str) or not link.strip():
+        raise ValueError("product_link is required")
+
+    product = {key: value for key, value in raw.items() if key not in ("_id", "id")}
+    product["product_link"] = link.strip()
+
+    product["available_sizes"] = canonical_sizes(raw.get("available_sizes"))
+    product["product_color"] = canonical_colors(raw.get("product_color"))
+
+    original_price = parse_price(raw.get("original_price"))
+    sale_price = parse_price(raw.get("sale_price"))
+    product["original_price"] = original_price
+    product["sale_price"] = sale_price
+
+    if original_price and sale_price and original_price > sale_price:
+        product["discount_value"] = round(original_price - sale_price, 2)
+        product["disc_pct"] = round((original_price - sale_price) / original_price * 100)
+    else:
+        product["discount_value"] = 0.0 if original_price and sale_price else None
+        product["disc_pct"] = 0 if original_price and sale_price else None
+
+    product["slug"] = product_slug(product)
+
+    if not product.get("scraped_at"):
+        product["scraped_at"] = datetime.now(timezone.utc).isoformat()
+
+    return product
@@ -0,0 +1,216 @@
+"""
+Per-user reranking of listing pages from bag/favourites signals.
+
+A user's affinity is built from the products in their bag and favourites: brand and
+category weights (shares of those products, bag items counting double) and the mean
+and spread of their log sale prices. Affinities are cached per worker for
+PERSONALIZE_AFFINITY_TTL.
+
+A page is reranked in place: its products only move within the page and within
+their block of PERSONALIZE_BLOCK listing positions (0..B-1, B..2B-1, ...), so the
+base order still dominates and no extra rows are read. Consecutive pages neither
+repeat nor skip products as long as the base order is stable across requests; that
+holds for /latest but not for /products/, whose base order is reshuffled on every
+request (personalization keeps each page's products, nothing more). Each product
+scores a prior for its position in the block plus PERSONALIZE_WEIGHT times its
+affinity, computed with numpy per block.
+
+Personalization never costs more than PERSONALIZE_BUDGET_MS: an affinity that is not
+cached is built on a small pool, and if it is not ready within the budget the page
+is served in its base order (the affinity lands in the cache for the next request).
+"""
+import math
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+from bson import ObjectId
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import users_collection
+from core.log import get_logger
+from core.metrics import registry
+from .record import ProductRecord
+
+
+logger = get_logger("products.personalize")
+
+personalized_requests = registry.counter(
+    "personalized_requests_total",
+    "Listing requests with a user_id, by outcome (reranked, no_signals, over_budget, error)",
+    ["outcome"]
+)
+personalize_seconds = registry.histogram(
+    "personalize_seconds",
+    "Time added to a listing request by personalization",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+
+# Bag items are stronger intent than favourites
+BAG_WEIGHT = 2.0
+FAVOURITE_WEIGHT = 1.0
+# Share of the affinity score given to brand, category and price
+BRAND_SHARE, CATEGORY_SHARE, PRICE_SHARE = 0.5, 0.3, 0.2
+# At most this many bag/favourites products are read to build an affinity
+MAX_SIGNALS = 200
+
+
+@dataclass
+class Affinity:
+    brands: Dict[str, float] = field(default_factory=dict)
+    categories: Dict[str, float] = field(default_factory=dict)
+    log_price_mean: Optional[float] = None
+    log_price_std: float = 1.0
+
+    @property
+    def empty(self) -> bool:
+        return not self.brands and not self.categories and self.log_price_mean is None
+
+
+def _log_price(value) -> float:
+    return math.log(value) if isinstance(value, (int, float)) and value > 0 else math.nan
+
+
+def build_affinity(bag: Sequence[str], favourites: Sequence[str], hydrate: Callable[[List[str]], List[ProductRecord]]) -> Affinity:
+    """Affinity from the user's bag and favourites; `hydrate` turns product ids into records."""
+    weights: Dict[str, float] = {}
+    for product_id in favourites:
+        weights[product_id] = max(weights.get(product_id, 0.0), FAVOURITE_WEIGHT)
+    for product_id in bag:
+        weights[product_id] = BAG_WEIGHT
+    product_ids = list(weights)[-MAX_SIGNALS:]
+    records = hydrate(product_ids) if product_ids else []
+    if not records:
+        return Affinity()
+
+    brands: Dict[str, float] = {}
+    categories: Dict[str, float] = {}
+    log_prices, price_weights = [], []
+    total = 0.0
+    for record in records:
+        weight = weights.get(record.id, FAVOURITE_WEIGHT)
+        total += weight
+        if record.brand_name:
+            brands[record.brand_name] = brands.get(record.brand_name, 0.0) + weight
+        if record.product_category:
+            categories[record.product_category] = categories.get(record.product_category, 0.0) + weight
+        log_price = _log_price(record.sale_price)
+        if not math.isnan(log_price):
+            log_prices.append(log_price)
+            price_weights.append(weight)
+
+    affinity = Affinity(
+        brands={key: value / total for key, value in brands.items()},
+        categories={key: value / total for key, value in categories.items()},
+    )
+    if log_prices:
+        prices = np.asarray(log_prices)
+        w = np.asarray(price_weights)
+        mean = float(np.average(prices, weights=w))
+        # Floor the spread so one saved product does not make the price term a spike
+        affinity.log_price_mean = mean
+        affinity.log_price_std = max(float(np.sqrt(np.average((prices - mean) ** 2, weights=w))), 0.35)
+    return affinity
+
+
+def load_user_lists(user_id: str):
+    """(bag, favourites) for a user, or None if there is no such user."""
+    _id = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+    user = users_collection.find_one({"_id": _id}, {"bag": 1, "favourites": 1})
+    if user is None:
+        return None
+    return user.get("bag") or [], user.get("favourites") or []
+
+
+class AffinityStore:
+    """Cached affinities, built on a small pool so callers can wait with a deadline."""
+
+    def __init__(self, hydrate: Callable[[List[str]], List[ProductRecord]]):
+        # Product ids -> records, from the caller's product cache
+        self.hydrate = hydrate
+        self._cache = TTLCache("user_affinity", settings.PERSONALIZE_CACHE_SIZE, settings.PERSONALIZE_AFFINITY_TTL)
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="affinity")
+
+    def _build(self, user_id: str) -> Affinity:
+        try:
+            lists = load_user_lists(user_id)
+            affinity = build_affinity(*lists, self.hydrate) if lists else Affinity()
+            self._cache.set(user_id, affinity)
+            return affinity
+        finally:
+            with self._lock:
+                self._pending.pop(user_id, None)
+
+    def get(self, user_id: str, timeout: float) -> Optional[Affinity]:
+        """The user's affinity, or None if it could not be had within `timeout` seconds."""
+        affinity = self._cache.get(user_id)
+        if affinity is not None:
+            return affinity
+        with self._lock:
+            future = self._pending.get(user_id)
+            if future is None:
+                future = self._executor.submit(self._build, user_id)
+                self._pending[user_id] = future
+        try:
+            return future.result(timeout=max(timeout, 0.0))
+        except FutureTimeout:
+            return None
+
+    def invalidate(self, user_id: str):
+        self._cache.pop(user_id)
+
+
+def score_block(records: Sequence[ProductRecord], first: int, affinity: Affinity) -> np.ndarray:
+    """Position prior (1 at the block's top, falling linearly) plus weighted affinity; `first` is the block offset of records[0]."""
+    n = len(records)
+    brand = np.fromiter((affinity.brands.get(r.brand_name, 0.0) for r in records), dtype=np.float64, count=n)
+    category = np.fromiter((affinity.categories.get(r.product_category, 0.0) for r in records), dtype=np.float64, count=n)
+    score = BRAND_SHARE * brand + CATEGORY_SHARE * category
+    if affinity.log_price_mean is not None:
+        log_price = np.fromiter((_log_price(r.sale_price) for r in records), dtype=np.float64, count=n)
+        z = (log_price - affinity.log_price_mean) / affinity.log_price_std
+        score += PRICE_SHARE * np.nan_to_num(np.exp(-0.5 * z * z))
+    prior = 1.0 - (first + np.arange(n)) / settings.PERSONALIZE_BLOCK
+    return prior + settings.PERSONALIZE_WEIGHT * score
+
+
+def rerank(records: List[ProductRecord], start: int, affinity: Affinity) -> List[ProductRecord]:
+    """Rerank `records` (listing positions start, start+1, ...) within PERSONALIZE_BLOCK-aligned blocks."""
+    block = settings.PERSONALIZE_BLOCK
+    reranked: List[ProductRecord] = []
+    position = 0
+    while position < len(records):
+        first = (start + position) % block
+        chunk = records[position:position + block - first]
+        order = np.argsort(-score_block(chunk, first, affinity), kind="stable")
+        reranked.extend(chunk[i] for i in order)
+        position += len(chunk)
+    return reranked
+
+
+def personalize_page(affinities: AffinityStore, user_id: str, limit: int, skip: int, load: Callable[[int, int], tuple]):
+    """(total, records) for one listing page reranked for `user_id`; `load(limit, skip)` is the unpersonalized loader."""
+    total, records = load(limit, skip)
+    started = time.perf_counter()
+    try:
+        affinity = affinities.get(user_id, settings.PERSONALIZE_BUDGET_MS / 1000)
+    except Exception:
+        logger.exception("affinity build failed", extra={"user_id": user_id})
+        personalized_requests.inc(outcome="error")
+        return total, records
+
+    if affinity is None:
+        outcome = "over_budget"
+    elif affinity.empty:
+        outcome = "no_signals"
+    else:
+        outcome, records = "reranked", rerank(list(records), skip, affinity)
+    personalized_requests.inc(outcome=outcome)
+    personalize_seconds.observe(time.perf_counter() - started)
+    return total, records
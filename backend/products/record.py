@@ -0,0 +1,154 @@
+"""
+Compact, read-only product record used by the listing paths and the product cache.
+
+A record holds the frontend-ready values that transform_product produces, but in
+__slots__ instead of a per-product dict: facet-like strings (brand, category, gender,
+currency, material, occasion, colors, sizes) are interned so every record shares one
+copy, list fields are stored as tuples, and the description, the largest field, is
+kept as UTF-8 bytes (zlib-compressed when long) and only decoded and title-cased
+when it is serialized. Records become dicts at the edge via to_dict().
+"""
+import sys
+import zlib
+from typing import Any, Dict, Optional
+
+from .transformers import all_caps, has_valid_dual_price, title_case
+
+
+# Descriptions longer than this (in bytes) are stored compressed
+_COMPRESS_OVER = 256
+
+
+def _intern(value: Any) -> Any:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _interned_tuple(value: Any) -> Any:
+    """Lists become tuples of interned strings; other values are kept as they are."""
+    if isinstance(value, list):
+        return tuple(_intern(item) for item in value)
+    return _intern(value)
+
+
+def _as_list(value: Any) -> Any:
+    return list(value) if isinstance(value, tuple) else value
+
+
+def _parse_price(value: Any) -> Any:
+    """Strings like "$1,234.00" become floats; unparseable strings become None."""
+    if value and isinstance(value, str):
+        try:
+            return float(value.replace('$', '').replace(',', '').strip())
+        except (ValueError, TypeError):
+            return None
+    return value
+
+
+class ProductRecord:
+    __slots__ = (
+        "id", "product_link", "product_image",
+        "brand_name", "product_category", "product_sub_category", "product_gender", "product_name",
+        "_description", "_description_compressed",
+        "currency", "original_price", "sale_price", "discount", "disc_pct", "discount_value",
+        "product_color", "product_material", "product_occasion", "available_sizes", "wishlist_state",
+        "search_tags", "scraped_at",
+    )
+
+    @classmethod
+    def from_product(cls, product: Dict) -> Optional["ProductRecord"]:
+        """
+        Build a record from a repository row.
+        Returns None if the product should be excluded (same rules as transform_product).
+        """
+        if not has_valid_dual_price(product):
+            return None
+
+        original_price = _parse_price(product.get("original_price"))
+        sale_price = _parse_price(product.get("sale_price"))
+
+        discount_value = product.get("discount_value")
+        if discount_value is None and original_price and sale_price:
+            try:
+                discount_value = float(original_price) - float(sale_price)
+            except (ValueError, TypeError):
+                discount_value = None
+
+        record = cls.__new__(cls)
+        record.id = product.get("id")
+        record.product_link = product.get("product_link")
+        record.product_image = product.get("product_image")
+        record.brand_name = _intern(all_caps(product.get("brand_name")))
+        record.product_category = _intern(all_caps(product.get("product_category")))
+        record.product_sub_category = _intern(title_case(product.get("product_sub_category")))
+        record.product_gender = _intern(title_case(product.get("product_gender")))
+        record.product_name = title_case(product.get("product_name"))
+        record._set_description(product.get("product_description"))
+        record.currency = _intern(product.get("currency"))
+        record.original_price = original_price
+        record.sale_price = sale_price
+        record.discount = product.get("discount")
+        record.disc_pct = product.get("disc_pct")
+        record.discount_value = discount_value
+        record.product_color = _interned_tuple(product.get("product_color", []))
+        record.product_material = _intern(product.get("product_material"))
+        record.product_occasion = _intern(product.get("product_occasion"))
+        record.available_sizes = _interned_tuple(product.get("available_sizes", []))
+        record.wishlist_state = bool(product.get("wishlist_state", False))
+        record.search_tags = _interned_tuple(product.get("search_tags"))
+        record.scraped_at = product.get("scraped_at")
+        return record
+
+    def _set_description(self, description: Any):
+        if not isinstance(description, str):
+            self._description = description
+            self._description_compressed = False
+            return
+        raw = description.encode("utf-8")
+        self._description_compressed = len(raw) > _COMPRESS_OVER
+        self._description = zlib.compress(raw) if self._description_compressed else raw
+
+    @property
+    def product_description(self) -> Optional[str]:
+        description = self._description
+        if not isinstance(description, bytes):
+            return title_case(description)
+        if self._description_compressed:
+            description = zlib.decompress(description)
+        return title_case(description.decode("utf-8"))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The dict transform_product returns for the same row."""
+        return {
+            "id": self.id,
+
+            # LINKS / MEDIA
+            "product_link": self.product_link,
+            "product_image": self.product_image,
+
+            # TEXT FIELDS
+            "brand_name": self.brand_name,
+            "product_category": self.product_category,
+            "product_sub_category": self.product_sub_category,
+            "product_gender": self.product_gender,
+            "product_name": self.product_name,
+            "product_description": self.product_description,
+
+            # PRICES
+            "currency": self.currency,
+            "original_price": self.original_price,
+            "sale_price": self.sale_price,
+            "discount": self.discount,
+            "disc_pct": self.disc_pct,
+            "discount_value": self.discount_value,
+
+            # ATTRIBUTES
+            "product_color": _as_list(self.product_color),
+            "product_material": self.product_material,
+            "product_occasion": self.product_occasion,
+            "available_sizes": _as_list(self.available_sizes),
+            "wishlist_state": self.wishlist_state,
+
+            # META
+            "search_tags": _as_list(self.search_tags),
+            "scraped_at": self.scraped_at,
+        }
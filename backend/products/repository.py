@@ -4,6 +4,12 @@ from bson import ObjectId
 from products.models import Product
 from typing import Dict, List, Optional, Any
 from core.constants.filter_constants import PRICE_RANGES
+from .normalize import normalize_sizes, normalize_colors
+from .migrations import NORMALIZE_SIZES_COLORS, is_complete as migration_complete
+from core.log import get_logger
+
+
+logger = get_logger("products.repository")
 
 
 class ProductRepository:
@@ -17,51 +23,151 @@ class ProductRepository:
         }
     }
 
-    @staticmethod
-    def _normalize_sizes(sizes) -> Optional[List[str]]:
-        """
-        Normalize available_sizes from various formats to a list of strings.
-        Handles: None, empty string, list, comma-separated string.
-        """
-        if sizes is None:
-            return None
-        if isinstance(sizes, list):
-            # Already a list, return as is (filter out empty strings)
-            return [str(s).strip() for s in sizes if str(s).strip()]
-        if isinstance(sizes, str):
-            # Comma-separated string, split and clean
-            if not sizes.strip():
-                return None
-            # Filter out "See all sizes" and other non-size values
-            cleaned = [s.strip() for s in sizes.split(',') if s.strip() and s.strip().lower() != 'see all sizes']
-            return cleaned if cleaned else None
-        # For any other type, try to convert
-        try:
-            return [str(sizes).strip()] if str(sizes).strip() else None
-        except:
-            return None
-    
-    @staticmethod
-    def _normalize_colors(colors) -> Optional[List[str]]:
-        """
-        Normalize product_color from various formats to a list of strings.
-        Handles: None, empty string, list, comma-separated string.
-        """
-        if colors is None:
-            return None
-        if isinstance(colors, list):
-            # Already a list, return as is (filter out empty strings)
-            return [str(c).strip() for c in colors if str(c).strip()]
-        if isinstance(colors, str):
-            # Comma-separated string, split and clean
-            if not colors.strip():
-                return None
-            return [c.strip() for c in colors.split(',') if c.strip()]
-        # For any other type, try to convert
-        try:
-            return [str(colors).strip()] if str(colors).strip() else None
-        except:
-            return None
+    # Luxury brands (with common spelling variations) featured in top deals
+    TOP_DEAL_BRANDS = [
+        # Brunello Cucinelli
+        "Brunello Cucinelli",
+        
+        # Brioni
+        "Brioni",
+        
+        # Loro Piana
+        "Loro Piana",
+        
+        # Berluti
+        "Berluti",
+        
+        # Zegna / Ermenegildo Zegna
+        "Zegna",
+        "Ermenegildo Zegna",
+        "ERMENEGILDO ZEGNA",
+        
+        # Tom Ford / TOM FORD
+        "Tom Ford",
+        "TOM FORD",
+        
+        # Kiton
+        "Kiton",
+        "KITON",
+        
+        # Ralph Lauren Purple Label
+        "Ralph Lauren Purple Label",
+        "RALPH LAUREN PURPLE LABEL",
+        
+        # Polo Ralph Lauren
+        "Polo Ralph Lauren",
+        "POLO RALPH LAUREN",
+        
+        # Salvatore Ferragamo / Ferragamo
+        "Salvatore Ferragamo",
+        "Ferragamo",
+        "FERRAGAMO",
+        
+        # Canali
+        "Canali",
+        "CANALI",
+        
+        # Stefano Ricci
+        "Stefano Ricci",
+        "STEFANO RICCI",
+        
+        # Bottega Veneta
+        "Bottega Veneta",
+        "BOTTEGA VENETA",
+        
+        # Hermes / Hermès
+        "Hermes",
+        "Hermès",
+        "HERMÈS",
+        
+        # Chanel
+        "Chanel",
+        "CHANEL",
+        
+        # Zimmerman / Zimmermann
+        "Zimmerman",
+        "Zimmermann",
+        "ZIMMERMANN",
+        
+        # Christopher Esber
+        "Christopher Esber",
+        "CHRISTOPHER ESBER",
+        
+        # Ellie Saab / Elie Saab
+        "Ellie Saab",
+        "Elie Saab",
+        "ELIE SAAB",
+        
+        # Valentino / Valentino Garavani
+        "Valentino",
+        "Valentino Garavani",
+        "VALENTINO",
+        
+        # Dolce & Gabbana / Dolce&Gabbana
+        "Dolce & Gabbana",
+        "Dolce&Gabbana",
+        "DOLCE & GABBANA",
+        "DOLCE&GABBANA",
+        
+        # Etro / ETRO
+        "Etro",
+        "ETRO",
+        
+        # Oscar de la Renta
+        "Oscar de la Renta",
+        "OSCAR DE LA RENTA",
+        
+        # Carolina Herrera
+        "Carolina Herrera",
+        "CAROLINA HERRERA",
+        
+        # Gucci
+        "Gucci",
+        "GUCCI",
+        
+        # Louis Vuitton
+        "Louis Vuitton",
+        "LOUIS VUITTON"
+    ]
+
+    # Luxury brands shown in the latest products feed
+    LATEST_BRANDS = [
+        "Brioni", "Brunello Cucinelli", "Zegna", "Bottega Veneta", 
+        "Canali", "Polo Ralph Lauren", "John Lobb", "Johnstons Of Elgin", "Kiton", 
+        "LOEWE", "N.Peal", "Prada", "Saint Laurent", "Ralph Lauren Purple Label", 
+        "Salvatore Ferragamo", "Santoni", "Zimmermann", "FARM Rio", "Chrome Hearts", 
+        "Alexander McQueen", "Dolce & Gabbana", "Dolce&Gabbana", 
+        "Christian Louboutin", "Maje", "Sandro Paris", "Missoni", "Johanna Ortiz", 
+        "Gabriela Hearst", "Cartier", "Marina Rinaldi", "Christopher Esber", 
+        "Oscar de la Renta", "Derek Rose", "Falke", "Etro", "ETRO", "Balenciaga", 
+        "Bally", "JACQUEMUS", "Jacquemus", "Giorgio Armani", "Canada Goose", 
+        "AMI Paris", "Yves Salomon", "Corneliani", "MACKAGE", "AG Jeans", 
+        "Fear of God", "Orlebar Brown", "EVISU", "BAPE", "A BATHING APE®", 
+        "AAPE BY *A BATHING APE®", "Lanvin", "Versace", 
+        "TOD's", "Tod's", "AllSaints", "ALLSAINTS", "Balmain", "Burberry", 
+        "Chloé", "Common Projects", "Fleur du Mal", "Fendi", "FERRAGAMO", 
+        "Ferragamo", "Gucci", "Hanro", "Helmut Lang", "Herno", "Heron Preston", 
+        "Hogan", "Isabel Marant", "Isabel Marant Etoile", "ISSEY MIYAKE", 
+        "Issey Miyake", "J.Lindeberg", "Jimmy Choo", "Kenzo", "Ksubi", "lululemon", 
+        "Mackage", "Lladró", "Maison Margiela", "Marc Jacobs", "Palm Angels", 
+        "Palm Angels Kids", "Paige", "PAIGE", "Moschino", "Off-White", 
+        "Off-White Kids", "RHUDE", "Rhude", "Roberto Cavalli", "Theory", 
+        "Stüssy", "Stone Island", "Vilebrequin"
+    ]
+
+    # Keywords to filter out from product names and descriptions in general listings
+    # Products containing any of these keywords will be excluded
+    LISTING_EXCLUDED_KEYWORDS = [
+        "diamond",
+        "ring",
+        "gold",
+        "coin",
+        "furniture",
+        "streamdale",
+    ]
+
+    _normalize_sizes = staticmethod(normalize_sizes)
+    _normalize_colors = staticmethod(normalize_colors)
 
     @staticmethod
     def get_top_deals(limit: int, skip: int = 0):
@@ -69,116 +175,9 @@ class ProductRepository:
         Get top deals filtered by specific luxury brands.
         Includes common brand name variations for better matching.
         """
-        # Define the list of luxury brands to filter by, including variations
-        brand_names = [
-            # Brunello Cucinelli
-            "Brunello Cucinelli",
-            
-            # Brioni
-            "Brioni",
-            
-            # Loro Piana
-            "Loro Piana",
-            
-            # Berluti
-            "Berluti",
-            
-            # Zegna / Ermenegildo Zegna
-            "Zegna",
-            "Ermenegildo Zegna",
-            "ERMENEGILDO ZEGNA",
-            
-            # Tom Ford / TOM FORD
-            "Tom Ford",
-            "TOM FORD",
-            
-            # Kiton
-            "Kiton",
-            "KITON",
-            
-            # Ralph Lauren Purple Label
-            "Ralph Lauren Purple Label",
-            "RALPH LAUREN PURPLE LABEL",
-            
-            # Polo Ralph Lauren
-            "Polo Ralph Lauren",
-            "POLO RALPH LAUREN",
-            
-            # Salvatore Ferragamo / Ferragamo
-            "Salvatore Ferragamo",
-            "Ferragamo",
-            "FERRAGAMO",
-            
-            # Canali
-            "Canali",
-            "CANALI",
-            
-            # Stefano Ricci
-            "Stefano Ricci",
-            "STEFANO RICCI",
-            
-            # Bottega Veneta
-            "Bottega Veneta",
-            "BOTTEGA VENETA",
-            
-            # Hermes / Hermès
-            "Hermes",
-            "Hermès",
-            "HERMÈS",
-            
-            # Chanel
-            "Chanel",
-            "CHANEL",
-            
-            # Zimmerman / Zimmermann
-            "Zimmerman",
-            "Zimmermann",
-            "ZIMMERMANN",
-            
-            # Christopher Esber
-            "Christopher Esber",
-            "CHRISTOPHER ESBER",
-            
-            # Ellie Saab / Elie Saab
-            "Ellie Saab",
-            "Elie Saab",
-            "ELIE SAAB",
-            
-            # Valentino / Valentino Garavani
-            "Valentino",
-            "Valentino Garavani",
-            "VALENTINO",
-            
-            # Dolce & Gabbana / Dolce&Gabbana
-            "Dolce & Gabbana",
-            "Dolce&Gabbana",
-            "DOLCE & GABBANA",
-            "DOLCE&GABBANA",
-            
-            # Etro / ETRO
-            "Etro",
-            "ETRO",
-            
-            # Oscar de la Renta
-            "Oscar de la Renta",
-            "OSCAR DE LA RENTA",
-            
-            # Carolina Herrera
-            "Carolina Herrera",
-            "CAROLINA HERRERA",
-            
-            # Gucci
-            "Gucci",
-            "GUCCI",
-            
-            # Louis Vuitton
-            "Louis Vuitton",
-            "LOUIS VUITTON"
-        ]
-        
         # Build query with brand filter and image filter
         query = {
-            "brand_name": {"$in": brand_names}
+            "brand_name": {"$in": ProductRepository.TOP_DEAL_BRANDS}
         }
         query.update(ProductRepository.IMAGE_FILTER)
         
@@ -217,6 +216,18 @@ class ProductRepository:
         # Fetch products sorted by discount
         items = list(products_collection.aggregate(pipeline))
         
+        return total_count, ProductRepository.prepare_top_deal_items(items)
+
+    @staticmethod
+    def prepare_top_deal_items(items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Normalize and validate raw top-deal rows against the Product model.
+        Rows may carry Mongo's _id or an already converted id; invalid rows are skipped.
+        """
+        # Once the sizes/colors migration has run, stored lists are already canonical and
+        # only stray legacy values (scraper writes that bypassed ingest) need normalizing
+        canonical_lists = migration_complete(NORMALIZE_SIZES_COLORS)
+        
         validated_items = []
         for item in items:
             # 1. Manual transform of the ID
@@ -225,16 +236,14 @@ class ProductRepository:
             
             # 2. Normalize fields that might be in different formats
             # Normalize available_sizes (convert string to list if needed)
-            if "available_sizes" in item:
-                item["available_sizes"] = ProductRepository._normalize_sizes(item["available_sizes"])
-            else:
-                item["available_sizes"] = None
+            sizes = item.get("available_sizes")
+            if not (canonical_lists and isinstance(sizes, list)):
+                item["available_sizes"] = ProductRepository._normalize_sizes(sizes)
             
             # Normalize product_color (convert string to list if needed)
-            if "product_color" in item:
-                item["product_color"] = ProductRepository._normalize_colors(item["product_color"])
-            else:
-                item["product_color"] = None
+            colors = item.get("product_color")
+            if not (canonical_lists and isinstance(colors, list)):
+                item["product_color"] = ProductRepository._normalize_colors(colors)
             
             # Set defaults for other optional fields
             if "product_description" not in item:
@@ -248,10 +257,10 @@ class ProductRepository:
                 validated_items.append(validated_product.model_dump())
             except Exception as e:
                 # Skip invalid products instead of crashing
-                print(f"Error validating product: {e}")
+                logger.warning("skipping invalid product", extra={"product_id": item.get("id"), "error": str(e)})
                 continue
             
-        return total_count, validated_items
+        return validated_items
 
     @staticmethod
     def get_products(limit: int, skip: int):
@@ -264,17 +273,6 @@ class ProductRepository:
         import random
         from bson.regex import Regex
         
-        # Keywords to filter out from product names and descriptions
-        # Products containing any of these keywords will be excluded
-        excluded_keywords = [
-            "diamond",
-            "ring",
-            "gold",
-            "coin",
-            "furniture",
-            "streamdale",
-        ]
-        
         # Generate a random seed for consistent randomization per request
         random_seed = random.randint(0, 1000000)
         
@@ -292,7 +290,7 @@ class ProductRepository:
         # Add filter to exclude products with certain keywords in product_name or product_description
         # Use $nor to exclude products where product_name OR product_description contains any excluded keyword
         keyword_filters = []
-        for keyword in excluded_keywords:
+        for keyword in ProductRepository.LISTING_EXCLUDED_KEYWORDS:
             keyword_regex = Regex(keyword, "i")  # Case-insensitive
             keyword_filters.append({
                 "$or": [
@@ -414,12 +412,31 @@ class ProductRepository:
                 del item["_id"]
         return item
 
+    @staticmethod
+    def get_products_by_ids(product_ids: List[str]):
+        """
+        Get products by id in one query, returning them in the order of product_ids.
+        Ids that are invalid, missing or fail the image filter are skipped.
+        """
+        object_ids = [ObjectId(pid) for pid in product_ids if ObjectId.is_valid(pid)]
+        if not object_ids:
+            return []
+        
+        query = {"_id": {"$in": object_ids}}
+        query.update(ProductRepository.IMAGE_FILTER)
+        
+        products_map = {}
+        for item in products_collection.find(query):
+            item["id"] = str(item.pop("_id"))
+            products_map[item["id"]] = item
+        
+        return [products_map[pid] for pid in product_ids if pid in products_map]
+
     @staticmethod
     def get_products_by_gender_with_brand_sort(gender: str, limit: int, skip: int):
         """Get products filtered by gender, sorted by brand order with randomization within each brand group."""
         from bson.regex import Regex
         import random
-        print("new api hit")
 
         # Brand order list for sorting
         brand_order = ['Brioni', 'Brunello Cucinelli', 'Zegna', 'TOM FORD', 'Bottega Veneta', 'Canali', 'Polo Ralph Lauren', 'John Lobb', 'Johnstons Of Elgin', 'Kiton', 'LOEWE', 'N.Peal', 'Prada', 'Saint Laurent', 'Ralph Lauren Purple Label', 'Salvatore Ferragamo', 'Santoni', 'Zimmermann', 'FARM Rio', 'Chrome Hearts', 'Alexander McQueen', 'Valentino', 'Dolce & Gabbana', 'Dolce&Gabbana', 'Christian Louboutin', 'Maje', 'Sandro Paris', 'Missoni', 'Johanna Ortiz', 'Gabriela Hearst', 'Cartier', 'Marina Rinaldi', 'Christopher Esber', 'Oscar de la Renta', 'Derek Rose', 'Falke', 'Etro', 'ETRO', 'Balenciaga', 'Bally', 'JACQUEMUS', 'Jacquemus', 'Giorgio Armani', 'Canada Goose', 'AMI Paris', 'Yves Salomon', 'Corneliani', 'MACKAGE', 'AG Jeans', 'Fear of God', 'Orlebar Brown', 'EVISU', 'BAPE', 'A BATHING APE®', 'AAPE BY *A BATHING APE®', 'Lanvin', 'Valentino Garavani', 'Versace', "TOD's", "Tod's", 'AllSaints', 'ALLSAINTS', 'Balmain', 'Burberry', 'Chloé', 'Common Projects', 'Fleur du Mal', 'Fendi', 'FERRAGAMO', 'Ferragamo', 'Gucci', 'Hanro', 'Helmut Lang', 'Herno', 'Heron Preston', 'Hogan', 'Isabel Marant', 'Isabel Marant Etoile', 'ISSEY MIYAKE', 'Issey Miyake', 'J.Lindeberg', 'Jimmy Choo', 'Kenzo', 'Ksubi', 'lululemon', 'Mackage', 'Lladró', 'Maison Margiela', 'Marc Jacobs', 'Palm Angels', 'Palm Angels Kids', 'Paige', 'PAIGE', 'Moschino', 'Off-White', 'Off-White Kids', 'Rick Owens', 'Rick Owens DRKSHDW', 'Rick Owens Lilies', 'Rick Owens X Champion', 'RHUDE', 'Rhude', 'Roberto Cavalli', 'Theory', 'Stüssy', 'Stone Island', 'Vilebrequin', "Church's", 'Comme des Garçons', 'Comme Des Garçons', 'Acne Studios', 'Acqua di Parma', 'A-COLD-WALL*', 'Alexander Wang', 'alexanderwang.t', 'alice + olivia', 'Alice+Olivia', 'adidas Yeezy', 'Balmain Kids', 'BAPE BLACK *A BATHING APE®', 'BAPY BY *A BATHING APE®', 'Barbour', 'Barbour International', 'Birkenstock', 'BIRKENSTOCK 1774', 'DOMREBEL', 'VETEMENTS', 'Armani', 'Ea7 Emporio Armani', 'Ed Hardy', 'Fear Of God', 'FEAR OF GOD ESSENTIALS', 'Fear of God ESSENTIALS', 'Fear of God Athletics', 'FEAR OF GOD ESSENTIALS KIDS', 'Fendi Kids', 'FRAME', 'Giuseppe Zanotti', 'Givenchy', 'Gianvito Rossi', 'La Perla', 'Eileen Fisher', 'Elie Tahari', 'Eleventy', 'Emporio Armani', 'Dita Eyewear', 'TOM FORD Eyewear', 'Cartier Eyewear', 'Dolce & Gabbana Eyewear', 'Prada Eyewear', 'Gucci Eyewear', 'Alexander McQueen Eyewear', 'Balenciaga Eyewear', 'Chloé Eyewear', 'Balmain Eyewear', 'Palm Angels Eyewear', 'Burberry Eyewear', 'Givenchy Eyewear', 'Jimmy Choo Eyewear', 'Off-White Eyewear', 'Versace Eyewear', 'Hermès\xa0Pre-Owned', 'CHANEL Pre-Owned', 'Bottega Veneta Pre-Owned', 'Christian Dior Pre-Owned', 'Balenciaga Pre-Owned', 'Celine Pre-Owned', 'Fendi Pre-Owned', 'Goyard Pre-Owned', 'Gucci Pre-Owned', 'Loewe Pre-Owned', 'Louis Vuitton Pre-Owned', 'Prada Pre-Owned', 'Versace Pre-Owned', 'MEMO PARIS', 'Bond No. 9', 'Bobbi Brown', 'Estée Lauder', 'Jo Malone London', 'La Prairie', 'Kerastase', "Kiehl's", 'Lancôme', 'Prada Beauty']
@@ -527,34 +544,9 @@ class ProductRepository:
     @staticmethod
     def get_latest_products(limit: int, skip: int):
         """Get newest products sorted by scraped_at (or _id fallback) descending, filtered by luxury brands."""
-        # Define the list of luxury brands to filter by
-        brand_names = [
-            "Brioni", "Brunello Cucinelli", "Zegna", "Bottega Veneta", 
-            "Canali", "Polo Ralph Lauren", "John Lobb", "Johnstons Of Elgin", "Kiton", 
-            "LOEWE", "N.Peal", "Prada", "Saint Laurent", "Ralph Lauren Purple Label", 
-            "Salvatore Ferragamo", "Santoni", "Zimmermann", "FARM Rio", "Chrome Hearts", 
-            "Alexander McQueen", "Dolce & Gabbana", "Dolce&Gabbana", 
-            "Christian Louboutin", "Maje", "Sandro Paris", "Missoni", "Johanna Ortiz", 
-            "Gabriela Hearst", "Cartier", "Marina Rinaldi", "Christopher Esber", 
-            "Oscar de la Renta", "Derek Rose", "Falke", "Etro", "ETRO", "Balenciaga", 
-            "Bally", "JACQUEMUS", "Jacquemus", "Giorgio Armani", "Canada Goose", 
-            "AMI Paris", "Yves Salomon", "Corneliani", "MACKAGE", "AG Jeans", 
-            "Fear of God", "Orlebar Brown", "EVISU", "BAPE", "A BATHING APE®", 
-            "AAPE BY *A BATHING APE®", "Lanvin", "Versace", 
-            "TOD's", "Tod's", "AllSaints", "ALLSAINTS", "Balmain", "Burberry", 
-            "Chloé", "Common Projects", "Fleur du Mal", "Fendi", "FERRAGAMO", 
-            "Ferragamo", "Gucci", "Hanro", "Helmut Lang", "Herno", "Heron Preston", 
-            "Hogan", "Isabel Marant", "Isabel Marant Etoile", "ISSEY MIYAKE", 
-            "Issey Miyake", "J.Lindeberg", "Jimmy Choo", "Kenzo", "Ksubi", "lululemon", 
-            "Mackage", "Lladró", "Maison Margiela", "Marc Jacobs", "Palm Angels", 
-            "Palm Angels Kids", "Paige", "PAIGE", "Moschino", "Off-White", 
-            "Off-White Kids", "RHUDE", "Rhude", "Roberto Cavalli", "Theory", 
-            "Stüssy", "Stone Island", "Vilebrequin"
-        ]
-        
         # Build query with brand filter and image filter
         query = {
-            "brand_name": {"$in": brand_names}
+            "brand_name": {"$in": ProductRepository.LATEST_BRANDS}
         }
         query.update(ProductRepository.IMAGE_FILTER)
         
@@ -601,34 +593,31 @@ class ProductRepository:
         ]
         occasions = list(products_collection.aggregate(occasion_pipeline))
         
-        # Get price range counts
-        price_counts = {}
+        # Get price range counts, all ranges in one aggregation
+        range_counts = {}
         for price_range in PRICE_RANGES:
-            price_query = {}
-            # Add image filter
-            price_query.update(ProductRepository.IMAGE_FILTER)
-            
-            # Build sale_price filter based on range
-            sale_price_filter = {
-                "$exists": True,
-                "$type": "number"
-            }
-            
-            if price_range["min"] is not None and price_range["max"] is not None:
-                sale_price_filter["$gte"] = price_range["min"]
-                sale_price_filter["$lte"] = price_range["max"]
-            elif price_range["min"] is not None:
+            sale_price_filter = {}
+            if price_range["min"] is not None:
                 sale_price_filter["$gte"] = price_range["min"]
-            elif price_range["max"] is not None:
+            if price_range["max"] is not None:
                 sale_price_filter["$lte"] = price_range["max"]
-            else:
+            if not sale_price_filter:
                 # Both are None, skip this range
                 continue
-            
-            price_query["sale_price"] = sale_price_filter
-            
-            count = products_collection.count_documents(price_query)
-            price_counts[price_range["value"]] = count
+            range_counts[price_range["value"]] = [
+                {"$match": {"sale_price": sale_price_filter}},
+                {"$count": "count"}
+            ]
+        price_query = {"sale_price": {"$exists": True, "$type": "number"}}
+        price_query.update(ProductRepository.IMAGE_FILTER)
+        result = next(products_collection.aggregate([
+            {"$match": price_query},
+            {"$facet": range_counts}
+        ]), {})
+        price_counts = {
+            value: (result.get(value) or [{"count": 0}])[0]["count"]
+            for value in range_counts
+        }
         
         return {
             "categories": categories,
@@ -638,18 +627,15 @@ class ProductRepository:
         }
 
     @staticmethod
-    def get_filtered_products(
-        limit: int,
-        skip: int,
+    def _build_filter_query(
         category: Optional[List[str]] = None,
         brand: Optional[List[str]] = None,
         occasion: Optional[List[str]] = None,
         price_min: Optional[float] = None,
         price_max: Optional[float] = None,
-        gender: Optional[str] = None,
-        sort_by: Optional[str] = None
-    ):
-        """Get products with filters applied. Sorting is handled on the backend."""
+        gender: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Mongo filter for the /filter endpoints, image filter included."""
         from bson.regex import Regex
         
         query = {}
@@ -705,6 +691,25 @@ class ProductRepository:
         # Add image filter
         query.update(ProductRepository.IMAGE_FILTER)
         
+        return query
+
+    @staticmethod
+    def get_filtered_products(
+        limit: int,
+        skip: int,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None,
+        sort_by: Optional[str] = None
+    ):
+        """Get products with filters applied. Sorting is handled on the backend."""
+        query = ProductRepository._build_filter_query(
+            category, brand, occasion, price_min, price_max, gender
+        )
+        
         # Get total count
         total = products_collection.count_documents(query)
         
@@ -776,6 +781,148 @@ class ProductRepository:
         return total, items
 
 
+    @staticmethod
+    def get_facet_counts(
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """
+        Per-value counts for each facet under the other facets' filters (a facet's own
+        selection does not narrow its counts), plus the fully filtered total. One aggregation.
+        """
+        filters = {
+            "category": category, "brand": brand, "occasion": occasion, "gender": gender
+        }
+        fields = {
+            "category": "product_category", "brand": "brand_name",
+            "occasion": "product_occasion", "gender": "product_gender"
+        }
+
+        facets = {}
+        for name, field in fields.items():
+            others = {**filters, name: None}
+            query = ProductRepository._build_filter_query(
+                others["category"], others["brand"], others["occasion"], price_min, price_max, others["gender"]
+            )
+            facets[name] = [
+                {"$match": query},
+                {"$group": {"_id": f"${field}", "count": {"$sum": 1}}}
+            ]
+        total_query = ProductRepository._build_filter_query(category, brand, occasion, price_min, price_max, gender)
+        facets["total"] = [{"$match": total_query}, {"$count": "count"}]
+
+        result = next(products_collection.aggregate([
+            {"$match": ProductRepository.IMAGE_FILTER},
+            {"$facet": facets}
+        ]), {})
+        total = result["total"][0]["count"] if result.get("total") else 0
+        return total, {name: result.get(name, []) for name in fields}
+
+    @staticmethod
+    def get_price_histogram(
+        bins: int,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """
+        Equal-width sale_price histogram of the filtered products in two streaming
+        aggregations: a $group for the set's min/max, then rows grouped by bin. Neither
+        holds the matched documents in memory, and both run on servers without window functions.
+        Returns (total, min, max, counts) with `bins` counts; min/max are None when nothing matches.
+        """
+        query = ProductRepository._build_filter_query(category, brand, occasion, price_min, price_max, gender)
+        query["sale_price"] = {**query.get("sale_price", {}), "$type": "number"}
+
+        counts = [0] * bins
+        bounds = next(products_collection.aggregate([
+            {"$match": query},
+            {"$group": {"_id": None, "lo": {"$min": "$sale_price"}, "hi": {"$max": "$sale_price"}}}
+        ], allowDiskUse=True), None)
+        if bounds is None:
+            return 0, None, None, counts
+        lo, hi = bounds["lo"], bounds["hi"]
+
+        width = (hi - lo) / bins
+        if width == 0:
+            bucket = 0
+        else:
+            # The maximum lands on the upper edge; keep it in the last bin. The clamp also
+            # absorbs prices written between the two aggregations that fall outside [lo, hi].
+            bucket = {"$max": [0, {"$min": [
+                bins - 1, {"$floor": {"$divide": [{"$subtract": ["$sale_price", lo]}, width]}}
+            ]}]}
+        pipeline = [
+            {"$match": query},
+            {"$group": {"_id": bucket, "count": {"$sum": 1}}}
+        ]
+        for row in products_collection.aggregate(pipeline, allowDiskUse=True):
+            counts[int(row["_id"])] = row["count"]
+        return sum(counts), lo, hi, counts
+
+    @staticmethod
+    def _search_filter_clauses(
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Build Atlas Search compound `filter` clauses equivalent to the $match filters.
+        Filters run inside $search so they narrow the candidate set without affecting score,
+        and $$SEARCH_META counts only documents that pass them.
+        """
+        def facet_clause(values: List[str], path: str) -> Dict[str, Any]:
+            # Frontend sends "dolce-gabbana" for "Dolce & Gabbana"; the standard analyzer
+            # drops the separators, so a phrase over the dash-split words matches every variant
+            return {
+                "compound": {
+                    "should": [
+                        {"phrase": {"query": value.replace("-", " "), "path": path}}
+                        for value in values
+                    ],
+                    "minimumShouldMatch": 1
+                }
+            }
+
+        # Image filter: product_image must exist and be an http(s) URL
+        clauses = [
+            {"exists": {"path": "product_image"}},
+            {"wildcard": {"query": "http*", "path": "product_image", "allowAnalyzedField": True}}
+        ]
+
+        if category and len(category) > 0:
+            clauses.append(facet_clause(category, "product_category"))
+
+        if brand and len(brand) > 0:
+            clauses.append(facet_clause(brand, "brand_name"))
+
+        if occasion and len(occasion) > 0:
+            clauses.append(facet_clause(occasion, "product_occasion"))
+
+        if gender:
+            clauses.append({"phrase": {"query": gender, "path": "product_gender"}})
+
+        # Price filter - filter by sale_price only
+        if price_min is not None or price_max is not None:
+            price_range = {"path": "sale_price"}
+            if price_min is not None:
+                price_range["gte"] = price_min
+            if price_max is not None:
+                price_range["lte"] = price_max
+            clauses.append({"range": price_range})
+
+        return clauses
+
     @staticmethod
     def search_products(
         query: str,
@@ -792,137 +939,122 @@ class ProductRepository:
         Search products using MongoDB Atlas Search with fuzzy matching.
         Searches across all text fields using wildcard path.
         """
-        from bson.regex import Regex
-        
-        # Build the aggregation pipeline
-        pipeline = []
-        
+        total, items, _ = ProductRepository.search_products_ranked(
+            query, limit, skip, 0, category, brand, occasion, price_min, price_max, gender
+        )
+        return total, items
+
+    @staticmethod
+    def search_products_ranked(
+        query: str,
+        limit: int = 20,
+        skip: int = 0,
+        id_window: int = 0,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """
+        Search products and return (total, page items, ranked ids).
+        Runs a single aggregation: filters are pushed into the compound `filter` clause of
+        $search and the exact total comes from $$SEARCH_META alongside the page.
+        When id_window > 0, the ids of the first `id_window` results (in relevance order)
+        are returned from the same round trip so callers can cache the ranking.
+        """
+        filter_clauses = ProductRepository._search_filter_clauses(
+            category, brand, occasion, price_min, price_max, gender
+        )
+
         # Step 1: $search stage - MongoDB Atlas Search
         search_stage = {
             "$search": {
                 "index": "default",  # The name of your search index
-                "text": {
-                    "query": query,
-                    "path": {"wildcard": "*"},  # Searches all fields
-                    "fuzzy": {}  # Allows for typos
-                }
+                "compound": {
+                    "must": [
+                        {
+                            "text": {
+                                "query": query,
+                                "path": {"wildcard": "*"},  # Searches all fields
+                                "fuzzy": {}  # Allows for typos
+                            }
+                        }
+                    ],
+                    "filter": filter_clauses
+                },
+                # Exact total for the filtered result set, exposed via $$SEARCH_META
+                "count": {"type": "total"}
             }
         }
-        pipeline.append(search_stage)
-        
-        # Step 2: Add filters if provided (using $match after search)
-        match_filters = {}
-        
-        # Add image filter first
-        match_filters.update(ProductRepository.IMAGE_FILTER)
-        
-        # Category filter
-        if category and len(category) > 0:
-            category_patterns = []
-            for cat in category:
-                pattern = cat.replace("-", "[-\\s&]+")
-                category_patterns.append(pattern)
-            category_regex_list = [Regex(pattern, "i") for pattern in category_patterns]
-            match_filters["product_category"] = {"$in": category_regex_list}
-        
-        # Brand filter
-        if brand and len(brand) > 0:
-            brand_patterns = []
-            for b in brand:
-                pattern = b.replace("-", "[-\\s&]+")
-                brand_patterns.append(pattern)
-            brand_regex_list = [Regex(pattern, "i") for pattern in brand_patterns]
-            match_filters["brand_name"] = {"$in": brand_regex_list}
-        
-        # Occasion filter
-        if occasion and len(occasion) > 0:
-            occasion_patterns = []
-            for occ in occasion:
-                pattern = occ.replace("-", "[-\\s&]+")
-                occasion_patterns.append(pattern)
-            occasion_regex_list = [Regex(pattern, "i") for pattern in occasion_patterns]
-            match_filters["product_occasion"] = {"$in": occasion_regex_list}
-        
-        # Gender filter
-        if gender:
-            match_filters["product_gender"] = Regex(gender, "i")
-        
-        # Price filter - filter by sale_price only
-        if price_min is not None or price_max is not None:
-            price_query = {}
-            if price_min is not None:
-                price_query["$gte"] = price_min
-            if price_max is not None:
-                price_query["$lte"] = price_max
-            match_filters["sale_price"] = price_query
-        
-        # Add $match stage if we have filters
-        if match_filters:
-            pipeline.append({"$match": match_filters})
-        
-        # Step 3: Add score for relevance ranking
-        pipeline.append({
-            "$addFields": {
-                "searchScore": {"$meta": "searchScore"}
-            }
-        })
-        
-        # Step 4: Sort by search score (most relevant first)
-        pipeline.append({
-            "$sort": {"searchScore": -1}
-        })
-        
-        # Step 5: Skip and limit for pagination
-        pipeline.append({"$skip": skip})
-        pipeline.append({"$limit": limit})
-        
-        # Step 6: Project fields and convert _id to id
-        pipeline.append({
-            "$project": {
-                "_id": 0,
-                "id": {"$toString": "$_id"},
-                "product_link": 1,
-                "product_image": 1,
-                "brand_name": 1,
-                "product_name": 1,
-                "product_description": 1,
-                "product_category": 1,
-                "product_sub_category": 1,
-                "product_gender": 1,
-                "product_color": 1,
-                "product_material": 1,
-                "product_occasion": 1,
-                "currency": 1,
-                "original_price": 1,
-                "sale_price": 1,
-                "discount": 1,
-                "search_tags": 1,
-                "available_sizes": 1,
-                "scraped_at": 1,
-                "searchScore": 1
+
+        # Step 2: Page through results (already ordered by relevance) and read the total
+        # from search metadata in the same round trip
+        pipeline = [
+            search_stage,
+            {
+                "$facet": {
+                    "items": [
+                        {"$skip": skip},
+                        {"$limit": limit},
+                        {
+                            "$project": {
+                                "_id": 0,
+                                "id": {"$toString": "$_id"},
+                                "product_link": 1,
+                                "product_image": 1,
+                                "brand_name": 1,
+                                "product_name": 1,
+                                "product_description": 1,
+                                "product_category": 1,
+                                "product_sub_category": 1,
+                                "product_gender": 1,
+                                "product_color": 1,
+                                "product_material": 1,
+                                "product_occasion": 1,
+                                "currency": 1,
+                                "original_price": 1,
+                                "sale_price": 1,
+                                "discount": 1,
+                                "search_tags": 1,
+                                "available_sizes": 1,
+                                "scraped_at": 1,
+                                "searchScore": {"$meta": "searchScore"}
+                            }
+                        }
+                    ],
+                    "meta": [
+                        {"$replaceWith": "$$SEARCH_META"},
+                        {"$limit": 1}
+                    ]
+                }
             }
-        })
-        
+        ]
+        if id_window > 0:
+            pipeline[1]["$facet"]["ids"] = [
+                {"$limit": id_window},
+                {"$project": {"_id": 1}}
+            ]
+
         # Execute the aggregation pipeline
         try:
-            # Get total count first using $facet to get both count and results
-            count_pipeline = pipeline[:-3]  # Remove skip, limit, and project stages
-            count_pipeline.append({"$count": "total"})
-            
-            # Execute count pipeline
-            count_result = list(products_collection.aggregate(count_pipeline))
-            total = count_result[0]["total"] if count_result else 0
-            
-            # Execute main pipeline to get results
-            items = list(products_collection.aggregate(pipeline))
-            
-            return total, items
+            result = list(products_collection.aggregate(pipeline))
+            facets = result[0] if result else {}
+
+            meta = facets.get("meta") or [{}]
+            total = meta[0].get("count", {}).get("total", 0)
+            items = facets.get("items", [])
+            ids = [str(doc["_id"]) for doc in facets.get("ids", [])]
+
+            return total, items, ids
         except Exception as e:
             # If search index doesn't exist or search fails, fall back to text search
-            print(f"Search index error: {e}. Falling back to text search.")
+            logger.warning("atlas search failed, falling back to text search", extra={"query": query, "error": str(e)})
             # Fallback to regex-based search
             return ProductRepository._fallback_text_search(
-                query, limit, skip, category, brand, occasion, price_min, price_max, gender
+                query, limit, skip, category, brand, occasion, price_min, price_max, gender,
+                id_window=id_window
             )
     
     @staticmethod
@@ -935,9 +1067,13 @@ class ProductRepository:
         occasion: Optional[List[str]] = None,
         price_min: Optional[float] = None,
         price_max: Optional[float] = None,
-        gender: Optional[str] = None
+        gender: Optional[str] = None,
+        id_window: int = 0
     ):
-        """Fallback text search using regex if Atlas Search is not available."""
+        """
+        Fallback text search using regex if Atlas Search is not available.
+        Returns (total, page items, ids of the first `id_window` matches).
+        """
         from bson.regex import Regex
         
         # Build query with text search
@@ -998,7 +1134,14 @@ class ProductRepository:
                 item["id"] = str(item["_id"])
                 del item["_id"]
         
-        return total, items
+        ids = []
+        if id_window > 0:
+            ids = [
+                str(doc["_id"])
+                for doc in products_collection.find(search_query, {"_id": 1}).limit(id_window)
+            ]
+        
+        return total, items, ids
     
     @staticmethod
     def get_search_suggestions(query: str, limit: int = 10):
@@ -1063,7 +1206,7 @@ class ProductRepository:
             return list(suggestions)[:limit]
         except Exception as e:
             # Fallback: return empty suggestions if search index not available
-            print(f"Search suggestions error: {e}")
+            logger.warning("search suggestions failed", extra={"query": query, "error": str(e)})
             return []
     
     @staticmethod
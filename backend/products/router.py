@@ -1,16 +1,25 @@
-from fastapi import APIRouter, HTTPException, Query
+import hmac
+
+from fastapi import APIRouter, Header, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from .service import ProductService
 from typing import List, Optional
+from core.profiling import ProfiledRoute
+from core.config import settings
+from .ingest import IngestResult, ingest_batch, parse_ndjson
+
+router = APIRouter(prefix="/api/products", tags=["Products"], route_class=ProfiledRoute)
 
-router = APIRouter(prefix="/api/products", tags=["Products"])
+def _json(items):
+    """Product records -> response dicts; records stay compact until here."""
+    return [item.to_dict() for item in items]
 
 @router.get("/top-deals")
 def get_top_deals(limit: int = 4, skip: int = 0):
     total, items= ProductService.get_top_deals(limit, skip)
-    print("api hit successfully")
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
@@ -18,12 +27,13 @@ def get_top_deals(limit: int = 4, skip: int = 0):
     }
 
 @router.get("/latest")
-def get_latest_products(limit: int = 100, skip: int = 0):
-    total, items = ProductService.get_latest_products(limit, skip)
+def get_latest_products(limit: int = 100, skip: int = 0, user_id: Optional[str] = None):
+    """Newest products; with user_id, reranked within small blocks by the user's bag/favourites."""
+    total, items = ProductService.get_latest_products(limit, skip, user_id)
     # print("Latest products fetched:", items)
     # print("Returning latest products with limit:", limit, "and skip:", skip)
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
@@ -31,10 +41,11 @@ def get_latest_products(limit: int = 100, skip: int = 0):
     }
 
 @router.get("/")
-def list_products(limit: int = 100, skip: int = 0):
-    total, items = ProductService.get_products(limit, skip)
+def list_products(limit: int = 100, skip: int = 0, user_id: Optional[str] = None):
+    """Products by price; with user_id, reranked within small blocks by the user's bag/favourites."""
+    total, items = ProductService.get_products(limit, skip, user_id)
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
@@ -46,7 +57,7 @@ def get_products_by_gender(gender: str, limit: int = 100, skip: int = 0):
     """Get products filtered by gender. Uses get_products with gender filtering applied in service layer."""
     total, items = ProductService.get_products_by_gender(gender, limit, skip)
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
@@ -84,13 +95,54 @@ def get_filtered_products(
         sort_by=sort_by
     )
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
         "has_more": (skip + limit) < total
     }
 
+@router.get("/filter/facet-counts")
+def get_facet_counts(
+    category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    occasion: Optional[List[str]] = Query(None),
+    price_min: Optional[float] = Query(None),
+    price_max: Optional[float] = Query(None),
+    gender: Optional[str] = Query(None)
+):
+    """Product counts per category/brand/occasion/gender value under the other active filters."""
+    total, counts = ProductService.get_facet_counts(
+        category=category,
+        brand=brand,
+        occasion=occasion,
+        price_min=price_min,
+        price_max=price_max,
+        gender=gender
+    )
+    return {"total": total, "counts": counts}
+
+@router.get("/filter/price-histogram")
+def get_price_histogram(
+    bins: int = Query(20, ge=1, le=200),
+    category: Optional[List[str]] = Query(None),
+    brand: Optional[List[str]] = Query(None),
+    occasion: Optional[List[str]] = Query(None),
+    price_min: Optional[float] = Query(None),
+    price_max: Optional[float] = Query(None),
+    gender: Optional[str] = Query(None)
+):
+    """Sale price histogram (equal-width bins) with min/max for the current filters, for a price slider."""
+    return ProductService.get_price_histogram(
+        bins=bins,
+        category=category,
+        brand=brand,
+        occasion=occasion,
+        price_min=price_min,
+        price_max=price_max,
+        gender=gender
+    )
+
 @router.get("/search")
 def search_products(
     q: str = Query(..., description="Search query string"),
@@ -122,7 +174,7 @@ def search_products(
         gender=gender
     )
     return {
-        "products": items,
+        "products": _json(items),
         "total": total,
         "limit": limit,
         "skip": skip,
@@ -159,7 +211,7 @@ def get_products_by_links(request: ProductLinksRequest):
     
     items = ProductService.get_products_by_links(request.product_links)
     return {
-        "products": items,
+        "products": _json(items),
         "total": len(items)
     }
 
@@ -184,7 +236,56 @@ def get_curated_products(request: CuratedRequest):
     
     items = ProductService.get_curated_products(request.brand_keyword_pairs)
     return {
-        "products": items,
+        "products": _json(items),
+        "total": len(items)
+    }
+
+async def _ndjson_lines(request: Request):
+    """Yield complete lines from a streamed request body."""
+    buffer = b""
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8", errors="replace")
+    if buffer:
+        yield buffer.decode("utf-8", errors="replace")
+
+@router.post("/ingest")
+async def ingest_products(request: Request, x_ingest_token: Optional[str] = Header(None)):
+    """
+    Bulk upsert products from an NDJSON body (one product per line), keyed on product_link.
+    Batches are normalized and written as they stream in; changes go to the product_changes log.
+    """
+    if not settings.INGEST_TOKEN or not hmac.compare_digest(
+        (x_ingest_token or "").encode("utf-8"), settings.INGEST_TOKEN.encode("utf-8")
+    ):
+        raise HTTPException(status_code=403, detail="Ingest is not allowed")
+
+    result = IngestResult()
+    batch = []
+    line_number = 0
+    async for line in _ndjson_lines(request):
+        line_number += 1
+        for row in parse_ndjson([line], result, start_line=line_number):
+            batch.append(row)
+        if len(batch) >= settings.INGEST_BATCH_SIZE:
+            result.merge(await run_in_threadpool(ingest_batch, batch))
+            batch = []
+    if batch:
+        result.merge(await run_in_threadpool(ingest_batch, batch))
+
+    return result.as_dict()
+
+@router.get("/{product_id}/similar")
+def get_similar_products(product_id: str, limit: int = Query(12, ge=1, le=50)):
+    """"You may also like": products closest in brand, category, color, material and price."""
+    items = ProductService.get_similar_products(product_id, limit)
+    if items is None:
+        # Not built yet on this worker, or a product that is not listed
+        items = []
+    return {
+        "products": _json(items),
         "total": len(items)
     }
 
@@ -193,4 +294,4 @@ def get_product(product_id: str):
     product = ProductService.get_product_by_id(product_id)
     if not product:
         raise HTTPException(404, "Product not found")
-    return product
\ No newline at end of file
+    return product.to_dict()
\ No newline at end of file
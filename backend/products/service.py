@@ -1,36 +1,129 @@
 from .repository import ProductRepository
-from .transformers import transform_product
+from .record import ProductRecord
+from .cache import EXCLUDED, product_cache, search_cache, search_cache_key
+from .snapshot import catalog_snapshot
+from .feeds import read_feed
+from .similar import similar_index
+from .personalize import AffinityStore, personalize_page
+from .normalize import filter_value
+from core.config import settings
+from core.metrics import registry
+from core.profiling import phase
+from core.signals import user_lists_changed
+from core.singleflight import SingleFlight
 from typing import List, Optional
 import random
 from core.constants.filter_constants import SORT_OPTIONS, PRICE_RANGES, FILTER_GROUP_TITLES
 from core.schemas.filter_schemas import FilterGroup, FilterOption, SortOption, FilterMetadataResponse
 
 
+search_requests = registry.counter(
+    "search_requests_total",
+    "Product searches by how they were served (hit: cached ranking, miss: ranked and cached, bypass: page beyond cached window)",
+    ["result"]
+)
+
+
+# Concurrent identical catalog requests share one in-flight database call
+_top_deals_flight = SingleFlight("top_deals")
+_latest_flight = SingleFlight("latest")
+_filtered_flight = SingleFlight("filtered_products")
+_filter_metadata_flight = SingleFlight("filter_metadata")
+_facet_counts_flight = SingleFlight("facet_counts")
+_price_histogram_flight = SingleFlight("price_histogram")
+
+
+def _as_key(values: Optional[List[str]]):
+    return tuple(values) if values else None
+
+
+def _transform(items) -> List[ProductRecord]:
+    """Turn repository rows into product records, dropping excluded products."""
+    with phase("transform"):
+        return [p for p in map(ProductRecord.from_product, items) if p]
+
+
+def _cache_products(items) -> List[ProductRecord]:
+    """_transform, also storing every row (excluded ones as EXCLUDED) in the product cache."""
+    with phase("transform"):
+        records = {item["id"]: ProductRecord.from_product(item) for item in items if item.get("id")}
+    product_cache.set_many({pid: record or EXCLUDED for pid, record in records.items()})
+    return [record for record in records.values() if record]
+
+
 class ProductService:
 
     @staticmethod
     def get_top_deals(limit: int, skip: int = 0):
-        total, items = ProductRepository.get_top_deals(limit, skip)
-        transformed = [p for p in map(transform_product, items)if p]
+        return _top_deals_flight.do((limit, skip), ProductService._load_top_deals, limit, skip)
+
+    @staticmethod
+    def _load_top_deals(limit: int, skip: int):
+        if catalog_snapshot.ready:
+            with phase("snapshot"):
+                total, items = catalog_snapshot.top_deals(limit, skip)
+                items = ProductRepository.prepare_top_deal_items(items)
+            return total, _transform(items)
+
+        feed = ProductService._read_feed("top_deals", limit, skip)
+        if feed is not None:
+            total, items = feed
+            items = ProductRepository.prepare_top_deal_items(items)
+        else:
+            with phase("repository"):
+                total, items = ProductRepository.get_top_deals(limit, skip)
+        transformed = _transform(items)
         return total, transformed
 
     @staticmethod
-    def get_products(limit: int, skip: int):
-        total, items = ProductRepository.get_products(limit, skip)
-        transformed = [p for p in map(transform_product, items) if p]
+    def _read_feed(name: str, limit: int, skip: int):
+        """(total, products) for a page of a materialized feed, or None to use the live query."""
+        if not settings.FEEDS_ENABLED:
+            return None
+        with phase("feed"):
+            feed = read_feed(name, limit, skip)
+        if feed is None:
+            return None
+        total, product_ids = feed
+        with phase("repository"):
+            items = ProductRepository.get_products_by_ids(product_ids)
+        return total, items
+
+    @staticmethod
+    def get_products(limit: int, skip: int, user_id: Optional[str] = None):
+        if user_id and settings.PERSONALIZE_ENABLED:
+            return personalize_page(affinities, user_id, limit, skip, ProductService.get_products)
+        with phase("repository"):
+            total, items = ProductRepository.get_products(limit, skip)
+        transformed = _transform(items)
         return total, transformed
 
     @staticmethod
     def get_product_by_id(product_id: str):
-        product = ProductRepository.get_product_by_id(product_id)
-        return transform_product(product) if product else None
+        with phase("repository"):
+            product = ProductRepository.get_product_by_id(product_id)
+        return ProductRecord.from_product(product) if product else None
+
+    @staticmethod
+    def get_latest_products(limit: int, skip: int, user_id: Optional[str] = None):
+        if user_id and settings.PERSONALIZE_ENABLED:
+            return personalize_page(affinities, user_id, limit, skip, ProductService.get_latest_products)
+        return _latest_flight.do((limit, skip), ProductService._load_latest_products, limit, skip)
 
     @staticmethod
-    def get_latest_products(limit: int, skip: int):
-        # print("Getting latest products with limit:", limit, "and skip:", skip)
-        total, items = ProductRepository.get_latest_products(limit, skip)
-        transformed = [p for p in map(transform_product, items) if p]
-        # print(transformed, total)
+    def _load_latest_products(limit: int, skip: int):
+        if catalog_snapshot.ready:
+            with phase("snapshot"):
+                total, items = catalog_snapshot.latest(limit, skip)
+            return total, _transform(items)
+
+        feed = ProductService._read_feed("latest", limit, skip)
+        if feed is not None:
+            total, items = feed
+        else:
+            with phase("repository"):
+                total, items = ProductRepository.get_latest_products(limit, skip)
+        transformed = _transform(items)
         return total, transformed
 
     @staticmethod
@@ -41,6 +134,12 @@ class ProductService:
         Only matches exact gender (no unisex or unknown).
         """
         import re
+
+        if catalog_snapshot.ready:
+            # Exact gender match over the whole catalog, so the total is exact too
+            with phase("snapshot"):
+                total, items = catalog_snapshot.listing(limit, skip, gender=gender)
+            return total, _transform(items)
         
         # Fetch a larger batch to account for filtering
         # Fetch 5x the requested limit to ensure we have enough after filtering
@@ -56,7 +155,8 @@ class ProductService:
         
         # Keep fetching until we have enough filtered items
         while len(all_filtered_items) < skip + limit:
-            _, items = ProductRepository.get_products(fetch_limit, fetch_skip)
+            with phase("repository"):
+                _, items = ProductRepository.get_products(fetch_limit, fetch_skip)
             
             if not items:
                 break  # No more items available
@@ -87,13 +187,18 @@ class ProductService:
         else:
             estimated_total = len(all_filtered_items)
         
-        transformed = [p for p in map(transform_product, paginated_items) if p]
+        transformed = _transform(paginated_items)
         return estimated_total, transformed
 
     @staticmethod
     def get_filter_metadata():
         """Get filter metadata including categories, brands, occasions with counts."""
-        metadata = ProductRepository.get_filter_metadata()
+        return _filter_metadata_flight.do(None, ProductService._load_filter_metadata)
+
+    @staticmethod
+    def _load_filter_metadata():
+        with phase("repository"):
+            metadata = ProductRepository.get_filter_metadata()
         
         def normalize_and_deduplicate(items, field_name="_id"):
             """Normalize to lowercase, deduplicate, and aggregate counts."""
@@ -125,7 +230,7 @@ class ProductService:
         category_options = [
             FilterOption(
                 label=cat["normalized"],  # Send lowercase
-                value=cat["normalized"].replace(" ", "-").replace("&", "-"),
+                value=filter_value(cat["normalized"]),
                 count=cat["count"]
             )
             for cat in normalized_categories
@@ -136,7 +241,7 @@ class ProductService:
         brand_options = [
             FilterOption(
                 label=brand["normalized"],  # Send lowercase
-                value=brand["normalized"].replace(" ", "-").replace("&", "-"),
+                value=filter_value(brand["normalized"]),
                 count=brand["count"]
             )
             for brand in normalized_brands
@@ -147,7 +252,7 @@ class ProductService:
         occasion_options = [
             FilterOption(
                 label=occasion["normalized"],  # Send lowercase
-                value=occasion["normalized"].replace(" ", "-").replace("&", "-"),
+                value=filter_value(occasion["normalized"]),
                 count=occasion["count"]
             )
             for occasion in normalized_occasions
@@ -211,21 +316,147 @@ class ProductService:
         sort_by: Optional[str] = None
     ):
         """Get filtered products. Sorting is handled on the backend."""
-        total, items = ProductRepository.get_filtered_products(
-            limit=limit,
-            skip=skip,
-            category=category,
-            brand=brand,
-            occasion=occasion,
-            price_min=price_min,
-            price_max=price_max,
-            gender=gender,
-            sort_by=sort_by
+        key = (
+            limit, skip, _as_key(category), _as_key(brand), _as_key(occasion),
+            price_min, price_max, gender, sort_by
         )
+        return _filtered_flight.do(
+            key,
+            ProductService._load_filtered_products,
+            limit, skip, category, brand, occasion, price_min, price_max, gender, sort_by
+        )
+
+    @staticmethod
+    def _load_filtered_products(
+        limit: int,
+        skip: int,
+        category: Optional[List[str]],
+        brand: Optional[List[str]],
+        occasion: Optional[List[str]],
+        price_min: Optional[float],
+        price_max: Optional[float],
+        gender: Optional[str],
+        sort_by: Optional[str]
+    ):
+        if catalog_snapshot.ready:
+            with phase("snapshot"):
+                total, items = catalog_snapshot.filtered(
+                    limit, skip, category, brand, occasion, price_min, price_max, gender, sort_by
+                )
+            return total, _transform(items)
+
+        with phase("repository"):
+            total, items = ProductRepository.get_filtered_products(
+                limit=limit,
+                skip=skip,
+                category=category,
+                brand=brand,
+                occasion=occasion,
+                price_min=price_min,
+                price_max=price_max,
+                gender=gender,
+                sort_by=sort_by
+            )
         
-        transformed = [p for p in map(transform_product, items) if p]
+        transformed = _transform(items)
         return total, transformed
 
+    @staticmethod
+    def get_facet_counts(
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """Filter-panel counts per facet value for the current selection, keyed by filter value."""
+        key = (_as_key(category), _as_key(brand), _as_key(occasion), price_min, price_max, gender)
+        return _facet_counts_flight.do(
+            key,
+            ProductService._load_facet_counts,
+            category, brand, occasion, price_min, price_max, gender
+        )
+
+    @staticmethod
+    def _load_facet_counts(
+        category: Optional[List[str]],
+        brand: Optional[List[str]],
+        occasion: Optional[List[str]],
+        price_min: Optional[float],
+        price_max: Optional[float],
+        gender: Optional[str]
+    ):
+        if catalog_snapshot.ready:
+            with phase("snapshot"):
+                return catalog_snapshot.facet_counts(category, brand, occasion, price_min, price_max, gender)
+
+        with phase("repository"):
+            total, groups = ProductRepository.get_facet_counts(
+                category, brand, occasion, price_min, price_max, gender
+            )
+        counts = {}
+        for name, items in groups.items():
+            merged = {}
+            for item in items:
+                value = filter_value(item.get("_id"))
+                if value:
+                    merged[value] = merged.get(value, 0) + item.get("count", 0)
+            counts[name] = dict(sorted(merged.items(), key=lambda entry: entry[1], reverse=True))
+        return total, counts
+
+    @staticmethod
+    def get_price_histogram(
+        bins: int,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """Equal-width sale price histogram and min/max for the current filter set."""
+        key = (bins, _as_key(category), _as_key(brand), _as_key(occasion), price_min, price_max, gender)
+        return _price_histogram_flight.do(
+            key,
+            ProductService._load_price_histogram,
+            bins, category, brand, occasion, price_min, price_max, gender
+        )
+
+    @staticmethod
+    def _load_price_histogram(
+        bins: int,
+        category: Optional[List[str]],
+        brand: Optional[List[str]],
+        occasion: Optional[List[str]],
+        price_min: Optional[float],
+        price_max: Optional[float],
+        gender: Optional[str]
+    ):
+        if catalog_snapshot.ready:
+            with phase("snapshot"):
+                total, lo, hi, counts = catalog_snapshot.price_histogram(
+                    bins, category, brand, occasion, price_min, price_max, gender
+                )
+        else:
+            with phase("repository"):
+                total, lo, hi, counts = ProductRepository.get_price_histogram(
+                    bins, category, brand, occasion, price_min, price_max, gender
+                )
+
+        histogram = []
+        if total:
+            width = (hi - lo) / bins
+            histogram = [
+                {
+                    "min": round(lo + width * i, 2),
+                    "max": round(hi if i == bins - 1 else lo + width * (i + 1), 2),
+                    "count": count
+                }
+                for i, count in enumerate(counts)
+            ]
+        return {"total": total, "min": lo, "max": hi, "bins": histogram}
+
     @staticmethod
     def search_products(
         query: str,
@@ -238,20 +469,75 @@ class ProductService:
         price_max: Optional[float] = None,
         gender: Optional[str] = None
     ):
-        """Search products using MongoDB Atlas Search."""
-        total, items = ProductRepository.search_products(
-            query=query,
-            limit=limit,
-            skip=skip,
-            category=category,
-            brand=brand,
-            occasion=occasion,
-            price_min=price_min,
-            price_max=price_max,
-            gender=gender
-        )
-        transformed = [p for p in map(transform_product, items) if p]
-        return total, transformed
+        """
+        Search products using MongoDB Atlas Search.
+        Rankings are cached per normalized query + filter set; pages within the cached
+        window are sliced from the ranked id list and hydrated from the product cache.
+        """
+        key = search_cache_key(query, category, brand, occasion, price_min, price_max, gender)
+        cached = search_cache.get(key)
+
+        if cached is not None:
+            total, ranked_ids = cached
+            # A cached ranking can serve any page inside its window, or any page at all
+            # when the window already holds every match
+            if skip + limit <= len(ranked_ids) or len(ranked_ids) >= total:
+                search_requests.inc(result="hit")
+                return total, ProductService._hydrate(ranked_ids[skip:skip + limit])
+
+            search_requests.inc(result="bypass")
+            with phase("repository"):
+                total, items = ProductRepository.search_products(
+                    query=query,
+                    limit=limit,
+                    skip=skip,
+                    category=category,
+                    brand=brand,
+                    occasion=occasion,
+                    price_min=price_min,
+                    price_max=price_max,
+                    gender=gender
+                )
+        else:
+            search_requests.inc(result="miss")
+            with phase("repository"):
+                total, items, ranked_ids = ProductRepository.search_products_ranked(
+                    query=query,
+                    limit=limit,
+                    skip=skip,
+                    id_window=settings.SEARCH_CACHE_WINDOW,
+                    category=category,
+                    brand=brand,
+                    occasion=occasion,
+                    price_min=price_min,
+                    price_max=price_max,
+                    gender=gender
+                )
+            search_cache.set(key, (total, ranked_ids))
+
+        return total, _cache_products(items)
+
+    @staticmethod
+    def _hydrate(product_ids: List[str]) -> List[ProductRecord]:
+        """Product records in the given order, reading through the product cache."""
+        cached = product_cache.get_many(product_ids)
+        missing = [pid for pid in product_ids if pid not in cached]
+        if missing:
+            with phase("repository"):
+                fetched = ProductRepository.get_products_by_ids(missing)
+            _cache_products(fetched)
+            cached.update(product_cache.get_many(missing))
+        return [cached[pid] for pid in product_ids if cached.get(pid, EXCLUDED) is not EXCLUDED]
+
+    @staticmethod
+    def get_similar_products(product_id: str, limit: int) -> Optional[List[ProductRecord]]:
+        """Most similar listable products, from the in-memory index; None if the product is not indexed."""
+        with phase("similar"):
+            # Over-fetch a little: products unlisted since the last patch are dropped by _hydrate
+            product_ids = similar_index.similar(product_id, limit + 4)
+        if product_ids is None:
+            return None
+        return ProductService._hydrate(product_ids)[:limit]
 
     @staticmethod
     def get_search_suggestions(query: str, limit: int = 10):
@@ -261,8 +547,9 @@ class ProductService:
     @staticmethod
     def get_products_by_links(product_links: List[str]):
         """Get products by product_link values, preserving order."""
-        items = ProductRepository.get_products_by_links(product_links)
-        transformed = [p for p in map(transform_product, items) if p]
+        with phase("repository"):
+            items = ProductRepository.get_products_by_links(product_links)
+        transformed = _transform(items)
         return transformed
 
     @staticmethod
@@ -291,6 +578,11 @@ class ProductService:
                     "keyword": getattr(pair, 'keyword', '')
                 })
         
-        items = ProductRepository.get_curated_products(pairs_as_dicts)
-        transformed = [p for p in map(transform_product, items) if p]
-        return transformed
\ No newline at end of file
+        with phase("repository"):
+            items = ProductRepository.get_curated_products(pairs_as_dicts)
+        transformed = _transform(items)
+        return transformed
+
+
+affinities = AffinityStore(ProductService._hydrate)
+user_lists_changed.connect(affinities.invalidate)
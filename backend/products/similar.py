@@ -0,0 +1,362 @@
+"""
+In-memory "you may also like" index for /api/products/{product_id}/similar.
+
+Each listable product with valid dual pricing (what ProductService serves) becomes an
+L2-normalized vector of hashed, TF-IDF weighted features: brand, category,
+sub-category, gender, colors, material words and a price band (log-spaced, with half
+weight on the neighbouring bands so nearby prices still overlap). Features are hashed with a signed crc32 into SIMILAR_DIM columns, so the
+vocabulary never has to be stored. A query is one float32 mat-vec (cosine similarity
+against every product) plus argpartition top-k.
+
+The index is built from Mongo (or loaded from SIMILAR_INDEX_PATH, written by
+`python -m products.similar`). Product changes from the invalidation bus are
+re-vectorized with the stored IDF weights and patched in copy-on-write; IDF is
+recomputed by a full rebuild every SIMILAR_REBUILD_SECONDS, which also picks up
+changes made while no worker was running.
+"""
+import argparse
+import math
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from bson import ObjectId
+
+from core.config import settings
+from core.database import products_collection
+from core.log import get_logger
+from core.metrics import registry
+from .invalidation import CatalogReset, ProductDeleted, ProductUpserted, bus
+from .normalize import canonical_colors, filter_value, parse_price
+from .repository import ProductRepository
+from .snapshot import is_listable
+from .transformers import has_valid_dual_price
+from .snapshot_file import read_snapshot, write_snapshot
+
+
+logger = get_logger("products.similar")
+
+similar_index_rows = registry.gauge("similar_index_rows", "Live products in the similar-products index")
+similar_build_seconds = registry.histogram(
+    "similar_build_seconds",
+    "Time to build or patch the similar-products index",
+    ["kind"]
+)
+
+FEATURE_FIELDS = {
+    "brand_name": 1, "product_category": 1, "product_sub_category": 1, "product_gender": 1,
+    "product_color": 1, "product_material": 1, "sale_price": 1, "original_price": 1, "product_image": 1,
+}
+# Relative importance of each feature group before IDF
+WEIGHTS = {
+    "brand": 1.0,
+    "category": 1.5,
+    "sub": 2.0,
+    "gender": 2.0,
+    "color": 0.75,
+    "material": 0.75,
+    "price": 1.0,
+}
+# Price bands grow by this factor
+_BAND_BASE = math.log(1.5)
+_PATCH_BATCH = 1000
+
+
+def _indexable(doc: Dict[str, Any]) -> bool:
+    """Listable and with the dual pricing ProductService needs to serve it."""
+    return is_listable(doc) and has_valid_dual_price(doc)
+
+
+def _values(value: Any) -> List[str]:
+    if isinstance(value, (list, tuple)):
+        return [v for v in (filter_value(item) for item in value) if v]
+    normalized = filter_value(value)
+    return [normalized] if normalized else []
+
+
+def features(doc: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """(token, weight) pairs describing a product, before IDF."""
+    tokens = []
+    for group, field in (("brand", "brand_name"), ("category", "product_category"),
+                         ("sub", "product_sub_category"), ("gender", "product_gender")):
+        tokens.extend((f"{group}={value}", WEIGHTS[group]) for value in _values(doc.get(field)))
+
+    colors = [value for value in (filter_value(color) for color in canonical_colors(doc.get("product_color"))) if value]
+    for value in colors:
+        tokens.append((f"color={value}", WEIGHTS["color"] / math.sqrt(len(colors))))
+
+    material = doc.get("product_material")
+    words = sorted({w for w in (filter_value(material) or "").split("-") if len(w) > 2}) if isinstance(material, str) else []
+    for word in words:
+        tokens.append((f"material={word}", WEIGHTS["material"] / math.sqrt(len(words))))
+
+    price = parse_price(doc.get("sale_price"))
+    if price is not None and price > 0:
+        band = int(math.log(price) // _BAND_BASE)
+        tokens.append((f"price={band}", WEIGHTS["price"]))
+        tokens.append((f"price={band - 1}", WEIGHTS["price"] / 2))
+        tokens.append((f"price={band + 1}", WEIGHTS["price"] / 2))
+    return tokens
+
+
+class _Hasher:
+    """Token -> (column, sign), stable across processes (unlike hash())."""
+
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._memo: Dict[str, Tuple[int, float]] = {}
+
+    def __call__(self, token: str) -> Tuple[int, float]:
+        slot = self._memo.get(token)
+        if slot is None:
+            h = zlib.crc32(token.encode("utf-8"))
+            slot = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+            self._memo[token] = slot
+        return slot
+
+
+def _idf(token_lists: Iterable[List[Tuple[str, float]]], rows: int) -> Dict[str, float]:
+    df: Dict[str, int] = {}
+    for tokens in token_lists:
+        for token in {token for token, _ in tokens}:
+            df[token] = df.get(token, 0) + 1
+    return {token: math.log((1 + rows) / (1 + count)) + 1.0 for token, count in df.items()}
+
+
+def _vectorize(token_lists: List[List[Tuple[str, float]]], idf: Dict[str, float], hasher: _Hasher) -> np.ndarray:
+    default_idf = max(idf.values(), default=1.0)
+    rows, cols, vals = [], [], []
+    for row, tokens in enumerate(token_lists):
+        for token, weight in tokens:
+            col, sign = hasher(token)
+            rows.append(row)
+            cols.append(col)
+            vals.append(sign * weight * idf.get(token, default_idf))
+    vectors = np.zeros((len(token_lists), hasher.dim), dtype=np.float32)
+    np.add.at(vectors, (np.asarray(rows, dtype=np.int64), np.asarray(cols, dtype=np.int64)), np.asarray(vals, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+class _Version:
+    """One immutable version of the index."""
+
+    def __init__(self, ids: np.ndarray, vectors: np.ndarray, live: np.ndarray):
+        self.ids = ids
+        self.vectors = vectors
+        self.live = live
+        self._offsets: Optional[Dict[str, int]] = None
+        self._lock = threading.Lock()
+
+    def offset_of(self) -> Dict[str, int]:
+        if self._offsets is None:
+            with self._lock:
+                if self._offsets is None:
+                    self._offsets = {row.tobytes().hex(): offset for offset, row in enumerate(self.ids)}
+        return self._offsets
+
+
+class SimilarIndex:
+    def __init__(self, dim: int):
+        self.dim = dim
+        self._hasher = _Hasher(dim)
+        self._version: Optional[_Version] = None
+        self._idf: Dict[str, float] = {}
+        self._built_at = 0.0
+        self._write_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self._version is not None
+
+    @property
+    def age(self) -> float:
+        return time.time() - self._built_at
+
+    def _publish(self, version: _Version):
+        self._version = version
+        similar_index_rows.set(int(version.live.sum()))
+
+    def build(self):
+        """Full rebuild from Mongo, recomputing IDF."""
+        started = time.perf_counter()
+        ids, token_lists = [], []
+        query = dict(ProductRepository.IMAGE_FILTER)
+        for doc in products_collection.find(query, FEATURE_FIELDS).batch_size(5000):
+            if not has_valid_dual_price(doc):
+                continue
+            ids.append(doc["_id"].binary)
+            token_lists.append(features(doc))
+        idf = _idf(token_lists, len(token_lists))
+        vectors = _vectorize(token_lists, idf, self._hasher)
+        id_array = np.frombuffer(b"".join(ids), dtype=np.uint8).reshape(-1, 12) if ids else np.zeros((0, 12), dtype=np.uint8)
+        with self._write_lock:
+            self._idf = idf
+            self._built_at = time.time()
+            self._publish(_Version(id_array, vectors, np.ones(len(ids), dtype=bool)))
+        similar_build_seconds.observe(time.perf_counter() - started, kind="build")
+        logger.info("similar index built", extra={"rows": len(ids), "seconds": round(time.perf_counter() - started, 2)})
+
+    def apply(self, product_ids: List[str]):
+        """
+        Re-vectorize changed products (deleted or unlisted ones are dropped) with the
+        current IDF. Products are read in batches, but the vectors are copied once per call.
+        """
+        object_ids = [ObjectId(pid) for pid in product_ids if ObjectId.is_valid(pid)]
+        if not object_ids or self._version is None:
+            return
+        started = time.perf_counter()
+        docs = {}
+        for start in range(0, len(object_ids), _PATCH_BATCH):
+            for doc in products_collection.find({"_id": {"$in": object_ids[start:start + _PATCH_BATCH]}}, FEATURE_FIELDS):
+                docs[str(doc["_id"])] = doc
+        with self._write_lock:
+            version = self._version
+            offsets = version.offset_of()
+            updates: List[Tuple[int, List[Tuple[str, float]]]] = []
+            dropped: List[int] = []
+            appended_ids: List[bytes] = []
+            appended: List[List[Tuple[str, float]]] = []
+            for pid in {str(oid) for oid in object_ids}:
+                doc = docs.get(pid)
+                offset = offsets.get(pid)
+                if doc is None or not _indexable(doc):
+                    if offset is not None:
+                        dropped.append(offset)
+                elif offset is not None:
+                    updates.append((offset, features(doc)))
+                else:
+                    appended_ids.append(doc["_id"].binary)
+                    appended.append(features(doc))
+
+            if not (updates or dropped or appended):
+                return
+            vectors = version.vectors.copy()
+            live = version.live.copy()
+            if updates:
+                rows = [offset for offset, _ in updates]
+                vectors[rows] = _vectorize([tokens for _, tokens in updates], self._idf, self._hasher)
+                live[rows] = True
+            live[dropped] = False
+            ids = version.ids
+            if appended:
+                ids = np.vstack([ids, np.frombuffer(b"".join(appended_ids), dtype=np.uint8).reshape(-1, 12)])
+                vectors = np.vstack([vectors, _vectorize(appended, self._idf, self._hasher)])
+                live = np.concatenate([live, np.ones(len(appended), dtype=bool)])
+            self._publish(_Version(ids, vectors, live))
+        similar_build_seconds.observe(time.perf_counter() - started, kind="patch")
+
+    def similar(self, product_id: str, limit: int) -> Optional[List[str]]:
+        """
+        Ids of the `limit` most similar listable products, best first. None when the
+        index is not built yet or does not contain `product_id`.
+        """
+        version = self._version
+        if version is None:
+            return None
+        offset = version.offset_of().get(product_id)
+        if offset is None or not version.live[offset]:
+            return None
+        scores = version.vectors @ version.vectors[offset]
+        scores[~version.live] = -np.inf
+        scores[offset] = -np.inf
+        k = min(limit, len(scores) - 1)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        top = top[scores[top] > 0]
+        return [version.ids[i].tobytes().hex() for i in top]
+
+    def save(self, path: str):
+        version = self._version
+        if version is None:
+            return
+        meta = {"saved_at": self._built_at, "dim": self.dim, "idf": self._idf}
+        write_snapshot(path, {"ids": version.ids, "vectors": version.vectors, "live": version.live}, {}, meta)
+
+    def load(self, path: str) -> bool:
+        """Map an index written by save(). Returns False when there is no usable file."""
+        if not os.path.exists(path):
+            return False
+        arrays, _, meta = read_snapshot(path, {})
+        if meta["dim"] != self.dim:
+            logger.warning("similar index file has another dimension, rebuilding", extra={"path": path})
+            return False
+        with self._write_lock:
+            self._idf = meta["idf"]
+            self._built_at = meta["saved_at"]
+            self._publish(_Version(arrays["ids"], arrays["vectors"], arrays["live"]))
+        return True
+
+
+similar_index = SimilarIndex(settings.SIMILAR_DIM)
+
+
+class _ChangeQueue:
+    def __init__(self):
+        self.pending: Set[str] = set()
+        self.reset = False
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+
+    def on_events(self, events):
+        with self.lock:
+            for event in events:
+                if isinstance(event, (ProductUpserted, ProductDeleted)):
+                    self.pending.add(event.product_id)
+                elif isinstance(event, CatalogReset):
+                    self.reset = True
+        self.wake.set()
+
+    def take(self) -> Tuple[List[str], bool]:
+        with self.lock:
+            pending, reset = list(self.pending), self.reset
+            self.pending, self.reset = set(), False
+        return pending, reset
+
+
+def start_background_refresh():
+    """Load or build the index, then patch in product changes and rebuild it periodically."""
+    changes = _ChangeQueue()
+    bus.subscribe("similar", changes.on_events)
+    path = settings.SIMILAR_INDEX_PATH
+
+    def run():
+        try:
+            if not (path and similar_index.load(path)):
+                similar_index.build()
+        except Exception:
+            logger.exception("similar index build failed")
+        while True:
+            changes.wake.wait(settings.SIMILAR_REBUILD_SECONDS)
+            changes.wake.clear()
+            try:
+                product_ids, reset = changes.take()
+                if reset or not similar_index.ready or similar_index.age >= settings.SIMILAR_REBUILD_SECONDS:
+                    similar_index.build()
+                else:
+                    similar_index.apply(product_ids)
+            except Exception:
+                logger.exception("similar index refresh failed")
+            # Coalesce bursts of changes into one copy of the vectors
+            time.sleep(settings.SIMILAR_PATCH_SECONDS)
+
+    threading.Thread(target=run, name="similar-index", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the similar-products index file workers load at startup.")
+    parser.add_argument("--path", default=settings.SIMILAR_INDEX_PATH or "similar.index")
+    args = parser.parse_args()
+
+    similar_index.build()
+    similar_index.save(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,845 @@
+"""
+Read-only, in-process columnar snapshot of listable products.
+
+Each worker keeps the products that pass ProductRepository.IMAGE_FILTER as numpy
+columns (prices, discount, scrape time, ObjectId order) plus dictionary-encoded
+brand/category/gender/occasion codes and an id -> offset map. /top-deals, /latest,
+/gender/{gender} and /filter/products are then answered with vectorized masks and
+argpartition top-k instead of a Mongo round trip; the row documents needed for the
+response are kept alongside, projected to the fields transform_product reads.
+
+Facet filters keep the repository's regex semantics: each pattern is matched once
+against the (small) set of distinct values, and /filter requests are then answered
+from the bitmap index in products/bitmap.py built for every published version.
+
+The snapshot is refreshed incrementally: rows whose scraped_at is past the watermark
+and products named in the ingest change log (product_changes) are re-read and patched
+in. Columns are copy-on-write, so readers always see one consistent version.
+"""
+import argparse
+import fcntl
+import math
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import bson
+import numpy as np
+from bson import ObjectId
+
+from core.cache import TTLCache
+from core.config import settings
+from core.database import product_changes_collection, products_collection
+from core.log import get_logger
+from core.metrics import registry
+from .bitmap import Bitmap, FacetBitmapIndex, intersect
+from .invalidation import CatalogReset, ProductDeleted, ProductUpserted, bus
+from .repository import ProductRepository
+from .snapshot_file import Arena, read_snapshot, write_snapshot
+
+
+logger = get_logger("products.snapshot")
+
+snapshot_rows = registry.gauge("catalog_snapshot_rows", "Live rows in the in-process catalog snapshot")
+snapshot_refresh_seconds = registry.histogram(
+    "catalog_snapshot_refresh_seconds",
+    "Time to build or incrementally refresh the catalog snapshot",
+    ["kind"]
+)
+snapshot_queries = registry.counter(
+    "catalog_snapshot_queries_total",
+    "Catalog queries answered from the in-process snapshot",
+    ["query"]
+)
+
+# Fields kept per row: everything transform_product and the top-deals validation read
+SNAPSHOT_FIELDS = [
+    "product_link", "product_image", "brand_name", "product_name", "product_description",
+    "product_category", "product_sub_category", "product_gender", "product_color",
+    "product_material", "product_occasion", "currency", "original_price", "sale_price",
+    "discount", "disc_pct", "discount_value", "search_tags", "available_sizes",
+    "wishlist_state", "scraped_at",
+]
+SNAPSHOT_PROJECTION = {field: 1 for field in SNAPSHOT_FIELDS}
+
+FACETS = ("brand_name", "product_category", "product_gender", "product_occasion")
+# /filter query parameter -> facet field
+FILTER_FACETS = {
+    "category": "product_category",
+    "brand": "brand_name",
+    "occasion": "product_occasion",
+    "gender": "product_gender",
+}
+
+# Rebuild (rather than patch) once this fraction of rows are tombstones
+_COMPACT_RATIO = 0.2
+# Filter values come from requests, so pattern lookup tables are kept in a bounded LRU
+_LUT_CACHE_SIZE = 256
+_LUT_CACHE_TTL = 3600
+
+_IMAGE_PATTERN = re.compile(r"^http")
+_EXCLUDED_PATTERNS = [re.compile(keyword, re.IGNORECASE) for keyword in ProductRepository.LISTING_EXCLUDED_KEYWORDS]
+
+
+def _number(value) -> float:
+    """Numeric BSON values only, mirroring Mongo comparisons (strings never match a range)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def _timestamp(value) -> float:
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            return -math.inf
+    return -math.inf
+
+
+def _oid_order(oid: ObjectId) -> int:
+    """Timestamp + counter part of an ObjectId: insertion order within an int64."""
+    binary = oid.binary
+    return (int.from_bytes(binary[:4], "big") << 24) | int.from_bytes(binary[9:12], "big")
+
+
+def is_listable(doc: Dict[str, Any]) -> bool:
+    """Python equivalent of ProductRepository.IMAGE_FILTER."""
+    image = doc.get("product_image")
+    return isinstance(image, str) and image != "" and bool(_IMAGE_PATTERN.match(image))
+
+
+def _is_excluded(doc: Dict[str, Any]) -> bool:
+    """Python equivalent of the keyword $nor in ProductRepository.get_products."""
+    for field in ("product_name", "product_description"):
+        value = doc.get(field)
+        if isinstance(value, str) and any(p.search(value) for p in _EXCLUDED_PATTERNS):
+            return True
+    return False
+
+
+def facet_pattern(value: str) -> str:
+    """Frontend facet value ("dolce-gabbana") -> the repository's regex ("dolce[-\\s&]+gabbana")."""
+    return value.replace("-", "[-\\s&]+")
+
+
+class _Dictionary:
+    """Append-only string dictionary; code 0 is reserved for missing values."""
+
+    def __init__(self):
+        self.values: List[Optional[str]] = [None]
+        self._codes: Dict[str, int] = {}
+
+    def encode(self, value) -> int:
+        if not isinstance(value, str):
+            return 0
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def code_of(self, value: str) -> Optional[int]:
+        return self._codes.get(value)
+
+    @classmethod
+    def from_values(cls, values: List[Optional[str]]) -> "_Dictionary":
+        dictionary = cls()
+        dictionary.values = list(values)
+        dictionary._codes = {value: code for code, value in enumerate(values) if value is not None}
+        return dictionary
+
+
+def _patched(values, updates: List[Tuple[int, Any]], appended: List[Any]):
+    """Copy of a per-row list (or mapped Arena) with rows replaced and appended."""
+    if isinstance(values, Arena):
+        return values.patched(updates, appended)
+    values = list(values)
+    for offset, value in updates:
+        values[offset] = value
+    return values + appended
+
+
+class _Columns:
+    """
+    One immutable version of the snapshot. Arrays may be read-only views of a mapped
+    snapshot file, and `docs` and `names` lazily decoded Arenas.
+    """
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        docs: Sequence[Dict[str, Any]],
+        names: Sequence[str],
+        live: np.ndarray,
+        sale: np.ndarray,
+        original: np.ndarray,
+        scraped: np.ndarray,
+        oid: np.ndarray,
+        excluded: np.ndarray,
+        codes: Dict[str, np.ndarray],
+        dictionaries: Dict[str, List[Optional[str]]],
+        name_rank: Optional[np.ndarray] = None,
+    ):
+        # ObjectId bytes, one (12,) uint8 row per product
+        self.ids = ids
+        self.docs = docs
+        self.names = names
+        self.live = live
+        self.sale = sale
+        self.original = original
+        self.scraped = scraped
+        self.oid = oid
+        self.excluded = excluded
+        self.codes = codes
+
+        # Derived columns, computed once per version
+        # Top deals: $subtract of $ifNull'd prices
+        self.discount_amount = np.nan_to_num(original, nan=0.0) - np.nan_to_num(sale, nan=0.0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            pct = (original - sale) / original * 100
+        self.discount_pct = np.where((original > 0) & (sale > 0) & (original > sale), pct, 0.0)
+        self.dictionaries = dictionaries
+        self._name_rank = name_rank
+        self._offsets: Optional[Dict[bytes, int]] = None
+        self._index: Optional[FacetBitmapIndex] = None
+        self._sorted_prices: Optional[np.ndarray] = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def offset_of(self, product_id) -> Optional[int]:
+        """Row of a product id (str or ObjectId), or None."""
+        if self._offsets is None:
+            with self._lock:
+                if self._offsets is None:
+                    raw = self.ids.tobytes()
+                    self._offsets = {raw[i * 12:(i + 1) * 12]: i for i in range(len(self.ids))}
+        if not isinstance(product_id, ObjectId):
+            if not ObjectId.is_valid(product_id):
+                return None
+            product_id = ObjectId(product_id)
+        return self._offsets.get(product_id.binary)
+
+    def sorted_prices(self) -> np.ndarray:
+        """Numeric sale prices of all live rows, ascending."""
+        if self._sorted_prices is None:
+            prices = self.sale[self.live]
+            self._sorted_prices = np.sort(prices[~np.isnan(prices)])
+        return self._sorted_prices
+
+    @property
+    def index(self) -> FacetBitmapIndex:
+        """Bitmap index for this version, built on first use."""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    self._index = FacetBitmapIndex.build(self.codes, self.dictionaries, self.live, self.sale)
+        return self._index
+
+    @property
+    def tombstones(self) -> int:
+        return len(self.ids) - int(self.live.sum())
+
+    def name_rank(self) -> np.ndarray:
+        if self._name_rank is None:
+            names = np.array(list(self.names), dtype=object)
+            order = np.argsort(names, kind="stable")
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            self._name_rank = rank
+        return self._name_rank
+
+
+def _encode_rows(rows: Sequence[Dict[str, Any]], dictionaries: Dict[str, _Dictionary]) -> Dict[str, Any]:
+    """Column values for `rows` (raw Mongo docs with _id)."""
+    return {
+        "ids": np.frombuffer(b"".join(r["_id"].binary for r in rows), dtype=np.uint8).reshape(-1, 12),
+        "docs": [
+            {"id": str(row["_id"]), **{k: v for k, v in row.items() if k != "_id"}}
+            for row in rows
+        ],
+        "names": [r["product_name"] if isinstance(r.get("product_name"), str) else "" for r in rows],
+        "sale": np.fromiter((_number(r.get("sale_price")) for r in rows), dtype=np.float64, count=len(rows)),
+        "original": np.fromiter((_number(r.get("original_price")) for r in rows), dtype=np.float64, count=len(rows)),
+        "scraped": np.fromiter((_timestamp(r.get("scraped_at")) for r in rows), dtype=np.float64, count=len(rows)),
+        "oid": np.fromiter((_oid_order(r["_id"]) for r in rows), dtype=np.int64, count=len(rows)),
+        "excluded": np.fromiter((_is_excluded(r) for r in rows), dtype=bool, count=len(rows)),
+        "codes": {
+            facet: np.fromiter((dictionaries[facet].encode(r.get(facet)) for r in rows), dtype=np.int32, count=len(rows))
+            for facet in FACETS
+        },
+    }
+
+
+def _top_k(candidates: np.ndarray, keys: List[np.ndarray], k: int) -> np.ndarray:
+    """
+    Offsets of the first `k` candidates ordered ascending by `keys` (primary first),
+    ties broken by offset. Uses argpartition on the primary key so only the rows that
+    can make the page are fully sorted.
+    """
+    if k <= 0 or len(candidates) == 0:
+        return candidates[:0]
+    primary = keys[0][candidates]
+    if k < len(candidates):
+        threshold = primary[np.argpartition(primary, k - 1)[k - 1]]
+        # Keep every row tied with the k-th so secondary keys decide between them
+        keep = primary <= threshold
+        candidates = candidates[keep]
+    order = np.lexsort([candidates] + [key[candidates] for key in reversed(keys)])
+    return candidates[order[:k]]
+
+
+class CatalogSnapshot:
+    def __init__(self):
+        self._columns: Optional[_Columns] = None
+        self._dictionaries = {facet: _Dictionary() for facet in FACETS}
+        self._write_lock = threading.Lock()
+        # (facet, patterns, anchored) -> (dictionary size when computed, lookup table)
+        self._lut_cache = TTLCache("snapshot_lookup_tables", _LUT_CACHE_SIZE, _LUT_CACHE_TTL)
+        self._watermark: Optional[str] = None
+        self._change_cursor: Optional[ObjectId] = None
+        self.refreshed_at: Optional[float] = None
+
+    # ------------------------------------------------------------------ state
+
+    @property
+    def ready(self) -> bool:
+        """Built and refreshed recently enough to serve traffic."""
+        return (
+            settings.CATALOG_SNAPSHOT_ENABLED
+            and self._columns is not None
+            and self.refreshed_at is not None
+            and time.monotonic() - self.refreshed_at < settings.CATALOG_SNAPSHOT_MAX_AGE
+        )
+
+    def _dictionary_values(self) -> Dict[str, List[Optional[str]]]:
+        return {facet: self._dictionaries[facet].values[:] for facet in FACETS}
+
+    def _publish(self, columns: _Columns, refreshed_at: Optional[float] = None, warm: bool = True):
+        if warm:
+            # Build the index before readers can see this version
+            columns.index
+        self._columns = columns
+        self.refreshed_at = time.monotonic() if refreshed_at is None else refreshed_at
+        snapshot_rows.set(int(columns.live.sum()))
+
+    def warm(self):
+        """Build lazily created structures of the current version (after load())."""
+        columns = self._columns
+        if columns is not None:
+            columns.index
+            columns.offset_of(ObjectId())
+
+    def _advance_watermark(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            scraped_at = row.get("scraped_at")
+            if isinstance(scraped_at, str) and (self._watermark is None or scraped_at > self._watermark):
+                self._watermark = scraped_at
+
+    # ----------------------------------------------------------------- loading
+
+    def build(self):
+        """Full scan of listable products. Used at startup and to compact tombstones."""
+        started = time.perf_counter()
+        with self._write_lock:
+            # Read the change-log position first so nothing written during the scan is missed
+            last_change = product_changes_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+            rows = list(
+                products_collection.find(ProductRepository.IMAGE_FILTER, SNAPSHOT_PROJECTION)
+                .sort("_id", 1)
+                .batch_size(5000)
+            )
+            encoded = _encode_rows(rows, self._dictionaries)
+            columns = _Columns(
+                live=np.ones(len(rows), dtype=bool),
+                dictionaries=self._dictionary_values(),
+                **encoded
+            )
+            self._watermark = None
+            self._advance_watermark(rows)
+            self._change_cursor = last_change["_id"] if last_change else None
+            self._lut_cache.clear()
+            self._publish(columns)
+        snapshot_refresh_seconds.observe(time.perf_counter() - started, kind="build")
+        logger.info(
+            "catalog snapshot built",
+            extra={"rows": len(rows), "seconds": round(time.perf_counter() - started, 2)}
+        )
+
+    def refresh(self):
+        """Patch in products scraped past the watermark or named in the ingest change log."""
+        if self._columns is None:
+            self.build()
+            return
+        started = time.perf_counter()
+
+        changed_ids = set()
+        change_query = {"_id": {"$gt": self._change_cursor}} if self._change_cursor else {}
+        last_change = None
+        for change in product_changes_collection.find(change_query, {"product_id": 1}).sort("_id", 1):
+            last_change = change["_id"]
+            if change.get("product_id") and ObjectId.is_valid(change["product_id"]):
+                changed_ids.add(ObjectId(change["product_id"]))
+
+        rows = []
+        if self._watermark is not None:
+            rows = list(products_collection.find({"scraped_at": {"$gt": self._watermark}}, SNAPSHOT_PROJECTION))
+        missing = changed_ids - {row["_id"] for row in rows}
+        if missing:
+            rows.extend(products_collection.find({"_id": {"$in": list(missing)}}, SNAPSHOT_PROJECTION))
+
+        # Change-log entries whose product no longer exists
+        found = {row["_id"] for row in rows}
+        deleted = [oid for oid in missing if oid not in found]
+        self.apply(rows, deleted)
+        if last_change is not None:
+            self._change_cursor = last_change
+        snapshot_refresh_seconds.observe(time.perf_counter() - started, kind="incremental")
+
+    def apply(self, rows: List[Dict[str, Any]], deleted_ids: Iterable = ()):
+        """
+        Upsert raw product documents (with _id) and drop deleted ids.
+        Rows that are no longer listable are removed. Publishes a new column version.
+        """
+        deleted_ids = list(deleted_ids)
+        with self._write_lock:
+            current = self._columns
+            if current is None:
+                return
+            if not rows and not deleted_ids:
+                self.refreshed_at = time.monotonic()
+                return
+
+            live = current.live.copy()
+            updates: List[Tuple[int, Dict[str, Any]]] = []
+            appends: List[Dict[str, Any]] = []
+            for row in rows:
+                offset = current.offset_of(row["_id"])
+                if not is_listable(row):
+                    if offset is not None:
+                        live[offset] = False
+                elif offset is None:
+                    appends.append(row)
+                else:
+                    updates.append((offset, row))
+            for product_id in deleted_ids:
+                offset = current.offset_of(product_id)
+                if offset is not None:
+                    live[offset] = False
+
+            ids, docs, names = current.ids, current.docs, current.names
+            sale, original, scraped, oid = current.sale, current.original, current.scraped, current.oid
+            excluded = current.excluded
+            codes = dict(current.codes)
+
+            if updates:
+                offsets = np.array([offset for offset, _ in updates], dtype=np.int64)
+                encoded = _encode_rows([row for _, row in updates], self._dictionaries)
+                docs = _patched(docs, list(zip(offsets.tolist(), encoded["docs"])), [])
+                names = _patched(names, list(zip(offsets.tolist(), encoded["names"])), [])
+                sale, original, scraped = sale.copy(), original.copy(), scraped.copy()
+                excluded = excluded.copy()
+                sale[offsets] = encoded["sale"]
+                original[offsets] = encoded["original"]
+                scraped[offsets] = encoded["scraped"]
+                excluded[offsets] = encoded["excluded"]
+                live[offsets] = True
+                for facet in FACETS:
+                    codes[facet] = codes[facet].copy()
+                    codes[facet][offsets] = encoded["codes"][facet]
+
+            if appends:
+                encoded = _encode_rows(appends, self._dictionaries)
+                ids = np.concatenate([ids, encoded["ids"]])
+                docs = _patched(docs, [], encoded["docs"])
+                names = _patched(names, [], encoded["names"])
+                sale = np.concatenate([sale, encoded["sale"]])
+                original = np.concatenate([original, encoded["original"]])
+                scraped = np.concatenate([scraped, encoded["scraped"]])
+                oid = np.concatenate([oid, encoded["oid"]])
+                excluded = np.concatenate([excluded, encoded["excluded"]])
+                live = np.concatenate([live, np.ones(len(appends), dtype=bool)])
+                for facet in FACETS:
+                    codes[facet] = np.concatenate([codes[facet], encoded["codes"][facet]])
+
+            columns = _Columns(
+                ids, docs, names, live, sale, original, scraped, oid, excluded, codes, self._dictionary_values()
+            )
+            self._advance_watermark(rows)
+            self._publish(columns)
+
+        if columns.tombstones > _COMPACT_RATIO * max(len(columns), 1):
+            self.build()
+
+    # ------------------------------------------------------------- persistence
+
+    def save(self, path: str):
+        """Write the current version to `path` for load() in other workers or after a restart."""
+        started = time.perf_counter()
+        with self._write_lock:
+            columns = self._columns
+            if columns is None:
+                return
+            meta = {
+                "saved_at": time.time(),
+                "watermark": self._watermark,
+                "change_cursor": str(self._change_cursor) if self._change_cursor else None,
+                "dictionaries": self._dictionary_values(),
+            }
+        arrays = {
+            "ids": columns.ids,
+            "live": columns.live,
+            "sale": columns.sale,
+            "original": columns.original,
+            "scraped": columns.scraped,
+            "oid": columns.oid,
+            "excluded": columns.excluded,
+            "name_rank": columns.name_rank(),
+            **{f"codes.{facet}": columns.codes[facet] for facet in FACETS},
+        }
+        arenas = {
+            "docs": [bson.encode(doc) for doc in columns.docs],
+            "names": [name.encode("utf-8") for name in columns.names],
+        }
+        write_snapshot(path, arrays, arenas, meta)
+        logger.info(
+            "catalog snapshot saved",
+            extra={"path": path, "rows": len(columns), "seconds": round(time.perf_counter() - started, 2)}
+        )
+
+    def load(self, path: str) -> bool:
+        """
+        Map a snapshot written by save(). Columns stay on the OS page cache and documents
+        are decoded on demand; the next refresh() catches up from the saved watermark.
+        Returns False when there is no file.
+        """
+        if not os.path.exists(path):
+            return False
+        started = time.perf_counter()
+        arrays, arenas, meta = read_snapshot(path, {"docs": bson.decode, "names": lambda raw: raw.decode("utf-8")})
+        with self._write_lock:
+            self._dictionaries = {facet: _Dictionary.from_values(meta["dictionaries"][facet]) for facet in FACETS}
+            columns = _Columns(
+                ids=arrays["ids"],
+                docs=arenas["docs"],
+                names=arenas["names"],
+                live=arrays["live"],
+                sale=arrays["sale"],
+                original=arrays["original"],
+                scraped=arrays["scraped"],
+                oid=arrays["oid"],
+                excluded=arrays["excluded"],
+                codes={facet: arrays[f"codes.{facet}"] for facet in FACETS},
+                dictionaries=self._dictionary_values(),
+                name_rank=arrays["name_rank"],
+            )
+            self._watermark = meta["watermark"]
+            self._change_cursor = ObjectId(meta["change_cursor"]) if meta["change_cursor"] else None
+            self._lut_cache.clear()
+            # Age counts from when the file was written, so a stale file is not served
+            age = max(time.time() - meta["saved_at"], 0.0)
+            self._publish(columns, refreshed_at=time.monotonic() - age, warm=False)
+        logger.info(
+            "catalog snapshot loaded",
+            extra={"path": path, "rows": len(columns), "seconds": round(time.perf_counter() - started, 4)}
+        )
+        return True
+
+    # ----------------------------------------------------------------- queries
+
+    def _lookup_table(self, facet: str, patterns: Tuple[str, ...], anchored: bool) -> np.ndarray:
+        """Boolean table over dictionary codes: True where any pattern matches the value."""
+        dictionary = self._dictionaries[facet]
+        values = dictionary.values[:]
+        key = (facet, patterns, anchored)
+        cached = self._lut_cache.get(key)
+        if cached is not None and cached[0] == len(values):
+            return cached[1]
+        compiled = [re.compile(p, re.IGNORECASE) for p in patterns]
+        match = (lambda r, v: r.fullmatch(v)) if anchored else (lambda r, v: r.search(v))
+        table = np.fromiter(
+            (v is not None and any(match(r, v) for r in compiled) for v in values),
+            dtype=bool,
+            count=len(values)
+        )
+        self._lut_cache.set(key, (len(values), table))
+        return table
+
+    def _exact_table(self, facet: str, values: Sequence[str]) -> np.ndarray:
+        dictionary = self._dictionaries[facet]
+        table = np.zeros(len(dictionary.values), dtype=bool)
+        for value in values:
+            code = dictionary.code_of(value)
+            if code is not None:
+                table[code] = True
+        return table
+
+    @staticmethod
+    def _apply_table(columns: _Columns, facet: str, table: np.ndarray) -> np.ndarray:
+        # Codes are never larger than the dictionary the table was built from
+        return table[columns.codes[facet]]
+
+    def _page(self, columns: _Columns, offsets: np.ndarray) -> List[Dict[str, Any]]:
+        # Copies, since callers normalize rows in place
+        return [dict(columns.docs[offset]) for offset in offsets]
+
+    def top_deals(self, limit: int, skip: int = 0):
+        """Same result as ProductRepository.get_top_deals before validation."""
+        columns = self._columns
+        snapshot_queries.inc(query="top_deals")
+        base = columns.live & self._apply_table(columns, "brand_name", self._exact_table("brand_name", ProductRepository.TOP_DEAL_BRANDS))
+        total = int(base.sum())
+        candidates = np.flatnonzero(base & (columns.discount_amount > 0))
+        page = _top_k(candidates, [-columns.discount_amount], skip + limit)[skip:]
+        return total, self._page(columns, page)
+
+    def latest(self, limit: int, skip: int):
+        """Same result as ProductRepository.get_latest_products."""
+        columns = self._columns
+        snapshot_queries.inc(query="latest")
+        base = columns.live & self._apply_table(columns, "brand_name", self._exact_table("brand_name", ProductRepository.LATEST_BRANDS))
+        candidates = np.flatnonzero(base)
+        page = _top_k(candidates, [-columns.scraped, -columns.oid], skip + limit)[skip:]
+        return len(candidates), self._page(columns, page)
+
+    def listing(self, limit: int, skip: int, gender: Optional[str] = None):
+        """
+        ProductRepository.get_products ordering (descending $1000 price buckets,
+        shuffled within each bucket), optionally restricted to one exact gender.
+        """
+        columns = self._columns
+        snapshot_queries.inc(query="listing")
+        with np.errstate(invalid="ignore"):
+            mask = columns.live & (columns.sale > 0) & ~columns.excluded
+        if gender:
+            table = self._lookup_table("product_gender", (re.escape(gender),), anchored=True)
+            mask &= self._apply_table(columns, "product_gender", table)
+        candidates = np.flatnonzero(mask)
+        bucket = np.floor(columns.sale[candidates] / 1000)
+        jitter = np.random.default_rng().integers(0, 10000, size=len(candidates))
+        priority = np.full(len(columns), np.inf)
+        priority[candidates] = -(bucket * 10000 + jitter)
+        page = _top_k(candidates, [priority], skip + limit)[skip:]
+        return len(candidates), self._page(columns, page)
+
+    @staticmethod
+    def _filter_bitmaps(
+        index: FacetBitmapIndex,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ) -> Dict[str, Bitmap]:
+        """One bitmap per active /filter clause, with the repository's regex semantics."""
+        clauses = {}
+        for name, values in (("category", category), ("brand", brand), ("occasion", occasion)):
+            if values:
+                clauses[name] = index.facet(FILTER_FACETS[name], [facet_pattern(v) for v in values])
+        if gender:
+            clauses["gender"] = index.facet("product_gender", [gender])
+        if price_min is not None or price_max is not None:
+            clauses["price"] = index.price(price_min, price_max)
+        return clauses
+
+    def facet_counts(
+        self,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """Same result as ProductService's Mongo facet counts, by bitmap popcount."""
+        index = self._columns.index
+        snapshot_queries.inc(query="facet_counts")
+        clauses = self._filter_bitmaps(index, category, brand, occasion, price_min, price_max, gender)
+        total = len(intersect(clauses.values(), index.live))
+        counts = {}
+        for name, facet in FILTER_FACETS.items():
+            others = intersect([bitmap for clause, bitmap in clauses.items() if clause != name], index.live)
+            counts[name] = index.counts(facet, others)
+        return total, counts
+
+    def price_histogram(
+        self,
+        bins: int,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None
+    ):
+        """
+        Same result as ProductRepository.get_price_histogram: bin edges are located in a
+        sorted price array by binary search. Without facet filters the catalog-wide
+        sorted array is reused, so only the searches run per request.
+        """
+        columns = self._columns
+        snapshot_queries.inc(query="price_histogram")
+        clauses = self._filter_bitmaps(columns.index, category, brand, occasion, None, None, gender)
+        if clauses:
+            prices = columns.sale[intersect(clauses.values(), columns.index.live).offsets()]
+            prices = np.sort(prices[~np.isnan(prices)])
+        else:
+            prices = columns.sorted_prices()
+        if price_min is not None or price_max is not None:
+            lower = np.searchsorted(prices, price_min, side="left") if price_min is not None else 0
+            upper = np.searchsorted(prices, price_max, side="right") if price_max is not None else len(prices)
+            prices = prices[lower:upper]
+
+        if len(prices) == 0:
+            return 0, None, None, [0] * bins
+        lo, hi = float(prices[0]), float(prices[-1])
+        if lo == hi:
+            return len(prices), lo, hi, [len(prices)] + [0] * (bins - 1)
+        # Bin i holds [edge_i, edge_i+1); the last bin also holds the maximum
+        starts = np.searchsorted(prices, lo + (hi - lo) / bins * np.arange(bins), side="left")
+        counts = np.diff(np.append(starts, len(prices)))
+        return len(prices), lo, hi, counts.tolist()
+
+    def filtered(
+        self,
+        limit: int,
+        skip: int,
+        category: Optional[List[str]] = None,
+        brand: Optional[List[str]] = None,
+        occasion: Optional[List[str]] = None,
+        price_min: Optional[float] = None,
+        price_max: Optional[float] = None,
+        gender: Optional[str] = None,
+        sort_by: Optional[str] = None
+    ):
+        """Same result as ProductRepository.get_filtered_products."""
+        columns = self._columns
+        snapshot_queries.inc(query="filtered")
+        clauses = self._filter_bitmaps(columns.index, category, brand, occasion, price_min, price_max, gender)
+        candidates = intersect(clauses.values(), columns.index.live).offsets()
+        total = len(candidates)
+
+        # Mongo sorts missing values first ascending and last descending
+        ascending = lambda values: np.where(np.isnan(values), -np.inf, values)
+        descending = lambda values: np.where(np.isnan(values), np.inf, -values)
+        keys = {
+            "price-asc": lambda: [ascending(columns.sale), ascending(columns.original)],
+            "price-desc": lambda: [descending(columns.sale), descending(columns.original)],
+            "discount-desc": lambda: [-columns.discount_pct],
+            "name-asc": lambda: [columns.name_rank()],
+            "name-desc": lambda: [-columns.name_rank()],
+            "newest": lambda: [-columns.scraped],
+        }.get(sort_by or "")
+
+        if keys is None:
+            # 'featured' or no sort: database (insertion) order
+            page = candidates[skip:skip + limit]
+        else:
+            page = _top_k(candidates, keys(), skip + limit)[skip:]
+        return total, self._page(columns, page)
+
+
+catalog_snapshot = CatalogSnapshot()
+
+
+def _on_invalidation(events):
+    """Patch the snapshot from bus events between its own refreshes."""
+    if catalog_snapshot._columns is None:
+        return
+    if any(isinstance(event, CatalogReset) for event in events):
+        catalog_snapshot.build()
+        return
+
+    rows, fetch, deleted = [], [], []
+    for event in events:
+        if isinstance(event, ProductDeleted):
+            deleted.append(event.product_id)
+        elif isinstance(event, ProductUpserted):
+            if event.document is not None:
+                rows.append({k: v for k, v in event.document.items() if k == "_id" or k in SNAPSHOT_PROJECTION})
+            elif ObjectId.is_valid(event.product_id):
+                fetch.append(ObjectId(event.product_id))
+    if fetch:
+        found = list(products_collection.find({"_id": {"$in": fetch}}, SNAPSHOT_PROJECTION))
+        rows.extend(found)
+        found_ids = {row["_id"] for row in found}
+        deleted.extend(oid for oid in fetch if oid not in found_ids)
+    catalog_snapshot.apply(rows, deleted)
+
+
+bus.subscribe("catalog_snapshot", _on_invalidation)
+
+
+# Open lock file while this process is the one rewriting the snapshot file
+_writer_lock = None
+
+
+def _claim_writer(path: str) -> bool:
+    """
+    Whether this process writes the snapshot file. The first worker to take an
+    exclusive lock on "<path>.lock" keeps it for life; when it exits the lock is
+    released and another worker takes over on its next save.
+    """
+    global _writer_lock
+    if _writer_lock is not None:
+        return True
+    handle = open(path + ".lock", "a")
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return False
+    _writer_lock = handle
+    return True
+
+
+def start_background_refresh():
+    """
+    Load the saved snapshot file if there is one, then keep the snapshot fresh on a
+    daemon thread. One worker per file rewrites it every CATALOG_SNAPSHOT_SAVE_SECONDS.
+    """
+    path = settings.CATALOG_SNAPSHOT_PATH
+    loaded = False
+    if path:
+        try:
+            loaded = catalog_snapshot.load(path)
+        except Exception:
+            logger.exception("catalog snapshot file could not be loaded", extra={"path": path})
+
+    def run():
+        saved_at = time.monotonic() if loaded else None
+        while True:
+            try:
+                catalog_snapshot.warm()
+                catalog_snapshot.refresh()
+                due = saved_at is None or time.monotonic() - saved_at >= settings.CATALOG_SNAPSHOT_SAVE_SECONDS
+                if path and due and _claim_writer(path):
+                    catalog_snapshot.save(path)
+                    saved_at = time.monotonic()
+            except Exception:
+                logger.exception("catalog snapshot refresh failed")
+            time.sleep(settings.CATALOG_SNAPSHOT_REFRESH_SECONDS)
+
+    threading.Thread(target=run, name="catalog-snapshot", daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the catalog snapshot file workers load at startup.")
+    parser.add_argument("--path", default=settings.CATALOG_SNAPSHOT_PATH or "catalog.snapshot")
+    args = parser.parse_args()
+
+    catalog_snapshot.build()
+    catalog_snapshot.save(args.path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+On-disk form of the catalog snapshot, read back through mmap.
+
+Layout: an 8-byte magic, an 8-byte header length, a JSON header, then 64-byte aligned
+blocks. Fixed-width columns are stored as raw arrays; variable-length values (product
+documents as BSON, product names as UTF-8) go into arenas: the values back to back plus
+a uint64 offset column. Loading maps the file read-only, so every column is a view onto
+the OS page cache that all workers on the host share, and an arena value is decoded
+only when something reads it.
+"""
+import json
+import mmap
+import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+MAGIC = b"HSNAP001"
+_ALIGN = 64
+_PREAMBLE = len(MAGIC) + 8
+
+
+def _aligned(position: int) -> int:
+    return (position + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+class Arena:
+    """Read-only sequence of values decoded on access, with in-memory patches on top."""
+
+    def __init__(
+        self,
+        data: np.ndarray,
+        offsets: np.ndarray,
+        decode: Callable[[bytes], Any],
+        overrides: Optional[Dict[int, Any]] = None,
+        appended: Optional[List[Any]] = None
+    ):
+        self._data = data
+        self._offsets = offsets
+        self._decode = decode
+        self._stored = len(offsets) - 1
+        self._overrides = overrides or {}
+        self._appended = appended or []
+
+    def __len__(self) -> int:
+        return self._stored + len(self._appended)
+
+    def __getitem__(self, index: int) -> Any:
+        index = int(index)
+        if index >= self._stored:
+            return self._appended[index - self._stored]
+        if index in self._overrides:
+            return self._overrides[index]
+        return self._decode(self._data[self._offsets[index]:self._offsets[index + 1]].tobytes())
+
+    def __iter__(self) -> Iterator[Any]:
+        return (self[index] for index in range(len(self)))
+
+    def patched(self, updates: Iterable[Tuple[int, Any]], appended: Sequence[Any]) -> "Arena":
+        """A new arena over the same mapped bytes with `updates` replacing values and `appended` added."""
+        overrides = dict(self._overrides)
+        extra = list(self._appended)
+        for offset, value in updates:
+            if offset >= self._stored:
+                extra[offset - self._stored] = value
+            else:
+                overrides[int(offset)] = value
+        return Arena(self._data, self._offsets, self._decode, overrides, extra + list(appended))
+
+
+def write_snapshot(
+    path: str,
+    columns: Dict[str, np.ndarray],
+    arenas: Dict[str, Sequence[bytes]],
+    meta: Dict[str, Any]
+):
+    """
+    Write `columns` (name -> array), `arenas` (name -> encoded values) and the
+    JSON-serializable `meta` to `path`. The file is written next to `path` and renamed
+    over it, so readers that already mapped the previous file keep a consistent view.
+    """
+    blocks: Dict[str, np.ndarray] = {name: np.ascontiguousarray(array) for name, array in columns.items()}
+    arena_values: Dict[str, Sequence[bytes]] = {}
+    for name, values in arenas.items():
+        offsets = np.zeros(len(values) + 1, dtype=np.uint64)
+        np.cumsum([len(value) for value in values], out=offsets[1:])
+        blocks[f"{name}.offsets"] = offsets
+        arena_values[name] = values
+
+    layout = {}
+    position = 0
+    for name, array in blocks.items():
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": position}
+        position = _aligned(position + array.nbytes)
+    for name, values in arena_values.items():
+        size = int(blocks[f"{name}.offsets"][-1])
+        layout[f"{name}.data"] = {"dtype": "|u1", "shape": [size], "offset": position}
+        position = _aligned(position + size)
+
+    header = json.dumps({"meta": meta, "blocks": layout, "arenas": list(arena_values)}).encode("utf-8")
+    data_start = _aligned(_PREAMBLE + len(header))
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for name, array in blocks.items():
+            f.seek(data_start + layout[name]["offset"])
+            f.write(array.tobytes())
+        for name, values in arena_values.items():
+            f.seek(data_start + layout[f"{name}.data"]["offset"])
+            for value in values:
+                f.write(value)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(
+    path: str,
+    decoders: Dict[str, Callable[[bytes], Any]]
+) -> Tuple[Dict[str, np.ndarray], Dict[str, Arena], Dict[str, Any]]:
+    """Map `path` read-only. Returns (columns, arenas decoded with `decoders`, meta)."""
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        mapped.close()
+        raise ValueError(f"{path} is not a catalog snapshot")
+    header_length = int.from_bytes(mapped[len(MAGIC):_PREAMBLE], "little")
+    header = json.loads(mapped[_PREAMBLE:_PREAMBLE + header_length])
+    data_start = _aligned(_PREAMBLE + header_length)
+
+    arrays = {}
+    for name, block in header["blocks"].items():
+        dtype = np.dtype(block["dtype"])
+        count = int(np.prod(block["shape"]))
+        if count == 0:
+            arrays[name] = np.empty(block["shape"], dtype=dtype)
+            continue
+        arrays[name] = np.frombuffer(
+            mapped, dtype=dtype, count=count, offset=data_start + block["offset"]
+        ).reshape(block["shape"])
+
+    arenas = {
+        name: Arena(arrays.pop(f"{name}.data"), arrays.pop(f"{name}.offsets"), decoders[name])
+        for name in header["arenas"]
+    }
+    return arrays, arenas, header["meta"]
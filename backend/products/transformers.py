@@ -44,69 +44,7 @@ def transform_product(product: Dict) -> Optional[Dict]:
     Transform a single product for frontend consumption.
     Returns None if product should be excluded.
     """
+    from .record import ProductRecord
 
-    # ❌ Filter out products without valid dual pricing
-    if not has_valid_dual_price(product):
-        return None
-
-    # PRICES - Handle both number and string formats
-    original_price = product.get("original_price")
-    sale_price = product.get("sale_price")
-    
-    # Convert to float if they're strings
-    if original_price and isinstance(original_price, str):
-        try:
-            original_price = float(str(original_price).replace('$', '').replace(',', '').strip())
-        except (ValueError, TypeError):
-            original_price = None
-    
-    if sale_price and isinstance(sale_price, str):
-        try:
-            sale_price = float(str(sale_price).replace('$', '').replace(',', '').strip())
-        except (ValueError, TypeError):
-            sale_price = None
-    
-    # Calculate discount_value if not present
-    discount_value = product.get("discount_value")
-    if discount_value is None and original_price and sale_price:
-        try:
-            original_float = float(original_price) if not isinstance(original_price, float) else original_price
-            sale_float = float(sale_price) if not isinstance(sale_price, float) else sale_price
-            discount_value = original_float - sale_float
-        except (ValueError, TypeError):
-            discount_value = None
-
-    return {
-        "id": product.get("id"),
-
-        # LINKS / MEDIA
-        "product_link": product.get("product_link"),
-        "product_image": product.get("product_image"),
-
-        # TEXT FIELDS
-        "brand_name": all_caps(product.get("brand_name")),
-        "product_category": all_caps(product.get("product_category")),
-        "product_sub_category": title_case(product.get("product_sub_category")),
-        "product_gender": title_case(product.get("product_gender")),
-        "product_name": title_case(product.get("product_name")),
-        "product_description": title_case(product.get("product_description")),
-
-        # PRICES
-        "currency": product.get("currency"),
-        "original_price": original_price,
-        "sale_price": sale_price,
-        "discount": product.get("discount"),
-        "disc_pct": product.get("disc_pct"),
-        "discount_value": discount_value,
-
-        # ATTRIBUTES
-        "product_color": product.get("product_color", []),
-        "product_material": product.get("product_material"),
-        "product_occasion": product.get("product_occasion"),
-        "available_sizes": product.get("available_sizes", []),
-        "wishlist_state": bool(product.get("wishlist_state", False)),
-
-        # META
-        "search_tags": product.get("search_tags"),
-        "scraped_at": product.get("scraped_at"),
-    }
+    record = ProductRecord.from_product(product)
+    return record.to_dict() if record else None
@@ -0,0 +1,97 @@
+"""
+The folded bag/favourites update must give the same lists as applying the ops one
+at a time ($addToSet appends if absent, $pull removes).
+"""
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from users.collections import LISTS, collections_stage, fold_ops
+
+
+def apply_one_by_one(doc, ops):
+    lists = {field: list(doc.get(field) or []) for field in LISTS}
+    for op in ops:
+        values = lists[op.collection]
+        if op.op == "remove":
+            lists[op.collection] = [value for value in values if value != op.product_id]
+        elif op.product_id not in values:
+            values.append(op.product_id)
+    return lists
+
+
+def evaluate(expr, doc, variables):
+    """Just enough of the aggregation expression language for collections_stage."""
+    if isinstance(expr, str):
+        if expr.startswith("$$"):
+            return variables[expr[2:]]
+        if expr.startswith("$"):
+            return doc.get(expr[1:])
+        return expr
+    if isinstance(expr, list):
+        return [evaluate(item, doc, variables) for item in expr]
+    if not isinstance(expr, dict):
+        return expr
+    (operator, args), = expr.items()
+    if operator == "$let":
+        scope = {**variables, **{name: evaluate(value, doc, variables) for name, value in args["vars"].items()}}
+        return evaluate(args["in"], doc, scope)
+    if operator == "$filter":
+        return [
+            item for item in evaluate(args["input"], doc, variables)
+            if evaluate(args["cond"], doc, {**variables, "this": item})
+        ]
+    if operator == "$ifNull":
+        value = evaluate(args[0], doc, variables)
+        return evaluate(args[1], doc, variables) if value is None else value
+    if operator == "$not":
+        return not evaluate(args[0], doc, variables)
+    if operator == "$in":
+        return evaluate(args[0], doc, variables) in evaluate(args[1], doc, variables)
+    if operator == "$concatArrays":
+        return [item for array in evaluate(args, doc, variables) for item in array]
+    raise NotImplementedError(operator)
+
+
+def apply_folded(doc, ops):
+    stage = collections_stage(fold_ops(ops))["$set"]
+    updated = {**doc, **{field: evaluate(expr, doc, {}) for field, expr in stage.items()}}
+    return {field: updated.get(field) or [] for field in LISTS}
+
+
+def op(kind, collection, product_id):
+    return SimpleNamespace(op=kind, collection=collection, product_id=product_id)
+
+
+@pytest.mark.parametrize("doc, ops", [
+    # Remove then add moves an item to the end
+    ({"bag": ["a", "b"]}, [op("remove", "bag", "a"), op("add", "bag", "a")]),
+    # Add then remove cancels out, whether or not the item was there
+    ({"bag": ["a"]}, [op("add", "bag", "b"), op("remove", "bag", "b")]),
+    ({"bag": ["a"]}, [op("add", "bag", "a"), op("remove", "bag", "a")]),
+    # Adding an item already present keeps its position
+    ({"bag": ["a"]}, [op("add", "bag", "b"), op("add", "bag", "a")]),
+    # Re-adding after a remove appends in op order
+    ({"bag": ["a"]}, [op("add", "bag", "b"), op("remove", "bag", "a"), op("add", "bag", "a")]),
+    # Missing lists and ops on both lists
+    ({}, [op("add", "favourites", "x"), op("add", "bag", "x"), op("remove", "favourites", "x")]),
+])
+def test_folded_update_matches_one_by_one(doc, ops):
+    assert apply_folded(doc, ops) == apply_one_by_one(doc, ops)
+
+
+def test_folded_update_matches_one_by_one_random():
+    rng = random.Random(45)
+    products = [f"p{i}" for i in range(6)]
+    for _ in range(2000):
+        doc = {field: rng.sample(products, rng.randrange(4)) for field in LISTS if rng.random() < 0.8}
+        ops = [
+            op(rng.choice(("add", "remove")), rng.choice(LISTS), rng.choice(products))
+            for _ in range(rng.randrange(1, 9))
+        ]
+        assert apply_folded(doc, ops) == apply_one_by_one(doc, ops), (doc, ops)
+
+
+def test_no_ops_fold_to_no_changes():
+    assert fold_ops([]) == {}
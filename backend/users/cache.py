@@ -0,0 +1,34 @@
+"""
+Process-wide cache of user profiles for GET /users/{user_id}.
+
+Entries are response-facing User models with password_hash removed, keyed by the
+id string. UserRepository writes through on every change it makes, so a worker
+serves its own writes immediately; profile changes made by another worker show up
+here once the entry expires (USER_CACHE_TTL). Bag and favourites are not cached:
+any worker may have just changed them, so they are re-read on every request.
+"""
+from typing import Optional
+
+from core.cache import TTLCache
+from core.config import settings
+from core.signals import user_lists_changed
+from .models import User
+
+
+user_cache = TTLCache("users", settings.USER_CACHE_SIZE, settings.USER_CACHE_TTL)
+
+
+def cache_user(user: Optional[User]) -> None:
+    if user is not None and user.id:
+        user_cache.set(user.id, user.model_copy(update={"password_hash": None, "bag": [], "favourites": []}))
+
+
+def cached_user(user_id: str) -> Optional[User]:
+    """The cached profile, with empty bag and favourites for the caller to fill in."""
+    return user_cache.get(user_id)
+
+
+def lists_changed(user_id: str) -> None:
+    """Called after every bag/favourites write."""
+    # Listing personalization (products.personalize) rebuilds from the new lists
+    user_lists_changed.send(user_id)
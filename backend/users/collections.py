@@ -0,0 +1,52 @@
+"""
+Folding a sequence of bag/favourites ops into one atomic pipeline update.
+
+`fold_ops` turns ops into {field: (removes, adds)}; `collections_stage` turns that
+into the $set stage UserRepository.update_collections sends. `removes` are dropped
+first, then `adds` not already present are appended in order, which gives the same
+lists as applying the ops one at a time with $pull and $addToSet.
+"""
+from typing import Any, Dict, Iterable, List, Tuple
+
+LISTS = ("bag", "favourites")
+
+Changes = Dict[str, Tuple[List[str], List[str]]]
+
+
+def fold_ops(ops: Iterable[Any]) -> Changes:
+    """{field: (removes, adds)} for ops with `op` ("add"/"remove"), `collection` and `product_id`."""
+    ops = list(ops)
+    changes = {}
+    for field in LISTS:
+        removed = set()
+        # product -> index of the add that (re)appends it, cleared by a later remove
+        appended_at = {}
+        for index, op in enumerate(ops):
+            if op.collection != field:
+                continue
+            if op.op == "remove":
+                removed.add(op.product_id)
+                appended_at.pop(op.product_id, None)
+            else:
+                appended_at.setdefault(op.product_id, index)
+        if removed or appended_at:
+            adds = sorted(appended_at, key=appended_at.get)
+            changes[field] = (sorted(removed), adds)
+    return changes
+
+
+def collections_stage(changes: Changes) -> Dict[str, Any]:
+    """The pipeline $set stage applying `changes`."""
+    stage = {}
+    for field, (removes, adds) in changes.items():
+        stage[field] = {"$let": {
+            "vars": {"kept": {"$filter": {
+                "input": {"$ifNull": ["$" + field, []]},
+                "cond": {"$not": [{"$in": ["$$this", removes]}]}
+            }}},
+            "in": {"$concatArrays": ["$$kept", {"$filter": {
+                "input": adds,
+                "cond": {"$not": [{"$in": ["$$this", "$$kept"]}]}
+            }}]}
+        }}
+    return {"$set": stage}
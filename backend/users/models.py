@@ -15,7 +15,7 @@ class PyObjectId(str):
 
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 class User(BaseModel):
@@ -47,3 +47,14 @@ class RegisterRequest(BaseModel):
 class LoginRequest(BaseModel):
     email: str
     password: str
+
+
+class CollectionOp(BaseModel):
+    op: Literal["add", "remove"]
+    collection: Literal["bag", "favourites"]
+    product_id: str
+
+
+class CollectionsPatch(BaseModel):
+    """Ops are applied in order, as if sent one by one, but in a single atomic update."""
+    ops: List[CollectionOp] = Field(..., max_length=500)
@@ -0,0 +1,71 @@
+"""
+Password hashing off the event loop.
+
+bcrypt is deliberately slow (~100-300 ms of CPU per call at the default cost) and
+would stall every request on a worker if called from an async handler. Calls run
+on a dedicated, bounded thread pool instead; bcrypt releases the GIL while it
+works, so PASSWORD_HASH_WORKERS hashes proceed in parallel without blocking the
+loop, and excess logins queue on the pool rather than on the loop.
+
+BCRYPT_ROUNDS sets the cost of new hashes. Stored hashes carry their own cost, so
+needs_rehash() tells login to re-hash a password whose cost differs.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from core.config import settings
+from core.metrics import registry
+
+
+password_hash_seconds = registry.histogram(
+    "password_hash_seconds",
+    "Time spent in bcrypt, including waiting for a pool thread",
+    ["operation"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+)
+
+_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+
+
+def _hash(password: str, rounds: int) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _verify(password: str, password_hash: str) -> bool:
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), password_hash.encode("utf-8"))
+    except ValueError:
+        # Malformed stored hash
+        return False
+
+
+async def _run(operation: str, fn, *args):
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    try:
+        return await loop.run_in_executor(_executor, fn, *args)
+    finally:
+        password_hash_seconds.observe(loop.time() - started, operation=operation)
+
+
+async def hash_password(password: str) -> str:
+    return await _run("hash", _hash, password, settings.BCRYPT_ROUNDS)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await _run("verify", _verify, password, password_hash)
+
+
+def hash_rounds(password_hash: str) -> int:
+    """Cost factor stored in a $2b$<rounds>$... hash; 0 if it cannot be read."""
+    parts = password_hash.split("$")
+    try:
+        return int(parts[2])
+    except (IndexError, ValueError):
+        return 0
+
+
+def needs_rehash(password_hash: str) -> bool:
+    return hash_rounds(password_hash) != settings.BCRYPT_ROUNDS
@@ -0,0 +1,319 @@
+"""
+Price-drop notifications for products in users' bags and favourites.
+
+`price_watches` is the inverted index: one document per (product_id, user_id) with the
+lists the product is in and the sale price last seen for it. UserRepository keeps it in
+step with bag/favourites changes (reconcile_watches, run after the write against the
+user's lists as stored at that point, so reconciles finishing out of order still converge).
+
+PriceWatchEngine subscribes to the product invalidation bus. Changed product ids are
+batched, their watches fetched with one product_id $in query, and each watch's price
+compared with the product's current sale_price. Drops of at least PRICE_DROP_MIN_PERCENT
+become `notifications` documents, then the watch takes the new price.
+
+Every worker's engine sees the same changes. Each watch carries a version: the
+notification _id is "<watch id>:<version>" and the watch update is conditional on the
+version, so whichever worker gets there first wins and the others' writes are no-ops.
+
+Users whose lists predate price watches have none until they next change a list;
+backfill them once with:
+    python -m users.price_watch --backfill [--concurrency 16]
+"""
+import argparse
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Iterable, List, Optional, Set, Union
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from core.config import settings
+from core.database import get_async_db, notifications_collection, price_watches_collection, products_collection
+from core.log import get_logger
+from core.metrics import registry
+from products.invalidation import CatalogReset, ProductUpserted, bus
+from products.normalize import parse_price
+
+
+logger = get_logger("users.price_watch")
+
+price_drop_notifications = registry.counter(
+    "price_drop_notifications_total",
+    "Price-drop notifications written"
+)
+price_watch_batch_seconds = registry.histogram(
+    "price_watch_batch_seconds",
+    "Time to check one batch of changed products against their watches"
+)
+
+BATCH_SIZE = 500
+LISTS = ("bag", "favourites")
+NOTIFICATION_PRODUCT_FIELDS = {"sale_price": 1, "product_name": 1, "brand_name": 1, "product_link": 1, "product_image": 1}
+
+# Keeps scheduled reconcile tasks alive until they finish
+_background_tasks: Set[asyncio.Task] = set()
+
+
+async def ensure_indexes():
+    """
+    The unique (product_id, user_id) index is what keeps concurrent reconciles from
+    creating duplicate watches. Safe to call repeatedly.
+    """
+    db = get_async_db()
+    # Inverted index product_id -> watching users for price-drop checks
+    await db["price_watches"].create_index(
+        [("product_id", ASCENDING), ("user_id", ASCENDING)],
+        name="product_id_1_user_id_1",
+        unique=True
+    )
+    await db["price_watches"].create_index([("user_id", ASCENDING)], name="user_id_1")
+    await db["notifications"].create_index(
+        [("user_id", ASCENDING), ("created_at", DESCENDING)],
+        name="user_id_1_created_at_-1"
+    )
+
+
+def _object_ids(product_ids: Iterable[str]) -> List[ObjectId]:
+    return [ObjectId(pid) for pid in product_ids if ObjectId.is_valid(pid)]
+
+
+async def reconcile_watches(user_id: str, fields: Iterable[str] = LISTS):
+    """Make the user's watches for `fields` match their current bag/favourites."""
+    db = get_async_db()
+    _id: Union[ObjectId, str] = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+    fields = list(fields)
+    # Read the lists now rather than trusting the caller's copy: an older reconcile may run last
+    user = await db["users"].find_one({"_id": _id}, {field: 1 for field in fields}) or {}
+    for field in fields:
+        await _reconcile_list(db, user_id, field, user.get(field) or [])
+
+
+async def _reconcile_list(db, user_id: str, field: str, product_ids: List[str]):
+    watches = db["price_watches"]
+    await watches.update_many(
+        {"user_id": user_id, "lists": field, "product_id": {"$nin": product_ids}},
+        {"$pull": {"lists": field}}
+    )
+    await watches.delete_many({"user_id": user_id, "lists": {"$size": 0}})
+    if not product_ids:
+        return
+
+    existing = {
+        doc["product_id"]: doc.get("lists") or []
+        async for doc in watches.find({"user_id": user_id, "product_id": {"$in": product_ids}}, {"product_id": 1, "lists": 1})
+    }
+    to_tag = [pid for pid, lists in existing.items() if field not in lists]
+    if to_tag:
+        await watches.update_many(
+            {"user_id": user_id, "product_id": {"$in": to_tag}},
+            {"$addToSet": {"lists": field}}
+        )
+
+    new_ids = [pid for pid in dict.fromkeys(product_ids) if pid not in existing]
+    if not new_ids:
+        return
+    prices = {
+        str(doc["_id"]): parse_price(doc.get("sale_price"))
+        async for doc in db["products"].find({"_id": {"$in": _object_ids(new_ids)}}, {"sale_price": 1})
+    }
+    now = datetime.now(timezone.utc)
+    try:
+        await watches.insert_many([
+            {"product_id": pid, "user_id": user_id, "lists": [field], "price": prices.get(pid), "version": 0, "created_at": now}
+            for pid in new_ids
+        ], ordered=False)
+    except BulkWriteError as e:
+        # A concurrent reconcile inserted some of them; tag those instead
+        if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+            raise
+        await watches.update_many(
+            {"user_id": user_id, "product_id": {"$in": new_ids}},
+            {"$addToSet": {"lists": field}}
+        )
+
+
+def schedule_reconcile(user_id: str, fields: Iterable[str]):
+    """Reconcile watches after a bag/favourites write without holding up the response."""
+    fields = list(fields)
+
+    async def run():
+        try:
+            await reconcile_watches(user_id, fields)
+        except Exception:
+            logger.exception("price watch reconcile failed", extra={"user_id": user_id, "lists": fields})
+
+    task = asyncio.get_running_loop().create_task(run())
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+def _is_drop(old: Optional[float], new: float) -> bool:
+    return old is not None and new < old * (1 - settings.PRICE_DROP_MIN_PERCENT / 100)
+
+
+def check_products(product_ids: List[str]) -> int:
+    """Compare watched products' current prices with their watches. Returns notifications written."""
+    watches = list(price_watches_collection.find({"product_id": {"$in": product_ids}}))
+    if not watches:
+        return 0
+    products = {
+        str(doc["_id"]): doc
+        for doc in products_collection.find(
+            {"_id": {"$in": _object_ids({watch["product_id"] for watch in watches})}},
+            NOTIFICATION_PRODUCT_FIELDS
+        )
+    }
+
+    now = datetime.now(timezone.utc)
+    notifications = []
+    updates = []
+    for watch in watches:
+        product = products.get(watch["product_id"])
+        price = parse_price(product.get("sale_price")) if product else None
+        if price is None or price == watch.get("price"):
+            continue
+        version = watch.get("version", 0)
+        if _is_drop(watch.get("price"), price):
+            notifications.append({
+                "_id": f"{watch['_id']}:{version}",
+                "type": "price_drop",
+                "user_id": watch["user_id"],
+                "product_id": watch["product_id"],
+                "lists": watch.get("lists", []),
+                "old_price": watch["price"],
+                "new_price": price,
+                "drop_percent": round((watch["price"] - price) / watch["price"] * 100, 1),
+                "product_name": product.get("product_name"),
+                "brand_name": product.get("brand_name"),
+                "product_link": product.get("product_link"),
+                "product_image": product.get("product_image"),
+                "created_at": now,
+                "read": False,
+            })
+        updates.append(UpdateOne(
+            {"_id": watch["_id"], "version": version},
+            {"$set": {"price": price, "price_changed_at": now}, "$inc": {"version": 1}}
+        ))
+
+    # Notifications first: if the watch update is lost the next pass re-derives the same _ids
+    written = len(notifications)
+    if notifications:
+        try:
+            notifications_collection.insert_many(notifications, ordered=False)
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != 11000 for error in errors):
+                raise
+            # Already written by another worker
+            written -= len(errors)
+    if updates:
+        price_watches_collection.bulk_write(updates, ordered=False)
+    price_drop_notifications.inc(written)
+    return written
+
+
+class PriceWatchEngine:
+    """Collects changed product ids from the bus and checks them in batches on its own thread."""
+
+    def __init__(self):
+        self._pending: Set[str] = set()
+        self._sweep = False
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+
+    def on_events(self, events):
+        with self._lock:
+            for event in events:
+                if isinstance(event, ProductUpserted):
+                    self._pending.add(event.product_id)
+                elif isinstance(event, CatalogReset):
+                    # Changes may have been missed: check every watched product
+                    self._sweep = True
+        self._wake.set()
+
+    def _take(self) -> List[str]:
+        with self._lock:
+            if self._sweep:
+                self._sweep = False
+                self._pending.clear()
+                return price_watches_collection.distinct("product_id")
+            product_ids, self._pending = list(self._pending), set()
+            return product_ids
+
+    def run(self):
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            # Let a burst of changes (an ingest run) arrive before checking
+            time.sleep(settings.PRICE_WATCH_DEBOUNCE_SECONDS)
+            product_ids = []
+            try:
+                product_ids = self._take()
+                for start in range(0, len(product_ids), BATCH_SIZE):
+                    started = time.perf_counter()
+                    check_products(product_ids[start:start + BATCH_SIZE])
+                    price_watch_batch_seconds.observe(time.perf_counter() - started)
+            except Exception:
+                logger.exception("price watch check failed", extra={"products": len(product_ids)})
+                with self._lock:
+                    self._pending.update(product_ids)
+                time.sleep(settings.PRICE_WATCH_DEBOUNCE_SECONDS)
+                self._wake.set()
+
+
+engine = PriceWatchEngine()
+
+
+def start_price_watch():
+    bus.subscribe("price_watch", engine.on_events)
+    threading.Thread(target=engine.run, name="price-watch", daemon=True).start()
+
+
+async def backfill_watches(concurrency: int = 16) -> int:
+    """Reconcile every user with a non-empty bag or favourites. Safe to re-run. Returns users reconciled."""
+    db = get_async_db()
+    semaphore = asyncio.Semaphore(concurrency)
+    done = 0
+
+    async def reconcile(user_id: str):
+        nonlocal done
+        async with semaphore:
+            try:
+                await reconcile_watches(user_id)
+                done += 1
+            except Exception:
+                logger.exception("price watch backfill failed", extra={"user_id": user_id})
+
+    tasks = []
+    cursor = db["users"].find(
+        {"$or": [{"bag.0": {"$exists": True}}, {"favourites.0": {"$exists": True}}]}, {"_id": 1}
+    )
+    async for user in cursor:
+        tasks.append(asyncio.create_task(reconcile(str(user["_id"]))))
+        if len(tasks) >= concurrency * 8:
+            await asyncio.gather(*tasks)
+            tasks = []
+    await asyncio.gather(*tasks)
+    return done
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price-drop watch maintenance.")
+    parser.add_argument("--backfill", action="store_true", help="Create watches for every user's current lists")
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    if not args.backfill:
+        parser.error("nothing to do; pass --backfill")
+
+    async def run():
+        await ensure_indexes()
+        return await backfill_watches(args.concurrency)
+
+    print(f"Reconciled watches for {asyncio.run(run())} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,123 +1,167 @@
-from typing import Optional, List
+from typing import Dict, Optional, List, Tuple, Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
 from .models import User
+from .collections import collections_stage
+from .cache import cache_user, cached_user, lists_changed
+from .price_watch import schedule_reconcile
+from core.database import get_async_db
+from core.log import get_logger
+
+
+logger = get_logger("users.repository")
+
+
+async def ensure_indexes():
+    """
+    Unique lookups for OAuth and email login (partial, so users without a google_id or
+    email do not collide on null). Safe to call repeatedly.
+    """
+    db = get_async_db()
+    users = db["users"]
+    await users.create_index(
+        [("google_id", ASCENDING)],
+        name="google_id_unique",
+        unique=True,
+        partialFilterExpression={"google_id": {"$type": "string"}}
+    )
+    await users.create_index(
+        [("email", ASCENDING)],
+        name="email_unique",
+        unique=True,
+        partialFilterExpression={"email": {"$type": "string"}}
+    )
 
 
 class UserRepository:
     def __init__(self, db: AsyncIOMotorDatabase):
         self.collection = db["users"]
 
-    async def get_user_by_google_id(self, google_id: str) -> Optional[User]:
-        data = await self.collection.find_one({"google_id": google_id})
-        if data:
-            data["_id"] = str(data["_id"])
-            return User(**data)
-        return None
+    @staticmethod
+    def _id_filter(user_id: str) -> dict:
+        """Users created by this API have ObjectId ids; older imported users may have string ids."""
+        _id: Union[ObjectId, str] = ObjectId(user_id) if ObjectId.is_valid(user_id) else user_id
+        return {"_id": _id}
+
+    @staticmethod
+    def _to_user(data: Optional[dict]) -> Optional[User]:
+        if not data:
+            return None
+        data["_id"] = str(data["_id"])
+        return User(**data)
 
     async def create_user(self, user_data: dict) -> User:
-        result = await self.collection.insert_one(user_data)
-        created = await self.collection.find_one({"_id": result.inserted_id})
-
-        # Convert ObjectId → str
-        created["_id"] = str(created["_id"])
-
-        return User(**created)
-
-
-
-    async def update_user(self, google_id: str, updates: dict) -> Optional[User]:
-        await self.collection.update_one({"google_id": google_id}, {"$set": updates})
-        data = await self.collection.find_one({"google_id": google_id})
-        if data:
-            data["_id"] = str(data["_id"])
-            return User(**data)
-        return None
-
-    async def add_favourite(self, user_id: str, product_id: str):
-        try:
-            await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$addToSet": {"favourites": product_id}}
-            )
-        except Exception:
-            # Fall back to string id if ObjectId conversion fails
-            await self.collection.update_one(
-                {"_id": user_id},
-                {"$addToSet": {"favourites": product_id}}
-            )
-
-    async def remove_favourite(self, user_id: str, product_id: str):
-        try:
-            await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$pull": {"favourites": product_id}}
-            )
-        except Exception:
-            await self.collection.update_one(
-                {"_id": user_id},
-                {"$pull": {"favourites": product_id}}
-            )
-
-    async def add_to_bag(self, user_id: str, product_id: str):
-        try:
-            await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$addToSet": {"bag": product_id}}
-            )
-        except Exception:
-            await self.collection.update_one(
-                {"_id": user_id},
-                {"$addToSet": {"bag": product_id}}
-            )
-
-    async def remove_from_bag(self, user_id: str, product_id: str):
-        try:
-            await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$pull": {"bag": product_id}}
-            )
-        except Exception:
-            await self.collection.update_one(
-                {"_id": user_id},
-                {"$pull": {"bag": product_id}}
-            )
-
-    async def sync_bag(self, user_id: str, bag: list):
-        """Update entire bag contents"""
-        from bson import ObjectId
-        try:
-            await self.collection.update_one(
-                {"_id": ObjectId(user_id)},
-                {"$set": {"bag": bag}}
-            )
-        except Exception:
-            # If ObjectId conversion fails, try as string
-            await self.collection.update_one(
-                {"_id": user_id},
-                {"$set": {"bag": bag}}
-            )
+        # insert_one sets user_data["_id"]; the stored document is exactly user_data
+        await self.collection.insert_one(user_data)
+        user = self._to_user(dict(user_data))
+        cache_user(user)
+        return user
 
-    async def get_user_by_id(self, user_id: str) -> Optional[User]:
-        print("get user called by id: ", user_id)
-        from bson import ObjectId
-        try:
-            data = await self.collection.find_one({"_id": ObjectId(user_id)})
-            if data:
-                data["_id"] = str(data["_id"])
-                return User(**data)
+    async def upsert_google_user(self, google_id: str, updates: dict, on_insert: dict) -> User:
+        """
+        Create or update the user with `google_id` in one round trip. Raises DuplicateKeyError
+        if a concurrent first login inserted it first, or another user already has the email.
+        """
+        data = await self.collection.find_one_and_update(
+            {"google_id": google_id},
+            {"$set": updates, "$setOnInsert": on_insert},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        user = self._to_user(data)
+        cache_user(user)
+        if user.bag or user.favourites:
+            # A first login may bring a guest bag/favourites
+            schedule_reconcile(user.id, ("bag", "favourites"))
+        return user
+
+    async def _update_list(self, user_id: str, field: str, update: dict) -> Optional[List[str]]:
+        """Apply `update` and return the resulting `field` list in the same round trip; None if the user is missing."""
+        data = await self.collection.find_one_and_update(
+            self._id_filter(user_id),
+            update,
+            projection={field: 1, "_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if data is None:
             return None
-        except Exception:
-            # If ObjectId conversion fails, try as string
-            data = await self.collection.find_one({"_id": user_id})
-            if data:
-                data["_id"] = str(data["_id"])
-                return User(**data)
+        values = data.get(field) or []
+        lists_changed(user_id)
+        schedule_reconcile(user_id, (field,))
+        return values
+
+    async def add_favourite(self, user_id: str, product_id: str) -> Optional[List[str]]:
+        return await self._update_list(user_id, "favourites", {"$addToSet": {"favourites": product_id}})
+
+    async def remove_favourite(self, user_id: str, product_id: str) -> Optional[List[str]]:
+        return await self._update_list(user_id, "favourites", {"$pull": {"favourites": product_id}})
+
+    async def add_to_bag(self, user_id: str, product_id: str) -> Optional[List[str]]:
+        return await self._update_list(user_id, "bag", {"$addToSet": {"bag": product_id}})
+
+    async def remove_from_bag(self, user_id: str, product_id: str) -> Optional[List[str]]:
+        return await self._update_list(user_id, "bag", {"$pull": {"bag": product_id}})
+
+    async def sync_bag(self, user_id: str, bag: list) -> Optional[List[str]]:
+        """Update entire bag contents"""
+        return await self._update_list(user_id, "bag", {"$set": {"bag": bag}})
+
+    async def update_collections(self, user_id: str, changes: Dict[str, Tuple[List[str], List[str]]]) -> Optional[dict]:
+        """
+        Atomically apply {field: (removes, adds)} to the bag/favourites lists with one pipeline
+        update: `removes` are dropped first, then `adds` not already present are appended in
+        order. Returns {"bag": [...], "favourites": [...]} after the update, or None if the user is missing.
+        """
+        data = await self.collection.find_one_and_update(
+            self._id_filter(user_id),
+            [collections_stage(changes)],
+            projection={"bag": 1, "favourites": 1, "_id": 0},
+            return_document=ReturnDocument.AFTER
+        )
+        if data is None:
             return None
+        collections = {"bag": data.get("bag") or [], "favourites": data.get("favourites") or []}
+        lists_changed(user_id)
+        schedule_reconcile(user_id, changes)
+        return collections
+
+    async def get_user_by_id(self, user_id: str) -> Optional[User]:
+        """
+        Profile without password_hash, served from the user cache when possible. The cache
+        holds no bag/favourites, so a hit still reads those (and only those) fresh.
+        """
+        user = cached_user(user_id)
+        if user is not None:
+            lists = await self.collection.find_one(self._id_filter(user_id), {"bag": 1, "favourites": 1, "_id": 0})
+            if lists is None:
+                return None
+            return user.model_copy(update={"bag": lists.get("bag") or [], "favourites": lists.get("favourites") or []})
+        logger.debug("get user by id", extra={"user_id": user_id})
+        data = await self.collection.find_one(self._id_filter(user_id), {"password_hash": 0})
+        user = self._to_user(data)
+        cache_user(user)
+        return user
     
+    async def get_notifications(self, user_id: str, limit: int, skip: int, unread_only: bool = False):
+        """Newest first. Returns (total, notifications)."""
+        notifications = get_async_db()["notifications"]
+        query = {"user_id": user_id}
+        if unread_only:
+            query["read"] = False
+        total = await notifications.count_documents(query)
+        items = []
+        async for doc in notifications.find(query).sort([("created_at", -1), ("_id", -1)]).skip(skip).limit(limit):
+            doc["id"] = doc.pop("_id")
+            items.append(doc)
+        return total, items
+
     async def get_user_by_email(self, email: str) -> Optional[User]:
         data = await self.collection.find_one({"email": email})
-        if data:
-            data["_id"] = str(data["_id"])
-            return User(**data)
-        return None
+        return self._to_user(data)
+
+    async def update_password_hash(self, user_id: str, old_hash: str, new_hash: str) -> bool:
+        """Replace the hash only if it is still `old_hash` (a concurrent password change wins)."""
+        user_filter = {**self._id_filter(user_id), "password_hash": old_hash}
+        result = await self.collection.update_one(user_filter, {"$set": {"password_hash": new_hash}})
+        return result.modified_count == 1
@@ -1,24 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from typing import Dict, List
 
 from .repository import UserRepository
 from .service import UserService
-from .models import User, RegisterRequest, LoginRequest
+from .models import CollectionsPatch, User, RegisterRequest, LoginRequest
 
+from core.database import get_async_db
+from core.log import get_logger
 
-# Create a singleton async client
-from motor.motor_asyncio import AsyncIOMotorClient
-from core.config import settings
-
-_async_client = None
-_async_db = None
-
-def get_async_db():
-    global _async_client, _async_db
-    if _async_db is None:
-        _async_client = AsyncIOMotorClient(settings.MONGODB_URI)
-        _async_db = _async_client[settings.DATABASE_NAME]
-    return _async_db
+logger = get_logger("users.router")
 
 def get_user_service():
     async_db = get_async_db()
@@ -48,32 +38,34 @@ async def oauth_login(payload: Dict, service: UserService = Depends(get_user_ser
 
 @router.post("/{user_id}/favourites/{product_id}")
 async def add_favourite(user_id: str, product_id: str, service: UserService = Depends(get_user_service)):
-    await service.add_to_favourites(user_id, product_id)
-    return {"status": "added"}
+    favourites = await service.add_to_favourites(user_id, product_id)
+    if favourites is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"status": "added", "favourites": favourites}
 
 
 @router.delete("/{user_id}/favourites/{product_id}")
 async def remove_favourite(user_id: str, product_id: str, service: UserService = Depends(get_user_service)):
-    await service.remove_from_favourites(user_id, product_id)
-    return {"status": "removed"}
+    favourites = await service.remove_from_favourites(user_id, product_id)
+    if favourites is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"status": "removed", "favourites": favourites}
 
 
 @router.post("/{user_id}/bag/{product_id}")
 async def add_to_bag(user_id: str, product_id: str, service: UserService = Depends(get_user_service)):
-    await service.add_to_bag(user_id, product_id)
-    user = await service.get_user(user_id)
-    if not user:
+    bag = await service.add_to_bag(user_id, product_id)
+    if bag is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"status": "added", "bag": user.bag}
+    return {"status": "added", "bag": bag}
 
 
 @router.delete("/{user_id}/bag/{product_id}")
 async def remove_from_bag(user_id: str, product_id: str, service: UserService = Depends(get_user_service)):
-    await service.remove_from_bag(user_id, product_id)
-    user = await service.get_user(user_id)
-    if not user:
+    bag = await service.remove_from_bag(user_id, product_id)
+    if bag is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"status": "removed", "bag": user.bag}
+    return {"status": "removed", "bag": bag}
 
 
 @router.put("/{user_id}/bag")
@@ -81,11 +73,41 @@ async def sync_bag(user_id: str, bag: List[str], service: UserService = Depends(
     """
     Sync entire bag contents for a user.
     """
-    await service.sync_bag(user_id, bag)
-    user = await service.get_user(user_id)
-    if not user:
+    bag = await service.sync_bag(user_id, bag)
+    if bag is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return {"status": "synced", "bag": bag}
+
+
+@router.patch("/{user_id}/collections")
+async def update_collections(user_id: str, patch: CollectionsPatch, service: UserService = Depends(get_user_service)):
+    """
+    Apply a list of add/remove ops to bag and favourites atomically, e.g. moving all
+    favourites to the bag or merging a guest cart at login, and return both lists.
+    """
+    collections = await service.update_collections(user_id, patch.ops)
+    if collections is None:
         raise HTTPException(status_code=404, detail="User not found")
-    return {"status": "synced", "bag": user.bag}
+    return {"status": "updated", **collections}
+
+
+@router.get("/{user_id}/notifications")
+async def get_notifications(
+    user_id: str,
+    limit: int = Query(20, ge=1, le=100),
+    skip: int = Query(0, ge=0),
+    unread_only: bool = False,
+    service: UserService = Depends(get_user_service)
+):
+    """Price-drop notifications for products in the user's bag and favourites, newest first."""
+    total, items = await service.get_notifications(user_id, limit, skip, unread_only)
+    return {
+        "notifications": items,
+        "total": total,
+        "limit": limit,
+        "skip": skip,
+        "has_more": (skip + limit) < total
+    }
 
 
 @router.post("/register", response_model=User)
@@ -93,7 +115,7 @@ async def register(request: RegisterRequest, service: UserService = Depends(get_
     """
     Register a new user with email and password.
     """
-    print("register users called with data - ", request)
+    logger.debug("register requested", extra={"email": request.email})
     return await service.register_user(request)
 
 
@@ -102,7 +124,7 @@ async def login(request: LoginRequest, service: UserService = Depends(get_user_s
     """
     Login with email and password.
     """
-    print("login requested with payload - ",request)
+    logger.debug("login requested", extra={"email": request.email})
     return await service.login_user(request)
 
 
@@ -1,9 +1,17 @@
 from .repository import UserRepository
-from .models import User, RegisterRequest, LoginRequest
-from typing import Optional
+from .collections import fold_ops
+from .models import CollectionOp, User, RegisterRequest, LoginRequest
+from typing import List, Optional
 from datetime import datetime
-import bcrypt
 from fastapi import HTTPException
+from pymongo.errors import DuplicateKeyError
+from core.log import get_logger
+from .passwords import hash_password, needs_rehash, verify_password
+
+
+logger = get_logger("users.service")
+
+OAUTH_PROFILE_FIELDS = ("name", "email", "avatar")
 
 
 class UserService:
@@ -11,19 +19,29 @@ class UserService:
         self.repository = repository
 
     async def login_or_register_user(self, payload: dict) -> User:
+        google_id = payload["google_id"]
+        # Profile fields refreshed on every login; lists and ids are never taken from the payload
+        updates = {key: payload[key] for key in OAUTH_PROFILE_FIELDS if key in payload}
+        # A first login may carry the guest bag/favourites
+        on_insert = {
+            "created_at": payload.get("created_at") or datetime.utcnow(),
+            "bag": payload.get("bag") if isinstance(payload.get("bag"), list) else [],
+            "favourites": payload.get("favourites") if isinstance(payload.get("favourites"), list) else []
+        }
 
-        existing = await self.repository.get_user_by_google_id(payload["google_id"])
-
-        if existing:
-            # update avatar/name if changed
-            return await self.repository.update_user(payload["google_id"], payload)
-
-        # create new user - ensure bag is initialized
-        if "bag" not in payload:
-            payload["bag"] = []
-        if "favourites" not in payload:
-            payload["favourites"] = []
-        return await self.repository.create_user(payload)
+        for attempt in range(2):
+            try:
+                return await self.repository.upsert_google_user(google_id, updates, on_insert)
+            except DuplicateKeyError as e:
+                # keyPattern names the violated index on current servers; older ones only say it in the message
+                if "google_id" in ((e.details or {}).get("keyPattern") or str(e)) and attempt == 0:
+                    # A concurrent first login created the user; this time the upsert updates it
+                    continue
+                logger.warning("oauth login conflicts with an existing account", extra={"google_id": google_id})
+                raise HTTPException(
+                    status_code=409,
+                    detail="An account with this email already exists, please log in with email and password"
+                )
 
     async def add_to_favourites(self, user_id: str, product_id: str):
         return await self.repository.add_favourite(user_id, product_id)
@@ -41,18 +59,32 @@ class UserService:
         """Sync entire bag contents"""
         return await self.repository.sync_bag(user_id, bag)
 
+    async def update_collections(self, user_id: str, ops: List[CollectionOp]) -> Optional[dict]:
+        """
+        Apply add/remove ops to bag and favourites in one atomic update, with the same
+        result as applying them one at a time ($addToSet appends, $pull removes).
+        """
+        changes = fold_ops(ops)
+
+        if not changes:
+            user = await self.repository.get_user_by_id(user_id)
+            return {"bag": user.bag, "favourites": user.favourites} if user else None
+        return await self.repository.update_collections(user_id, changes)
+
+    async def get_notifications(self, user_id: str, limit: int, skip: int, unread_only: bool = False):
+        return await self.repository.get_notifications(user_id, limit, skip, unread_only)
+
     async def get_user(self, user_id: str) -> Optional[User]:
         return await self.repository.get_user_by_id(user_id)
 
     async def register_user(self, request: RegisterRequest) -> User:
-        print("inside register user")
         # Check if user already exists
         existing = await self.repository.get_user_by_email(request.email)
         if existing:
             raise HTTPException(status_code=400, detail="User with this email already exists")
         
         # Hash password
-        password_hash = bcrypt.hashpw(request.password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        password_hash = await hash_password(request.password)
         
         # Create user data
         user_data = {
@@ -64,16 +96,17 @@ class UserService:
             "bag": []
         }
         
-        # Create user
-        print("create user called with data - ", user_data)
-        user = await self.repository.create_user(user_data)
+        # Create user; a concurrent registration with the same email trips the unique index
+        try:
+            user = await self.repository.create_user(user_data)
+        except DuplicateKeyError:
+            raise HTTPException(status_code=400, detail="User with this email already exists")
+        logger.info("user registered", extra={"user_id": user.id})
         return user
 
     async def login_user(self, request: LoginRequest) -> User:
         # Find user by email
-        print("login service called")
         user = await self.repository.get_user_by_email(request.email)
-        print(user)
         if not user:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
@@ -81,7 +114,13 @@ class UserService:
         if not user.password_hash:
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
-        if not bcrypt.checkpw(request.password.encode('utf-8'), user.password_hash.encode('utf-8')):
+        if not await verify_password(request.password, user.password_hash):
             raise HTTPException(status_code=401, detail="Invalid email or password")
-        print("returning user")
+
+        # The plaintext is only available now: upgrade hashes made at another cost
+        if needs_rehash(user.password_hash):
+            new_hash = await hash_password(request.password)
+            if await self.repository.update_password_hash(user.id, user.password_hash, new_hash):
+                user.password_hash = new_hash
+                logger.info("password rehashed", extra={"user_id": user.id})
         return user